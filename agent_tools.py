@@ -10,6 +10,7 @@ from config import (
 )
 from database import CosmosDB
 from event_tracking import ItemEventTracker  # Import event tracker
+from search_cache import bump_inventory_version
 
 # Configure logging
 logging.basicConfig(
@@ -210,6 +211,9 @@ class InventoryAgent:
                 )
                 logger.info("Successfully updated document in CosmosDB")
                 
+                # Cached search results no longer reflect this user's inventory
+                bump_inventory_version(self.user_id)
+                
                 # Log the price change event
                 self.event_tracker.track_item_updated(
                     user_id=self.user_id,
@@ -319,6 +323,9 @@ class InventoryAgent:
                 )
                 logger.info("Successfully updated document in CosmosDB")
                 
+                # Cached search results no longer reflect this user's inventory
+                bump_inventory_version(self.user_id)
+                
                 # Log the quantity change event
                 self.event_tracker.track_item_updated(
                     user_id=self.user_id,
@@ -421,6 +428,9 @@ class InventoryAgent:
                 )
                 logger.info("Successfully updated document in CosmosDB")
                 
+                # Cached search results no longer reflect this user's inventory
+                bump_inventory_version(self.user_id)
+                
                 # Log the item creation event
                 self.event_tracker.track_item_created(
                     user_id=self.user_id,
@@ -519,6 +529,9 @@ class InventoryAgent:
                 )
                 logger.info("Successfully updated document in CosmosDB")
                 
+                # Cached search results no longer reflect this user's inventory
+                bump_inventory_version(self.user_id)
+                
                 # Log the item deletion event
                 self.event_tracker.track_item_deleted(
                     user_id=self.user_id,
@@ -0,0 +1,231 @@
+# build_checkpoints.py
+import logging
+import sqlite3
+import threading
+import time
+from config import INDEX_CHECKPOINT_PATH
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("BuildCheckpoints")
+
+# Builds in these states can be picked up again by the next rebuild
+RESUMABLE_STATUSES = ("running", "interrupted")
+
+class BuildCheckpointStore:
+    """
+    Durable progress records for index builds.
+
+    Every uploaded batch records the ids and content hashes of its documents, so a
+    build interrupted by a restart or an error can resume into the same shadow
+    index without re-embedding or re-uploading work that already landed.
+    """
+    def __init__(self, path=INDEX_CHECKPOINT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS index_builds (
+                user_id TEXT PRIMARY KEY,
+                index_name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                total_items INTEGER,
+                completed_items INTEGER NOT NULL,
+                batches INTEGER NOT NULL,
+                started_at REAL NOT NULL,
+                resumed_at REAL NOT NULL,
+                resumed_items INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                error TEXT
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS build_documents (
+                user_id TEXT NOT NULL,
+                document_id TEXT NOT NULL,
+                content_hash TEXT,
+                PRIMARY KEY (user_id, document_id)
+            )
+            """
+        )
+        self._conn.commit()
+        logger.info(f"Initialized BuildCheckpointStore at {path}")
+
+    def get_build(self, user_id):
+        """Return the latest build record for a user, or None if there is none."""
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT index_name, status, total_items, completed_items, batches,
+                       started_at, resumed_at, resumed_items, updated_at, error
+                FROM index_builds WHERE user_id = ?
+                """,
+                (user_id,)
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "index_name": row[0], "status": row[1], "total_items": row[2],
+            "completed_items": row[3], "batches": row[4], "started_at": row[5],
+            "resumed_at": row[6], "resumed_items": row[7], "updated_at": row[8], "error": row[9]
+        }
+
+    def start_build(self, user_id, index_name):
+        """Record a new build into index_name, discarding any earlier checkpoint for the user."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM build_documents WHERE user_id = ?", (user_id,))
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO index_builds
+                (user_id, index_name, status, total_items, completed_items, batches,
+                 started_at, resumed_at, resumed_items, updated_at, error)
+                VALUES (?, ?, 'running', NULL, 0, 0, ?, ?, 0, ?, NULL)
+                """,
+                (user_id, index_name, now, now, now)
+            )
+            self._conn.commit()
+        logger.info(f"Started build checkpoint for user {user_id} into {index_name}")
+
+    def resume_build(self, user_id):
+        """Mark an interrupted build as running again and return the documents it already uploaded."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE index_builds
+                SET status = 'running', resumed_at = ?, resumed_items = completed_items, updated_at = ?, error = NULL
+                WHERE user_id = ?
+                """,
+                (now, now, user_id)
+            )
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT document_id, content_hash FROM build_documents WHERE user_id = ?",
+                (user_id,)
+            ).fetchall()
+        logger.info(f"Resuming build for user {user_id} with {len(rows)} documents already uploaded")
+        return dict(rows)
+
+    def set_total(self, user_id, total_items):
+        """Record how many distinct documents the build is expected to upload."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE index_builds SET total_items = ?, updated_at = ? WHERE user_id = ?",
+                (total_items, time.time(), user_id)
+            )
+            self._conn.commit()
+
+    def record_batch(self, user_id, documents):
+        """Checkpoint a batch of documents that was uploaded successfully."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO build_documents (user_id, document_id, content_hash) VALUES (?, ?, ?)",
+                [(user_id, document["id"], document.get("content_hash")) for document in documents]
+            )
+            self._conn.execute(
+                """
+                UPDATE index_builds
+                SET completed_items = (SELECT COUNT(*) FROM build_documents WHERE user_id = ?),
+                    batches = batches + 1, updated_at = ?
+                WHERE user_id = ?
+                """,
+                (user_id, time.time(), user_id)
+            )
+            self._conn.commit()
+
+    def forget_documents(self, user_id, document_ids):
+        """Drop checkpointed documents that were removed from the shadow index."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM build_documents WHERE user_id = ? AND document_id = ?",
+                [(user_id, document_id) for document_id in document_ids]
+            )
+            self._conn.execute(
+                """
+                UPDATE index_builds
+                SET completed_items = (SELECT COUNT(*) FROM build_documents WHERE user_id = ?), updated_at = ?
+                WHERE user_id = ?
+                """,
+                (user_id, time.time(), user_id)
+            )
+            self._conn.commit()
+
+    def finish_build(self, user_id, status, error=None):
+        """
+        Close out a build
+
+        Completed and failed builds drop their per-document checkpoints; interrupted
+        builds keep them so the next rebuild can resume.
+
+        Args:
+            user_id (str): The user whose build finished
+            status (str): "completed", "failed" or "interrupted"
+            error (str): Optional error message to keep with the record
+        """
+        with self._lock:
+            if status not in RESUMABLE_STATUSES:
+                self._conn.execute("DELETE FROM build_documents WHERE user_id = ?", (user_id,))
+            self._conn.execute(
+                "UPDATE index_builds SET status = ?, error = ?, updated_at = ? WHERE user_id = ?",
+                (status, error, time.time(), user_id)
+            )
+            self._conn.commit()
+        logger.info(f"Build for user {user_id} is {status}")
+
+    def get_progress(self, user_id):
+        """
+        Report build progress for a user
+
+        Returns:
+            dict: Build status, counts of distinct documents expected and uploaded,
+            percent complete and an ETA in seconds estimated from the throughput
+            since the build last (re)started, or None if the user has no build on record
+        """
+        build = self.get_build(user_id)
+        if not build:
+            return None
+
+        total = build["total_items"]
+        completed = build["completed_items"]
+        percent = None
+        eta_seconds = None
+
+        if build["status"] == "completed":
+            percent = 100.0
+            eta_seconds = 0
+        elif total:
+            percent = round(min(100.0, 100.0 * completed / total), 1)
+            done_this_run = completed - build["resumed_items"]
+            elapsed = time.time() - build["resumed_at"]
+            if build["status"] == "running" and done_this_run > 0 and elapsed > 0:
+                eta_seconds = round(max(0, total - completed) * elapsed / done_this_run, 1)
+
+        return {
+            "index_name": build["index_name"],
+            "status": build["status"],
+            "total_items": total,
+            "completed_items": completed,
+            "batches": build["batches"],
+            "percent": percent,
+            "eta_seconds": eta_seconds,
+            "started_at": build["started_at"],
+            "updated_at": build["updated_at"],
+            "error": build["error"]
+        }
+
+_checkpoint_store = None
+
+def get_checkpoint_store():
+    """Return the process-wide build checkpoint store."""
+    global _checkpoint_store
+    if _checkpoint_store is None:
+        _checkpoint_store = BuildCheckpointStore()
+    return _checkpoint_store
@@ -1,5 +1,6 @@
 # config.py
 from dotenv import load_dotenv
+import json
 import os
 
 load_dotenv()
@@ -19,4 +20,86 @@ SEARCH_MODEL="gpt-4o-search-preview"
 # Azure Cognitive Search configuration
 SEARCH_SERVICE_ENDPOINT = os.getenv("SEARCH_SERVICE_ENDPOINT")
 SEARCH_SERVICE_KEY = os.getenv("SEARCH_SERVICE_KEY")
-SEARCH_INDEX_NAME = os.getenv("SEARCH_INDEX_NAME")
\ No newline at end of file
+SEARCH_INDEX_NAME = os.getenv("SEARCH_INDEX_NAME", "inventory-shared")  # index holding every tenant in shared mode
+SEARCH_INDEX_MODE = os.getenv("SEARCH_INDEX_MODE", "per_user")  # "per_user" (one index per user) or "shared" (one index, filtered by userId)
+SEARCH_MAX_CONNECTIONS = int(os.getenv("SEARCH_MAX_CONNECTIONS", "100"))  # connection pool shared by all Azure Search clients
+INDEX_CATALOG_REFRESH_SECONDS = float(os.getenv("INDEX_CATALOG_REFRESH_SECONDS", "60"))  # background refresh of the cached index list
+INDEX_EXISTS_CACHE_SIZE = int(os.getenv("INDEX_EXISTS_CACHE_SIZE", "4096"))  # users whose index existence is kept in memory
+INDEX_EXISTS_CACHE_TTL = float(os.getenv("INDEX_EXISTS_CACHE_TTL", "60"))  # seconds; builds, swaps and deletes invalidate sooner
+SEARCH_UPLOAD_CONCURRENCY = int(os.getenv("SEARCH_UPLOAD_CONCURRENCY", "4"))  # upload requests in flight per add_documents call, and uploads in flight per indexing pipeline
+SEARCH_UPLOAD_MAX_BYTES = int(os.getenv("SEARCH_UPLOAD_MAX_BYTES", "8000000"))  # serialized payload per upload request (service limit is 16 MB)
+SEARCH_UPLOAD_MAX_DOCUMENTS = int(os.getenv("SEARCH_UPLOAD_MAX_DOCUMENTS", "1000"))  # documents per upload request (service limit)
+SEARCH_UPLOAD_RETRIES = int(os.getenv("SEARCH_UPLOAD_RETRIES", "3"))  # retries for documents that failed to upload
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "azure")  # "azure" or "memory" (in-process stand-in for offline benchmarks)
+SEARCH_BACKEND_LATENCY_MS = float(os.getenv("SEARCH_BACKEND_LATENCY_MS", "0"))  # delay added to each in-memory backend call
+SEARCH_BACKEND_LATENCY_JITTER_MS = float(os.getenv("SEARCH_BACKEND_LATENCY_JITTER_MS", "0"))  # random extra delay, up to this much
+
+# Embedding batching configuration
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))  # inputs per embeddings request
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "250000"))  # tokens per request (API ceiling is 300k)
+EMBEDDING_MAX_INPUT_TOKENS = int(os.getenv("EMBEDDING_MAX_INPUT_TOKENS", "8191"))  # longer inputs are truncated
+
+# Indexing pipeline configuration
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))  # concurrent embeddings requests per index build
+INDEX_QUEUE_SIZE = int(os.getenv("INDEX_QUEUE_SIZE", "8"))  # max batches waiting between pipeline stages
+INDEX_UPLOAD_BATCH_SIZE = int(os.getenv("INDEX_UPLOAD_BATCH_SIZE", "100"))  # documents per upload to the search index
+
+# Embedding cache configuration
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))  # least recently used entries are evicted beyond this
+
+# Blue/green index rebuild configuration
+INDEX_REGISTRY_PATH = os.getenv("INDEX_REGISTRY_PATH", "index_registry.sqlite3")  # stores each user's active index
+INDEX_VALIDATION_TIMEOUT = float(os.getenv("INDEX_VALIDATION_TIMEOUT", "60"))  # seconds to wait for a shadow index to report its documents
+INDEX_GC_DELAY_SECONDS = float(os.getenv("INDEX_GC_DELAY_SECONDS", "30"))  # grace period before the replaced index is deleted
+INDEX_CHECKPOINT_PATH = os.getenv("INDEX_CHECKPOINT_PATH", "index_checkpoints.sqlite3")  # progress of in-flight builds, used to resume them
+
+# Query embedding cache configuration
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "512"))  # questions kept in memory
+QUERY_EMBEDDING_CACHE_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "3600"))  # seconds
+
+# Action intent cache configuration
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "512"))  # classified questions kept in memory
+INTENT_CACHE_TTL = float(os.getenv("INTENT_CACHE_TTL", "60"))  # seconds; covers resubmits of the same text
+
+# Cosmos DB paging configuration
+COSMOS_PAGE_SIZE = int(os.getenv("COSMOS_PAGE_SIZE", "50"))  # inventory documents fetched per page
+
+# Embedding backend configuration
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")  # "openai" or "hashing" (deterministic, offline)
+LOCAL_EMBEDDING_DIMENSIONS = int(os.getenv("LOCAL_EMBEDDING_DIMENSIONS", "1536"))  # vector width of the hashing backend
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0"))  # shortened vector width, e.g. 256 or 512 (text-embedding-3 models); 0 keeps the backend's default
+
+# OpenAI rate limiting configuration
+OPENAI_DEFAULT_RPM = int(os.getenv("OPENAI_DEFAULT_RPM", "3000"))  # requests per minute per model
+OPENAI_DEFAULT_TPM = int(os.getenv("OPENAI_DEFAULT_TPM", "1000000"))  # tokens per minute per model
+OPENAI_RATE_LIMITS = json.loads(os.getenv("OPENAI_RATE_LIMITS", "{}"))  # per-model overrides, e.g. {"gpt-4o": {"rpm": 5000, "tpm": 800000}}
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))  # in-flight requests per model
+OPENAI_RATE_LIMIT_RETRIES = int(os.getenv("OPENAI_RATE_LIMIT_RETRIES", "5"))  # 429 retries before giving up
+OPENAI_TRANSIENT_RETRIES = int(os.getenv("OPENAI_TRANSIENT_RETRIES", "3"))  # retries after 5xx responses, timeouts and connection errors
+OPENAI_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("OPENAI_COMPLETION_TOKEN_ESTIMATE", "1000"))  # completion tokens reserved per chat call; corrected from usage afterwards
+
+# In-process vector index configuration
+LOCAL_INDEX_ENABLED = os.getenv("LOCAL_INDEX_ENABLED", "true").lower() == "true"  # answer searches from memory when the tenant's index is loaded
+LOCAL_INDEX_MAX_DOCUMENTS = int(os.getenv("LOCAL_INDEX_MAX_DOCUMENTS", "50000"))  # larger tenants always query Azure Search
+
+# Retrieval configuration
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")  # "vector" or "hybrid" (BM25 + vector fused with reciprocal-rank fusion)
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))  # results taken from each ranking before fusion
+
+# Search result cache configuration
+SEARCH_RESULT_CACHE_SIZE = int(os.getenv("SEARCH_RESULT_CACHE_SIZE", "1024"))  # cached result lists across all users
+SEARCH_RESULT_CACHE_TTL = float(os.getenv("SEARCH_RESULT_CACHE_TTL", "300"))  # seconds
+
+# Two-phase retrieval configuration
+SEARCH_RESULT_MODE = os.getenv("SEARCH_RESULT_MODE", "full")  # "full" (fields returned by Azure Search) or "ids" (ids and scores only, fields read from the item store)
+ITEM_STORE_PATH = os.getenv("ITEM_STORE_PATH", "item_store.sqlite3")  # local copy of the fields of every indexed document
+
+# HNSW tuning configuration
+HNSW_SMALL_INDEX_MAX_DOCUMENTS = int(os.getenv("HNSW_SMALL_INDEX_MAX_DOCUMENTS", "1000"))  # largest index in the "small" tier
+HNSW_MEDIUM_INDEX_MAX_DOCUMENTS = int(os.getenv("HNSW_MEDIUM_INDEX_MAX_DOCUMENTS", "20000"))  # largest index in the "medium" tier; bigger ones are "large"
+HNSW_TUNING_PATH = os.getenv("HNSW_TUNING_PATH", "hnsw_tuning.json")  # parameters chosen by the benchmark, per tier
+HNSW_TARGET_RECALL = float(os.getenv("HNSW_TARGET_RECALL", "0.95"))  # lowest recall@k the benchmark accepts
+HNSW_BENCHMARK_QUERIES = int(os.getenv("HNSW_BENCHMARK_QUERIES", "200"))  # held-out vectors used as benchmark queries
+HNSW_BENCHMARK_MAX_VECTORS = int(os.getenv("HNSW_BENCHMARK_MAX_VECTORS", "20000"))  # vectors read from the index for the benchmark, queries included
@@ -1,10 +1,12 @@
 # database.py
+import asyncio
 from azure.cosmos import CosmosClient, PartitionKey
 from config import (
     COSMOS_ENDPOINT,
     COSMOS_KEY,
     COSMOS_DATABASE,
-    COSMOS_CONTAINER
+    COSMOS_CONTAINER,
+    COSMOS_PAGE_SIZE
 )
 
 class CosmosDB:
@@ -22,6 +24,60 @@ class CosmosDB:
         ))
         return items
 
+    async def iter_user_document_pages(self, user_id, page_size=COSMOS_PAGE_SIZE, continuation_token=None):
+        """
+        Page through a user's inventory documents without loading them all at once
+
+        Each page is fetched in a worker thread so the event loop stays free.
+
+        Args:
+            user_id (str): The user whose documents to read
+            page_size (int): Maximum documents per page
+            continuation_token (str): Optional token to resume from a previous page
+
+        Yields:
+            tuple: (documents, continuation_token) - one page of documents and the
+            token for the page after it (None on the last page)
+        """
+        pages = self.container.query_items(
+            query="SELECT * FROM c WHERE c.userId = @user_id",
+            parameters=[{"name": "@user_id", "value": user_id}],
+            enable_cross_partition_query=True,
+            max_item_count=page_size
+        ).by_page(continuation_token)
+
+        def _next_page():
+            try:
+                return list(next(pages))
+            except StopIteration:
+                return None
+
+        while True:
+            documents = await asyncio.to_thread(_next_page)
+            if documents is None:
+                return
+            yield documents, pages.continuation_token
+
+    async def iter_user_items(self, user_id, page_size=COSMOS_PAGE_SIZE):
+        """Stream the inventory items of every document a user owns, page by page."""
+        async for documents, _ in self.iter_user_document_pages(user_id, page_size):
+            for document in documents:
+                for item in document.get('items', []):
+                    yield item
+
+    async def count_user_items(self, user_id):
+        """Count the inventory items across all of a user's documents without reading them."""
+        def _count():
+            results = list(self.container.query_items(
+                query="SELECT VALUE SUM(ARRAY_LENGTH(c.items)) FROM c WHERE c.userId = @user_id",
+                parameters=[{"name": "@user_id", "value": user_id}],
+                enable_cross_partition_query=True
+            ))
+            # Cross-partition aggregates can come back as one partial sum per partition
+            return int(sum(value for value in results if value))
+
+        return await asyncio.to_thread(_count)
+
     async def get_user_info(self, user_id):
         # Get specific user details
         query = f"SELECT * FROM c WHERE c.id = '{user_id}'"
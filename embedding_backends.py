@@ -0,0 +1,234 @@
+# embedding_backends.py
+import base64
+import hashlib
+import logging
+import re
+import numpy as np
+from openai import AsyncOpenAI
+from rate_limiter import get_openai_scheduler
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_EMBEDDING_MODEL,
+    EMBEDDING_BACKEND,
+    EMBEDDING_DIMENSIONS,
+    LOCAL_EMBEDDING_DIMENSIONS
+)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("EmbeddingBackends")
+
+class EmbeddingBackend:
+    """
+    Interface for the services and models that turn text into embeddings.
+
+    Subclasses set the model name, vector dimensions and request limits, and
+    implement embed().
+    """
+    name = None
+    model = None
+    dimensions = None
+    max_batch_items = 2048
+    max_batch_tokens = 300000
+    max_input_tokens = 8191
+
+    @classmethod
+    def configured_dimensions(cls):
+        """Return the vector width the backend will produce with the current configuration."""
+        return cls().dimensions
+
+    @property
+    def cache_model(self):
+        """Name identifying this backend's vectors in embedding caches."""
+        return self.model
+
+    async def embed(self, texts, token_count=None):
+        """
+        Embed a batch of texts
+
+        Args:
+            texts (list): Texts to embed in one request
+            token_count (int): Optional token count of the texts, used for rate limiting
+
+        Returns:
+            numpy.ndarray: A (len(texts), dimensions) float32 matrix in input order
+        """
+        raise NotImplementedError
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """Hosted OpenAI embedding models."""
+    name = "openai"
+
+    # Native vector dimensions, per-input token limits and support for shortened vectors of the supported models
+    MODELS = {
+        "text-embedding-3-small": {"dimensions": 1536, "max_input_tokens": 8191, "shortenable": True},
+        "text-embedding-3-large": {"dimensions": 3072, "max_input_tokens": 8191, "shortenable": True},
+        "text-embedding-ada-002": {"dimensions": 1536, "max_input_tokens": 8191, "shortenable": False}  # Legacy model
+    }
+
+    def __init__(self, model=OPENAI_EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS):
+        """
+        Args:
+            model (str): Embedding model name
+            dimensions (int): Shortened vector width requested from the API; 0 or None for the model's native width
+        """
+        if model not in self.MODELS:
+            error_msg = (
+                f"Unsupported embedding model: {model}. "
+                f"Supported models are: {list(self.MODELS.keys())}"
+            )
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        self.model = model
+        self.dimensions = self._resolve_dimensions(model, dimensions)
+        self.max_input_tokens = self.MODELS[model]["max_input_tokens"]
+        # Retries on 429 are handled by the shared scheduler
+        self.client = AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+
+    @classmethod
+    def _resolve_dimensions(cls, model, dimensions):
+        """Validate a requested vector width against the model, defaulting to its native width."""
+        native = cls.MODELS[model]["dimensions"]
+        if not dimensions or dimensions == native:
+            return native
+        if not cls.MODELS[model]["shortenable"]:
+            error_msg = f"Embedding model {model} does not support shortened vectors"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        if not 0 < dimensions < native:
+            error_msg = f"Embedding dimensions for {model} must be between 1 and {native}, got {dimensions}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        return dimensions
+
+    @classmethod
+    def configured_dimensions(cls):
+        return cls._resolve_dimensions(OPENAI_EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+
+    @property
+    def shortened(self):
+        """Whether vectors are requested below the model's native width."""
+        return self.dimensions != self.MODELS[self.model]["dimensions"]
+
+    @property
+    def cache_model(self):
+        # Shortened vectors differ from native ones, so they are cached under their own name
+        return f"{self.model}@{self.dimensions}" if self.shortened else self.model
+
+    async def embed(self, texts, token_count=None):
+        if token_count is None:
+            token_count = sum(len(text) // 4 + 1 for text in texts)
+
+        request = {"input": texts, "model": self.model, "encoding_format": "base64"}
+        if self.shortened:
+            request["dimensions"] = self.dimensions
+
+        response = await get_openai_scheduler().call(
+            self.model,
+            token_count,
+            self.client.embeddings.create,
+            **request
+        )
+
+        if sorted(data.index for data in response.data) != list(range(len(texts))):
+            raise ValueError("Embedding response is missing results for some inputs")
+
+        # The API tags each result with the index of its input
+        matrix = np.empty((len(texts), self.dimensions), dtype=np.float32)
+        for data in response.data:
+            embedding = self._to_array(data.embedding)
+            if len(embedding) != self.dimensions:
+                raise ValueError(
+                    f"Dimension mismatch error: Expected {self.dimensions}, got {len(embedding)} dimensions. "
+                    f"Model configured: {self.model}"
+                )
+            matrix[data.index] = embedding
+        return matrix
+
+    @staticmethod
+    def _to_array(embedding):
+        """Convert an API embedding (base64-encoded float32 or a list of floats) to a float32 array."""
+        if isinstance(embedding, str):
+            return np.frombuffer(base64.b64decode(embedding), dtype=np.float32)
+        return np.asarray(embedding, dtype=np.float32)
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Deterministic local embeddings built by feature hashing, with no network calls.
+
+    Word unigrams and bigrams are hashed into signed buckets and the result is
+    L2-normalized, so texts sharing vocabulary get similar vectors. Meant for
+    offline benchmarking and load tests, not for answer quality.
+    """
+    name = "hashing"
+    max_batch_items = 4096
+    max_batch_tokens = 10_000_000
+
+    _TOKEN_PATTERN = re.compile(r"[a-z0-9$.']+")
+
+    def __init__(self, dimensions=None):
+        self.dimensions = dimensions or self.configured_dimensions()
+        self.model = f"hashing-{self.dimensions}"
+
+    @classmethod
+    def configured_dimensions(cls):
+        return EMBEDDING_DIMENSIONS or LOCAL_EMBEDDING_DIMENSIONS
+
+    def _features(self, text):
+        """Return the hashed bucket indices and signs for a text's unigrams and bigrams."""
+        words = self._TOKEN_PATTERN.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        if not features:
+            features = [text]
+
+        indices = np.empty(len(features), dtype=np.int64)
+        signs = np.empty(len(features), dtype=np.float32)
+        for i, feature in enumerate(features):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            indices[i] = digest % self.dimensions
+            signs[i] = 1.0 if (digest >> 63) & 1 else -1.0
+        return indices, signs
+
+    async def embed(self, texts, token_count=None):
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            indices, signs = self._features(text)
+            np.add.at(matrix[row], indices, signs)
+
+        # Rows that cancel out to zero get a fixed unit component so they stay valid
+        norms = np.linalg.norm(matrix, axis=1)
+        zero_rows = norms == 0
+        matrix[zero_rows, 0] = 1.0
+        norms[zero_rows] = 1.0
+        return matrix / norms[:, None]
+
+# Backends selectable through EMBEDDING_BACKEND
+EMBEDDING_BACKENDS = {
+    OpenAIEmbeddingBackend.name: OpenAIEmbeddingBackend,
+    HashingEmbeddingBackend.name: HashingEmbeddingBackend
+}
+
+def register_embedding_backend(name, backend_class):
+    """Make an additional EmbeddingBackend subclass selectable by name."""
+    EMBEDDING_BACKENDS[name] = backend_class
+
+def get_embedding_dimensions(name=EMBEDDING_BACKEND):
+    """Return the vector width the configured backend produces, without creating a client."""
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name}")
+    return EMBEDDING_BACKENDS[name].configured_dimensions()
+
+def create_embedding_backend(name=EMBEDDING_BACKEND, **kwargs):
+    """Create the configured embedding backend."""
+    if name not in EMBEDDING_BACKENDS:
+        error_msg = (
+            f"Unknown embedding backend: {name}. "
+            f"Available backends are: {list(EMBEDDING_BACKENDS.keys())}"
+        )
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    return EMBEDDING_BACKENDS[name](**kwargs)
@@ -1,10 +1,12 @@
 # embeddings.py
 import logging
-from openai import OpenAI
 from config import (
-    OPENAI_API_KEY,
-    OPENAI_EMBEDDING_MODEL
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_MAX_TOKENS,
+    EMBEDDING_MAX_INPUT_TOKENS
 )
+from embedding_backends import create_embedding_backend
+from token_budget import TokenBudget
 import numpy as np
 from tenacity import retry, stop_after_attempt, wait_exponential
 
@@ -16,28 +18,26 @@ logging.basicConfig(
 logger = logging.getLogger("EmbeddingGenerator")
 
 class EmbeddingGenerator:
-    # Expected dimensions for different OpenAI embedding models
-    EXPECTED_DIMENSIONS = {
-        "text-embedding-3-small": 1536,
-        "text-embedding-3-large": 3072, 
-        "text-embedding-ada-002": 1536  # Legacy model
-    }
-
-    def __init__(self):
-        logger.info(f"Initializing EmbeddingGenerator with model: {OPENAI_EMBEDDING_MODEL}")
+    def __init__(self, backend=None):
+        """
+        Args:
+            backend (EmbeddingBackend): Optional backend; defaults to the one selected by EMBEDDING_BACKEND
+        """
+        self.backend = backend or create_embedding_backend()
+        self.model = self.backend.model
+        self.expected_dim = self.backend.dimensions
+        # Caches key vectors by this, so vectors of different widths never mix
+        self.cache_model = self.backend.cache_model
+        logger.info(f"Initializing EmbeddingGenerator with {self.backend.name} backend, model: {self.model}")
         
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        if OPENAI_EMBEDDING_MODEL not in self.EXPECTED_DIMENSIONS:
-            error_msg = (
-                f"Unsupported embedding model: {OPENAI_EMBEDDING_MODEL}. "
-                f"Supported models are: {list(self.EXPECTED_DIMENSIONS.keys())}"
-            )
-            logger.error(error_msg)
-            raise ValueError(error_msg)
-        
-        self.expected_dim = self.EXPECTED_DIMENSIONS[OPENAI_EMBEDDING_MODEL]
-        logger.info(f"Expected dimensions for {OPENAI_EMBEDDING_MODEL}: {self.expected_dim}")
+        # Configured batch limits apply on top of the backend's own request limits
+        self.token_budget = TokenBudget(
+            self.model,
+            max_input_tokens=min(EMBEDDING_MAX_INPUT_TOKENS, self.backend.max_input_tokens),
+            max_batch_items=min(EMBEDDING_BATCH_SIZE, self.backend.max_batch_items),
+            max_batch_tokens=min(EMBEDDING_BATCH_MAX_TOKENS, self.backend.max_batch_tokens)
+        )
+        logger.info(f"Expected dimensions for {self.model}: {self.expected_dim}")
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
     async def generate_embedding(self, text):
@@ -50,23 +50,14 @@ class EmbeddingGenerator:
             logger.error(f"Expected string input, got {type(text)}")
             raise TypeError(f"Expected string input, got {type(text)}")
             
-        # Truncate text if it's too long (OpenAI API has token limits)
-        if len(text) > 8000:
-            logger.warning(f"Text too long ({len(text)} chars), truncating to 8000 chars")
-            text = text[:8000]
+        # Truncate text at a token boundary if it exceeds the model's input limit
+        text, token_count = self.token_budget.truncate(text)
         
         try:
             logger.info(f"Generating embedding for text (length: {len(text)})")
             
             # Generate embedding
-            response = self.client.embeddings.create(
-                input=text,
-                model=OPENAI_EMBEDDING_MODEL,
-                encoding_format="float"
-            )
-            
-            # Extract embedding
-            embedding = response.data[0].embedding
+            embedding = (await self.backend.embed([text], token_count))[0]
             actual_dim = len(embedding)
             
             logger.info(f"Generated embedding with dimensions: {actual_dim}")
@@ -76,7 +67,7 @@ class EmbeddingGenerator:
                 error_msg = (
                     f"Dimension mismatch error: "
                     f"Expected {self.expected_dim}, got {actual_dim} dimensions. "
-                    f"Model configured: {OPENAI_EMBEDDING_MODEL}"
+                    f"Model configured: {self.model}"
                 )
                 logger.error(error_msg)
                 raise ValueError(error_msg)
@@ -91,25 +82,109 @@ class EmbeddingGenerator:
             logger.error(error_msg)
             raise
 
+    async def generate_embeddings(self, texts, token_counts=None):
+        """
+        Generate embeddings for many texts, packing several inputs into each request.
+
+        Args:
+            texts (list): The texts to embed
+            token_counts (list): Optional token count of each text, for texts already
+                passed through prepare_input, so they are not tokenized again
+
+        Returns:
+            tuple: (embeddings, failures) - a list aligned with texts holding each
+            float32 embedding (None where it failed) and a dict mapping input index to error message
+        """
+        embeddings = [None] * len(texts)
+        failures = {}
+
+        # Validate inputs up front so one bad item doesn't fail a whole request
+        pending = []
+        for i, text in enumerate(texts):
+            if not isinstance(text, str):
+                failures[i] = f"Expected string input, got {type(text)}"
+            elif not text:
+                failures[i] = "Text cannot be empty"
+            elif token_counts is not None:
+                pending.append((i, text, token_counts[i]))
+            else:
+                text, token_count = self.token_budget.truncate(text)
+                pending.append((i, text, token_count))
+
+        batches = self.token_budget.pack(pending)
+        logger.info(f"Generating embeddings for {len(pending)} texts in {len(batches)} requests")
+
+        for batch_number, batch in enumerate(batches, start=1):
+            batch_tokens = sum(token_count for _, _, token_count in batch)
+            try:
+                batch_embeddings = await self._embed_batch([text for _, text, _ in batch], batch_tokens)
+                for (i, _, _), embedding in zip(batch, batch_embeddings):
+                    embeddings[i] = embedding
+                logger.info(f"Embedded batch {batch_number}/{len(batches)} ({len(batch)} texts, {batch_tokens} tokens)")
+            except Exception as e:
+                # Fall back to one request per text to isolate the failing inputs
+                logger.warning(f"Batch {batch_number} failed ({str(e)}), retrying its {len(batch)} texts individually")
+                for i, text, _ in batch:
+                    try:
+                        embeddings[i] = await self.generate_embedding(text)
+                    except Exception as item_error:
+                        failures[i] = str(item_error)
+
+        for i, error in failures.items():
+            logger.error(f"Failed to generate embedding for text {i}: {error}")
+        logger.info(f"Generated {len(texts) - len(failures)}/{len(texts)} embeddings")
+
+        return embeddings, failures
+
+    def prepare_input(self, text):
+        """
+        Truncate a text to the model's input limit, tokenizing it once
+
+        Returns:
+            tuple: (text, token_count) - the embedding input and the tokens it uses
+        """
+        return self.token_budget.truncate(text)
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+    async def _embed_batch(self, texts, token_count=None):
+        """Embed a batch of texts in a single request, returning embeddings in input order."""
+        matrix = await self.backend.embed(texts, token_count)
+        self.validate_embeddings(matrix)
+
+        # Rows are views into the one contiguous matrix
+        return list(matrix)
+
     def _validate_embedding(self, embedding):
         """Validate embedding structure and values."""
-        if not isinstance(embedding, list):
-            raise ValueError(f"Embedding must be a list, got {type(embedding)}")
+        if not isinstance(embedding, np.ndarray):
+            raise ValueError(f"Embedding must be a numpy array, got {type(embedding)}")
             
-        if len(embedding) != self.expected_dim:
+        if embedding.shape != (self.expected_dim,):
             raise ValueError(
-                f"Invalid embedding dimensions. Expected {self.expected_dim}, got {len(embedding)}"
+                f"Invalid embedding dimensions. Expected {self.expected_dim}, got {embedding.shape}"
             )
             
-        if not all(isinstance(x, float) for x in embedding):
+        self.validate_embeddings(embedding.reshape(1, -1))
+        logger.info("Embedding validation successful")
+
+    def validate_embeddings(self, matrix):
+        """Validate an (N, D) matrix of embeddings in a single vectorized pass."""
+        if not isinstance(matrix, np.ndarray) or matrix.ndim != 2:
+            raise ValueError("Embeddings must be a 2-D numpy array")
+            
+        if matrix.shape[1] != self.expected_dim:
+            raise ValueError(
+                f"Invalid embedding dimensions. Expected {self.expected_dim}, got {matrix.shape[1]}"
+            )
+            
+        if not np.issubdtype(matrix.dtype, np.floating):
             raise ValueError("All embedding values must be floats")
             
         # Check for NaN or infinity values
-        if any(not np.isfinite(x) for x in embedding):
+        if not np.isfinite(matrix).all():
             raise ValueError("Embedding contains NaN or infinity values")
             
-        # Check if embedding is all zeros
-        if all(x == 0 for x in embedding):
-            raise ValueError("Invalid embedding: all values are zero")
-            
-        logger.info("Embedding validation successful")
\ No newline at end of file
+        # Check for embeddings that are all zeros
+        zero_rows = ~matrix.any(axis=1)
+        if zero_rows.any():
+            raise ValueError(f"Invalid embedding: all values are zero (rows {np.flatnonzero(zero_rows).tolist()})")
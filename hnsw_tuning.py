@@ -0,0 +1,231 @@
+# hnsw_tuning.py
+"""
+Choose HNSW parameters per index size tier from a recall/latency benchmark.
+
+The benchmark builds HNSW graphs (with hnswlib) over a tenant's real vectors for
+a grid of m, efConstruction and efSearch values, and measures recall@k against
+exact search and p50/p99 query latency. At most HNSW_BENCHMARK_MAX_VECTORS
+vectors are read; the tier is chosen from the tenant's full document count. The cheapest setting reaching
+HNSW_TARGET_RECALL is saved for the tenant's size tier and used by
+VectorStore.create_index for every index of that tier.
+
+Usage:
+    python hnsw_tuning.py --user USER [--k 10] [--queries 200] [--max-vectors 20000]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+import numpy as np
+from config import (
+    HNSW_SMALL_INDEX_MAX_DOCUMENTS,
+    HNSW_MEDIUM_INDEX_MAX_DOCUMENTS,
+    HNSW_TUNING_PATH,
+    HNSW_TARGET_RECALL,
+    HNSW_BENCHMARK_QUERIES,
+    HNSW_BENCHMARK_MAX_VECTORS
+)
+
+try:
+    import hnswlib
+except ImportError:  # hnswlib is only needed to run the benchmark
+    hnswlib = None
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("HnswTuning")
+
+# Parameters used for a tier until the benchmark has been run for it
+DEFAULT_TIER_PARAMETERS = {
+    "small": {"m": 4, "efConstruction": 100, "efSearch": 100},
+    "medium": {"m": 8, "efConstruction": 400, "efSearch": 200},
+    "large": {"m": 10, "efConstruction": 400, "efSearch": 500}
+}
+
+# Grid searched by the benchmark, within the ranges Azure Search accepts
+PARAMETER_GRID = {
+    "m": [4, 6, 8, 10],
+    "efConstruction": [100, 400],
+    "efSearch": [100, 200, 500]
+}
+
+def index_tier(document_count):
+    """
+    Return the size tier of an index
+
+    Args:
+        document_count (int): Documents the index will hold, or None if unknown
+
+    Returns:
+        str: "small", "medium" or "large"; unknown sizes, such as the shared
+        index, are treated as large
+    """
+    if document_count is None:
+        return "large"
+    if document_count <= HNSW_SMALL_INDEX_MAX_DOCUMENTS:
+        return "small"
+    if document_count <= HNSW_MEDIUM_INDEX_MAX_DOCUMENTS:
+        return "medium"
+    return "large"
+
+def load_tuning(path=HNSW_TUNING_PATH):
+    """Return the benchmark results saved per tier, or an empty dict."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error reading HNSW tuning from {path}: {str(e)}")
+        return {}
+
+def save_tuning(tier, result, path=HNSW_TUNING_PATH):
+    """Save the chosen benchmark result for a tier, keeping the other tiers."""
+    tuning = load_tuning(path)
+    tuning[tier] = result
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(tuning, f, indent=2)
+    os.replace(temp_path, path)
+    logger.info(f"Saved HNSW parameters for the {tier} tier: {result['parameters']}")
+
+def get_hnsw_settings(document_count):
+    """
+    Get the HNSW parameters for a new index
+
+    Args:
+        document_count (int): Documents the index will hold, or None if unknown
+
+    Returns:
+        dict: The tier, its HNSW parameters, and the recall measured for them
+        (None when the tier has not been benchmarked)
+    """
+    tier = index_tier(document_count)
+    tuned = load_tuning().get(tier)
+    if tuned:
+        return {"tier": tier, "parameters": tuned["parameters"], "recall": tuned.get("recall"), "tuned": True}
+    return {"tier": tier, "parameters": dict(DEFAULT_TIER_PARAMETERS[tier]), "recall": None, "tuned": False}
+
+def benchmark_hnsw(vectors, k=10, queries=HNSW_BENCHMARK_QUERIES, grid=PARAMETER_GRID, seed=0):
+    """
+    Measure recall@k and query latency of HNSW over a grid of parameters
+
+    A random sample of the vectors is held out as queries; the rest are indexed.
+    Graphs are built once per (m, efConstruction) and queried at each efSearch.
+
+    Args:
+        vectors (np.ndarray): Document vectors, one per row
+        k (int): Neighbours retrieved per query
+        queries (int): Vectors held out as queries
+        grid (dict): Values of m, efConstruction and efSearch to try
+
+    Returns:
+        list: One dict per setting with its parameters, recall, p50_ms and p99_ms
+    """
+    if hnswlib is None:
+        raise RuntimeError("The HNSW benchmark requires hnswlib (pip install hnswlib)")
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    query_count = min(queries, len(vectors) // 5)
+    query_vectors = vectors[order[:query_count]]
+    indexed = vectors[order[query_count:]]
+    k = min(k, len(indexed))
+    if not query_count or not k:
+        raise ValueError(f"Not enough vectors to benchmark ({len(vectors)})")
+
+    # Exact top-k by cosine similarity is the ground truth
+    similarities = query_vectors @ indexed.T
+    exact = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+
+    results = []
+    for m in grid["m"]:
+        for ef_construction in grid["efConstruction"]:
+            graph = hnswlib.Index(space="cosine", dim=indexed.shape[1])
+            graph.init_index(max_elements=len(indexed), ef_construction=ef_construction, M=m, random_seed=seed)
+            graph.add_items(indexed, np.arange(len(indexed)))
+            # Latency is per query on one thread, as a single search request would run
+            graph.set_num_threads(1)
+
+            for ef_search in grid["efSearch"]:
+                graph.set_ef(max(ef_search, k))
+                latencies = []
+                hits = 0
+                for row, query in enumerate(query_vectors):
+                    started = time.perf_counter()
+                    labels, _ = graph.knn_query(query, k=k)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    hits += len(set(labels[0].tolist()) & set(exact[row].tolist()))
+
+                results.append({
+                    "parameters": {"m": m, "efConstruction": ef_construction, "efSearch": ef_search},
+                    "recall": hits / (query_count * k),
+                    "p50_ms": float(np.percentile(latencies, 50)),
+                    "p99_ms": float(np.percentile(latencies, 99))
+                })
+                logger.info(
+                    f"m={m} efConstruction={ef_construction} efSearch={ef_search}: "
+                    f"recall@{k}={results[-1]['recall']:.3f} p50={results[-1]['p50_ms']:.3f}ms p99={results[-1]['p99_ms']:.3f}ms"
+                )
+    return results
+
+def choose_parameters(results, target_recall=HNSW_TARGET_RECALL):
+    """
+    Pick the benchmark result to use
+
+    Returns:
+        dict: The lowest-p99 result reaching target_recall, or the highest-recall
+        result if none does
+    """
+    acceptable = [result for result in results if result["recall"] >= target_recall]
+    if acceptable:
+        return min(acceptable, key=lambda result: (result["p99_ms"], -result["recall"]))
+    logger.warning(f"No HNSW setting reached recall {target_recall}, using the most accurate one")
+    return max(results, key=lambda result: (result["recall"], -result["p99_ms"]))
+
+async def tune_user(user_id, k=10, queries=HNSW_BENCHMARK_QUERIES, max_vectors=HNSW_BENCHMARK_MAX_VECTORS):
+    """
+    Benchmark HNSW on a sample of a user's indexed vectors and save the choice for their tier
+
+    Returns:
+        dict: The chosen result, with the tier, document count and k
+    """
+    from search import VectorStore
+    from search_clients import close_search_clients
+
+    try:
+        store = VectorStore(user_id)
+        document_count = await store.get_document_count()
+        vectors = await store.get_document_vectors(max_vectors)
+    finally:
+        await close_search_clients()
+
+    tier = index_tier(document_count)
+    logger.info(
+        f"Benchmarking HNSW on {len(vectors)} of {document_count} vectors of user {user_id} ({tier} tier)"
+    )
+    results = await asyncio.to_thread(benchmark_hnsw, vectors, k, queries)
+
+    choice = dict(choose_parameters(results))
+    choice.update({"documents": document_count, "sampled": len(vectors), "k": k, "tuned_at": time.time()})
+    save_tuning(tier, choice)
+    return dict(choice, tier=tier)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HNSW parameters on a user's vectors")
+    parser.add_argument("--user", required=True, help="User whose indexed vectors are benchmarked")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query for recall@k")
+    parser.add_argument("--queries", type=int, default=HNSW_BENCHMARK_QUERIES, help="Vectors held out as queries")
+    parser.add_argument("--max-vectors", type=int, default=HNSW_BENCHMARK_MAX_VECTORS, help="Most vectors read from the index")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(tune_user(args.user, args.k, args.queries, args.max_vectors)), indent=2))
@@ -0,0 +1,109 @@
+# index_catalog.py
+import asyncio
+import logging
+import time
+from config import INDEX_CATALOG_REFRESH_SECONDS
+from search_clients import get_index_client
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("IndexCatalog")
+
+class IndexCatalog:
+    """
+    Process-wide, in-memory set of the index names in the search service.
+
+    Loaded once on first use and refreshed in the background, so existence checks
+    are set lookups. Indexes this process creates or deletes are applied
+    immediately and survive a refresh that was already in flight.
+    """
+    def __init__(self, refresh_seconds=INDEX_CATALOG_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._names = set()
+        self._loaded = False
+        self._last_refresh = None
+        self._refresh_lock = asyncio.Lock()
+        self._local_changes = {}
+        self._task = None
+
+    async def refresh(self):
+        """Reload the index names from the search service."""
+        async with self._refresh_lock:
+            started_at = time.monotonic()
+            names = {name async for name in get_index_client().list_index_names()}
+
+            # Creations and deletions made while the listing ran take precedence over it
+            for name, (present, changed_at) in list(self._local_changes.items()):
+                if changed_at >= started_at:
+                    if present:
+                        names.add(name)
+                    else:
+                        names.discard(name)
+                else:
+                    del self._local_changes[name]
+
+            self._names = names
+            self._loaded = True
+            self._last_refresh = time.time()
+            logger.info(f"Index catalog refreshed with {len(names)} indexes")
+
+    async def exists(self, index_name):
+        """Check whether an index exists, loading the catalog on first use."""
+        if not self._loaded:
+            await self.refresh()
+        return index_name in self._names
+
+    def add(self, index_name):
+        """Record an index this process just created."""
+        self._names.add(index_name)
+        self._local_changes[index_name] = (True, time.monotonic())
+
+    def discard(self, index_name):
+        """Record an index this process just deleted."""
+        self._names.discard(index_name)
+        self._local_changes[index_name] = (False, time.monotonic())
+
+    def start(self):
+        """Start refreshing the catalog in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """Stop the background refresh."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep serving the last known catalog until the service is reachable again
+                logger.error(f"Error refreshing index catalog: {str(e)}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    def stats(self):
+        """Return the catalog size and when it was last refreshed."""
+        return {
+            "indexes": len(self._names),
+            "loaded": self._loaded,
+            "last_refresh": self._last_refresh,
+            "refresh_seconds": self.refresh_seconds
+        }
+
+_index_catalog = None
+
+def get_index_catalog():
+    """Return the process-wide index catalog."""
+    global _index_catalog
+    if _index_catalog is None:
+        _index_catalog = IndexCatalog()
+    return _index_catalog
@@ -0,0 +1,144 @@
+# index_registry.py
+import json
+import logging
+import sqlite3
+import threading
+import time
+from config import INDEX_REGISTRY_PATH
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("IndexRegistry")
+
+class IndexRegistry:
+    """
+    Durable pointer from each user to the search index currently serving their queries.
+
+    Full rebuilds write to a versioned shadow index and then switch this pointer,
+    so queries never see a half-built or empty index. The replaced index is
+    recorded as a pending deletion, so it is removed even if the process that
+    switched the pointer exits before the grace period ends.
+    """
+    def __init__(self, path=INDEX_REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS index_pointers (
+                user_id TEXT PRIMARY KEY,
+                index_name TEXT NOT NULL,
+                document_count INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS index_settings (
+                index_name TEXT PRIMARY KEY,
+                settings TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pending_deletions (
+                index_name TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                delete_after REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        logger.info(f"Initialized IndexRegistry at {path}")
+
+    def get_active(self, user_id):
+        """Return the active index record for a user, or None if none was registered."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT index_name, document_count, updated_at FROM index_pointers WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"index_name": row[0], "document_count": row[1], "updated_at": row[2]}
+
+    def set_active(self, user_id, index_name, document_count):
+        """Atomically point a user at a new index."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO index_pointers (user_id, index_name, document_count, updated_at) VALUES (?, ?, ?, ?)",
+                (user_id, index_name, document_count, time.time())
+            )
+            self._conn.commit()
+        logger.info(f"Active index for user {user_id} is now {index_name}")
+
+    def record_index_settings(self, index_name, settings):
+        """Record the settings an index was created with, e.g. its HNSW parameters."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO index_settings (index_name, settings, created_at) VALUES (?, ?, ?)",
+                (index_name, json.dumps(settings), time.time())
+            )
+            self._conn.commit()
+
+    def get_index_settings(self, index_name):
+        """Return the settings recorded for an index, or None for indexes created before they were recorded."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT settings, created_at FROM index_settings WHERE index_name = ?", (index_name,)
+            ).fetchone()
+        if not row:
+            return None
+        return dict(json.loads(row[0]), created_at=row[1])
+
+    def forget_index_settings(self, index_name):
+        """Drop the settings of a deleted index."""
+        with self._lock:
+            self._conn.execute("DELETE FROM index_settings WHERE index_name = ?", (index_name,))
+            self._conn.commit()
+
+    def schedule_deletion(self, index_name, user_id, delete_after):
+        """Record that a replaced index should be deleted once delete_after (a timestamp) has passed."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pending_deletions (index_name, user_id, delete_after) VALUES (?, ?, ?)",
+                (index_name, user_id, delete_after)
+            )
+            self._conn.commit()
+
+    def get_pending_deletions(self):
+        """Return every pending index deletion, earliest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT index_name, user_id, delete_after FROM pending_deletions ORDER BY delete_after"
+            ).fetchall()
+        return [{"index_name": row[0], "user_id": row[1], "delete_after": row[2]} for row in rows]
+
+    def forget_deletion(self, index_name):
+        """Drop the pending deletion of an index that was deleted, or is active again."""
+        with self._lock:
+            self._conn.execute("DELETE FROM pending_deletions WHERE index_name = ?", (index_name,))
+            self._conn.commit()
+
+    def is_active_anywhere(self, index_name):
+        """Check whether any user's pointer still references an index."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM index_pointers WHERE index_name = ? LIMIT 1", (index_name,)
+            ).fetchone()
+        return row is not None
+
+_index_registry = None
+
+def get_index_registry():
+    """Return the process-wide index registry."""
+    global _index_registry
+    if _index_registry is None:
+        _index_registry = IndexRegistry()
+    return _index_registry
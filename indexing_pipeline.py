@@ -0,0 +1,253 @@
+# indexing_pipeline.py
+import asyncio
+import logging
+import time
+from config import (
+    EMBEDDING_CONCURRENCY,
+    INDEX_QUEUE_SIZE,
+    INDEX_UPLOAD_BATCH_SIZE,
+    SEARCH_UPLOAD_CONCURRENCY
+)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("IndexingPipeline")
+
+# Marks the end of a stage's output on a queue
+_DONE = object()
+
+class IndexingPipeline:
+    """
+    Three-stage asyncio pipeline that builds item content, embeds it and uploads
+    the resulting documents, with the stages joined by bounded queues
+    """
+    def __init__(self, embedding_generator, vector_store, create_content, create_document,
+                 embedding_cache=None, concurrency=EMBEDDING_CONCURRENCY, queue_size=INDEX_QUEUE_SIZE,
+                 upload_batch_size=INDEX_UPLOAD_BATCH_SIZE, upload_concurrency=SEARCH_UPLOAD_CONCURRENCY,
+                 on_uploaded=None):
+        """
+        Args:
+            embedding_generator (EmbeddingGenerator): Generates the embeddings
+            vector_store (VectorStore): Receives the finished documents
+            create_content (callable): Builds the searchable text for an item
+            create_document (callable): Builds the index document from (item, content, embedding)
+            embedding_cache (EmbeddingCache): Optional cache consulted before calling the embeddings API
+            concurrency (int): Number of embeddings requests allowed in flight
+            queue_size (int): Maximum batches waiting between stages
+            upload_batch_size (int): Documents sent to the vector store per upload
+            upload_concurrency (int): Number of uploads allowed in flight
+            on_uploaded (callable): Optional callback receiving each batch of documents once it is uploaded
+        """
+        self.embedding_generator = embedding_generator
+        self.vector_store = vector_store
+        self.create_content = create_content
+        self.create_document = create_document
+        self.embedding_cache = embedding_cache
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(1, queue_size)
+        self.upload_batch_size = max(1, upload_batch_size)
+        self.upload_concurrency = max(1, upload_concurrency)
+        self.on_uploaded = on_uploaded
+        self.stats = {}
+
+    async def run(self, items):
+        """
+        Run all items through the pipeline
+
+        Args:
+            items (iterable): Inventory items to index, either a regular or an async iterable
+
+        Returns:
+            dict: Counts of items seen, embedded, failed, uploaded and failed to upload, distinct documents
+            uploaded, embedding cache hits, embeddings requests and tokens sent, and
+            elapsed seconds
+        """
+        start_time = time.time()
+        self._document_ids = set()
+        self.stats = {
+            "items": 0, "embedded": 0, "failed": 0, "uploaded": 0, "upload_failed": 0, "upload_batches": 0,
+            "cache_hits": 0, "cache_misses": 0, "tokens_sent": 0, "embedding_requests": 0
+        }
+
+        embed_queue = asyncio.Queue(maxsize=self.queue_size)
+        upload_queue = asyncio.Queue(maxsize=self.queue_size)
+        batch_queue = asyncio.Queue(maxsize=self.upload_concurrency)
+
+        self._active_embedders = self.concurrency
+        tasks = [asyncio.create_task(self._content_stage(items, embed_queue))]
+        tasks += [
+            asyncio.create_task(self._embed_stage(embed_queue, upload_queue))
+            for _ in range(self.concurrency)
+        ]
+        tasks.append(asyncio.create_task(self._upload_stage(upload_queue, batch_queue)))
+        tasks += [
+            asyncio.create_task(self._upload_worker(batch_queue))
+            for _ in range(self.upload_concurrency)
+        ]
+
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # A failed stage would leave the others blocked on their queues
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        self.stats["documents"] = len(self._document_ids)
+        lookups = self.stats["cache_hits"] + self.stats["cache_misses"]
+        self.stats["cache_hit_rate"] = round(self.stats["cache_hits"] / lookups, 4) if lookups else 0.0
+        self.stats["elapsed_seconds"] = round(time.time() - start_time, 3)
+        logger.info(f"Indexing pipeline finished: {self.stats}")
+        return self.stats
+
+    async def _content_stage(self, items, embed_queue):
+        """Build content for each item and group items into embedding batches."""
+        batch = []
+        batch_tokens = 0
+
+        async for item in self._iterate(items):
+            self.stats["items"] += 1
+            content = self.create_content(item)
+            # The counted text is what gets embedded, so it is never tokenized a second time
+            text, tokens = self.embedding_generator.prepare_input(content)
+
+            # Fill each batch as close to the per-request token ceiling as allowed
+            if self.embedding_generator.token_budget.batch_is_full(len(batch), batch_tokens, tokens):
+                await embed_queue.put(batch)
+                batch = []
+                batch_tokens = 0
+
+            batch.append((item, content, text, tokens))
+            batch_tokens += tokens
+
+        if batch:
+            await embed_queue.put(batch)
+
+        # One end marker per embedding worker
+        for _ in range(self.concurrency):
+            await embed_queue.put(_DONE)
+
+    @staticmethod
+    async def _iterate(items):
+        """Iterate over a regular or async iterable of items."""
+        if hasattr(items, '__aiter__'):
+            async for item in items:
+                yield item
+        else:
+            for item in items:
+                yield item
+
+    async def _embed_stage(self, embed_queue, upload_queue):
+        """Embed batches from the queue and pass the finished documents on."""
+        while True:
+            batch = await embed_queue.get()
+            if batch is _DONE:
+                # The last worker to finish closes the upload stage
+                self._active_embedders -= 1
+                if not self._active_embedders:
+                    await upload_queue.put(_DONE)
+                return
+
+            embeddings, failures = await self._embed(
+                [text for _, _, text, _ in batch],
+                [tokens for _, _, _, tokens in batch]
+            )
+
+            documents = []
+            for i, ((item, content, _, _), embedding) in enumerate(zip(batch, embeddings)):
+                if embedding is None:
+                    self.stats["failed"] += 1
+                    logger.error(f"Error processing item {item.get('Inventory Item Name', 'Unknown')}: {failures.get(i, 'no embedding generated')}")
+                    continue
+                try:
+                    documents.append(self.create_document(item, content, embedding))
+                    self.stats["embedded"] += 1
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.error(f"Error building document for {item.get('Inventory Item Name', 'Unknown')}: {str(e)}")
+
+            if documents:
+                await upload_queue.put(documents)
+
+    async def _embed(self, texts, token_counts):
+        """Embed texts, serving unchanged content from the embedding cache when available."""
+        if not self.embedding_cache:
+            self._record_request(sum(token_counts))
+            return await self.embedding_generator.generate_embeddings(texts, token_counts)
+
+        model = self.embedding_generator.cache_model
+        # SQLite reads and writes run in a worker thread so other pipeline stages keep going
+        cached = await asyncio.to_thread(self.embedding_cache.get_many, model, texts)
+        self.stats["cache_hits"] += len(cached)
+        self.stats["cache_misses"] += len(texts) - len(cached)
+
+        embeddings = [cached.get(i) for i in range(len(texts))]
+        failures = {}
+        missing = [i for i in range(len(texts)) if i not in cached]
+
+        if missing:
+            self._record_request(sum(token_counts[i] for i in missing))
+            fresh, fresh_failures = await self.embedding_generator.generate_embeddings(
+                [texts[i] for i in missing], [token_counts[i] for i in missing]
+            )
+            for position, i in enumerate(missing):
+                embeddings[i] = fresh[position]
+                if position in fresh_failures:
+                    failures[i] = fresh_failures[position]
+            await asyncio.to_thread(self.embedding_cache.put_many, model, [texts[i] for i in missing], fresh)
+
+        return embeddings, failures
+
+    def _record_request(self, tokens):
+        """Count an embeddings request and the tokens sent with it."""
+        self.stats["embedding_requests"] += 1
+        self.stats["tokens_sent"] += tokens
+        logger.info(f"Sending embeddings request {self.stats['embedding_requests']} with {tokens} tokens")
+
+    async def _upload_stage(self, upload_queue, batch_queue):
+        """Cut documents into upload batches as soon as a full batch has accumulated."""
+        pending = []
+
+        while True:
+            documents = await upload_queue.get()
+            if documents is _DONE:
+                break
+
+            pending.extend(documents)
+            while len(pending) >= self.upload_batch_size:
+                await batch_queue.put(pending[:self.upload_batch_size])
+                pending = pending[self.upload_batch_size:]
+
+        if pending:
+            await batch_queue.put(pending)
+
+        # One end marker per upload worker
+        for _ in range(self.upload_concurrency):
+            await batch_queue.put(_DONE)
+
+    async def _upload_worker(self, batch_queue):
+        """Upload batches from the queue; several workers keep uploads in flight side by side."""
+        while True:
+            documents = await batch_queue.get()
+            if documents is _DONE:
+                return
+            await self._upload(documents)
+
+    async def _upload(self, documents):
+        """Send one batch of documents to the vector store, counting only those that landed."""
+        self.stats["upload_batches"] += 1
+        logger.info(f"Uploading batch {self.stats['upload_batches']} with {len(documents)} documents")
+        summary = await self.vector_store.add_documents(documents)
+
+        failed_ids = set(summary.get("failed_ids", []))
+        uploaded = [document for document in documents if document["id"] not in failed_ids]
+        self.stats["uploaded"] += len(uploaded)
+        self.stats["upload_failed"] += summary.get("failed", 0)
+        self._document_ids.update(document["id"] for document in uploaded)
+        if self.on_uploaded and uploaded:
+            # Callbacks write checkpoints to SQLite, so keep them off the event loop
+            await asyncio.to_thread(self.on_uploaded, uploaded)
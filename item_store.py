@@ -0,0 +1,152 @@
+# item_store.py
+import json
+import logging
+import sqlite3
+import threading
+import time
+from config import ITEM_STORE_PATH
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("ItemStore")
+
+class ItemStore:
+    """
+    Local copy of the fields of every indexed document, keyed by index, user and document id.
+
+    Written alongside every upload to and delete from the search index, so searches
+    can ask Azure Search for ids and scores only and read the fields from here.
+    Entries of an index are purged when the index is deleted or recreated.
+    Vectors are not stored.
+    """
+    def __init__(self, path=ITEM_STORE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(items)")]
+        if columns and "index_name" not in columns:
+            # Stores written before entries were keyed by index; missing entries are refetched
+            logger.info("Dropping item store entries that are not keyed by index")
+            self._conn.execute("DROP TABLE items")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                index_name TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                id TEXT NOT NULL,
+                fields TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (index_name, user_id, id)
+            )
+            """
+        )
+        self._conn.commit()
+        logger.info(f"Initialized ItemStore at {path}")
+
+    def upsert_items(self, index_name, user_id, documents):
+        """Store the fields of indexed documents, dropping their vectors."""
+        now = time.time()
+        rows = [
+            (
+                index_name,
+                user_id,
+                document["id"],
+                json.dumps({key: value for key, value in document.items() if key != "content_vector"}),
+                now
+            )
+            for document in documents
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO items (index_name, user_id, id, fields, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def delete_items(self, index_name, user_id, document_ids):
+        """Forget documents deleted from the index."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM items WHERE index_name = ? AND user_id = ? AND id = ?",
+                [(index_name, user_id, document_id) for document_id in document_ids]
+            )
+            self._conn.commit()
+
+    def purge_index(self, index_name, user_id=None):
+        """
+        Forget every document of an index, or of one user on it
+
+        Returns:
+            int: Number of entries removed
+        """
+        with self._lock:
+            if user_id is None:
+                cursor = self._conn.execute("DELETE FROM items WHERE index_name = ?", (index_name,))
+            else:
+                cursor = self._conn.execute(
+                    "DELETE FROM items WHERE index_name = ? AND user_id = ?", (index_name, user_id)
+                )
+            self._conn.commit()
+        if cursor.rowcount:
+            logger.info(f"Purged {cursor.rowcount} item store entries of {index_name}")
+        return cursor.rowcount
+
+    def get_items(self, index_name, user_id, document_ids):
+        """
+        Look up stored documents
+
+        Args:
+            index_name (str): Index the documents were uploaded to
+            user_id (str): Owner of the documents
+            document_ids (list): Document ids to read
+
+        Returns:
+            dict: Maps each stored document id to its fields
+        """
+        if not document_ids:
+            return {}
+
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(document_ids), 500):
+                chunk = document_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT id, fields FROM items WHERE index_name = ? AND user_id = ? AND id IN ({placeholders})",
+                    [index_name, user_id, *chunk]
+                ).fetchall()
+                found.update((document_id, json.loads(fields)) for document_id, fields in rows)
+
+        self.hits += len(found)
+        self.misses += len(set(document_ids)) - len(found)
+        return found
+
+    def stats(self):
+        """Return hit/miss counters and the number of stored items."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries
+        }
+
+_item_store = None
+
+def get_item_store():
+    """Return the process-wide item store."""
+    global _item_store
+    if _item_store is None:
+        _item_store = ItemStore()
+    return _item_store
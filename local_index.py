@@ -0,0 +1,485 @@
+# local_index.py
+import logging
+import math
+import re
+import sys
+import numpy as np
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalVectorIndex")
+
+class UnsupportedFilterError(ValueError):
+    """Raised for OData filters the local index cannot evaluate; callers fall back to Azure Search."""
+
+_TOKEN_PATTERN = re.compile(
+    r"\s*(?:(?P<string>'(?:[^']|'')*')|(?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)"
+    r"|(?P<punct>[(),])|(?P<name>[A-Za-z_][\w.]*))"
+)
+
+def _tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN_PATTERN.match(expression, position)
+        if not match or match.end() == position:
+            raise UnsupportedFilterError(f"Cannot parse filter near: {expression[position:]}")
+        position = match.end()
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "string":
+            tokens.append(("value", text[1:-1].replace("''", "'")))
+        elif kind == "number":
+            tokens.append(("value", float(text)))
+        elif kind == "name" and text in ("true", "false"):
+            tokens.append(("value", text == "true"))
+        elif kind == "name" and text == "null":
+            tokens.append(("value", None))
+        else:
+            tokens.append((kind, text))
+    return tokens
+
+_COMPARISONS = {
+    "eq": lambda a, b: a == b,
+    "ne": lambda a, b: a != b,
+    "gt": lambda a, b: a is not None and b is not None and a > b,
+    "ge": lambda a, b: a is not None and b is not None and a >= b,
+    "lt": lambda a, b: a is not None and b is not None and a < b,
+    "le": lambda a, b: a is not None and b is not None and a <= b,
+}
+
+class _FilterParser:
+    """
+    Recursive-descent parser for the OData subset we send to Azure Search:
+    eq/ne/gt/ge/lt/le comparisons, and/or/not, parentheses and search.in().
+    """
+    def __init__(self, expression):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+
+    def parse(self):
+        predicate = self._or()
+        if self.position != len(self.tokens):
+            raise UnsupportedFilterError(f"Unexpected token {self.tokens[self.position][1]!r}")
+        return predicate
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _next(self):
+        token = self._peek()
+        self.position += 1
+        return token
+
+    def _expect(self, text):
+        if self._next()[1] != text:
+            raise UnsupportedFilterError(f"Expected {text!r} in filter")
+
+    def _or(self):
+        predicates = [self._and()]
+        while self._peek() == ("name", "or"):
+            self._next()
+            predicates.append(self._and())
+        if len(predicates) == 1:
+            return predicates[0]
+        return lambda doc: any(predicate(doc) for predicate in predicates)
+
+    def _and(self):
+        predicates = [self._not()]
+        while self._peek() == ("name", "and"):
+            self._next()
+            predicates.append(self._not())
+        if len(predicates) == 1:
+            return predicates[0]
+        return lambda doc: all(predicate(doc) for predicate in predicates)
+
+    def _not(self):
+        if self._peek() == ("name", "not"):
+            self._next()
+            predicate = self._not()
+            return lambda doc: not predicate(doc)
+        return self._primary()
+
+    def _primary(self):
+        kind, text = self._next()
+        if (kind, text) == ("punct", "("):
+            predicate = self._or()
+            self._expect(")")
+            return predicate
+
+        if (kind, text) == ("name", "search.in"):
+            return self._search_in()
+
+        if kind != "name":
+            raise UnsupportedFilterError(f"Expected a field name, got {text!r}")
+        field = text
+
+        operator_kind, operator = self._next()
+        if operator_kind != "name" or operator not in _COMPARISONS:
+            raise UnsupportedFilterError(f"Unsupported filter operator {operator!r}")
+
+        value_kind, value = self._next()
+        if value_kind != "value":
+            raise UnsupportedFilterError(f"Expected a literal after {field} {operator}")
+
+        compare = _COMPARISONS[operator]
+        return lambda doc: compare(doc.get(field), value)
+
+    def _search_in(self):
+        self._expect("(")
+        kind, field = self._next()
+        if kind != "name":
+            raise UnsupportedFilterError("search.in expects a field name")
+        self._expect(",")
+        kind, values = self._next()
+        if kind != "value" or not isinstance(values, str):
+            raise UnsupportedFilterError("search.in expects a string of values")
+        delimiters = " ,"
+        if self._peek() == ("punct", ","):
+            self._next()
+            kind, delimiters = self._next()
+            if kind != "value" or not isinstance(delimiters, str):
+                raise UnsupportedFilterError("search.in expects a string of delimiters")
+        self._expect(")")
+        allowed = {value for value in re.split("[" + re.escape(delimiters) + "]", values) if value}
+        return lambda doc: doc.get(field) in allowed
+
+def compile_filter(expression):
+    """
+    Compile an OData filter expression into a predicate over document dicts
+
+    Args:
+        expression (str): Filter in the subset of OData syntax supported locally
+
+    Returns:
+        callable: Predicate taking a document dict and returning a bool
+
+    Raises:
+        UnsupportedFilterError: If the expression uses syntax outside the supported subset
+    """
+    return _FilterParser(expression).parse()
+
+# Fields scored by the lexical side of hybrid search
+LEXICAL_FIELDS = ("content", "item_name", "item_number")
+
+# Rank constant for reciprocal-rank fusion, the value Azure Search uses
+RRF_K = 60
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize_text(text):
+    """Lowercase text into alphanumeric terms, folding apostrophes so "Hellmann's" matches "hellmanns"."""
+    return _WORD_PATTERN.findall(str(text or "").lower().replace("'", "").replace("\u2019", ""))
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Fuse several ranked lists of keys into one ranking
+
+    Args:
+        rankings (list): Ranked lists of keys, best first
+        k (int): Rank constant damping the weight of top positions
+
+    Returns:
+        list: (key, score) pairs sorted by fused score, best first
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+
+class LexicalIndex:
+    """
+    Incrementally maintained BM25 index over a few text fields of each document.
+
+    Postings map each term to per-document term frequencies, so upserts and
+    deletes only touch the terms of the documents involved.
+    """
+    def __init__(self, fields=LEXICAL_FIELDS, k1=1.2, b=0.75):
+        self.fields = fields
+        self.k1 = k1
+        self.b = b
+        self._postings = {}
+        self._document_terms = {}
+        self._lengths = {}
+        self._total_length = 0
+
+    def upsert(self, document_id, document):
+        """Index (or re-index) the lexical fields of a document."""
+        self.delete(document_id)
+        frequencies = {}
+        for field in self.fields:
+            for term in tokenize_text(document.get(field)):
+                frequencies[term] = frequencies.get(term, 0) + 1
+        for term, frequency in frequencies.items():
+            self._postings.setdefault(term, {})[document_id] = frequency
+        self._document_terms[document_id] = tuple(frequencies)
+        length = sum(frequencies.values())
+        self._lengths[document_id] = length
+        self._total_length += length
+
+    def delete(self, document_id):
+        """Remove a document's terms, ignoring unknown ids."""
+        length = self._lengths.pop(document_id, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in self._document_terms.pop(document_id):
+            postings = self._postings[term]
+            del postings[document_id]
+            if not postings:
+                del self._postings[term]
+
+    def scores(self, query_text):
+        """Return BM25 scores for every document matching at least one query term."""
+        document_count = len(self._lengths)
+        if not document_count:
+            return {}
+        average_length = self._total_length / document_count or 1.0
+
+        scores = {}
+        for term in set(tokenize_text(query_text)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for document_id, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[document_id] / average_length)
+                scores[document_id] = scores.get(document_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+class LocalVectorIndex:
+    """
+    Exact cosine top-k over an in-memory float32 matrix holding one tenant's documents,
+    with a BM25 index alongside it for hybrid queries.
+
+    Rows are L2-normalized on insert, so a query is a single matrix-vector product.
+    Storage grows by doubling, and deletes move the last row into the freed slot.
+    """
+    def __init__(self, dimensions):
+        self.dimensions = dimensions
+        self._matrix = np.zeros((0, dimensions), dtype=np.float32)
+        self._ids = []
+        self._rows = {}
+        self._documents = []
+        self._lexical = LexicalIndex()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def upsert(self, documents):
+        """Insert or replace documents, each carrying an id and a content_vector."""
+        for document in documents:
+            vector = np.asarray(document["content_vector"], dtype=np.float32)
+            if vector.shape != (self.dimensions,):
+                logger.warning(f"Skipping document {document.get('id')} with vector shape {vector.shape}")
+                continue
+            norm = np.linalg.norm(vector)
+            if norm:
+                vector = vector / norm
+
+            fields = {key: value for key, value in document.items() if key != "content_vector"}
+            row = self._rows.get(document["id"])
+            if row is None:
+                row = len(self._ids)
+                self._reserve(row + 1)
+                self._ids.append(document["id"])
+                self._documents.append(fields)
+                self._rows[document["id"]] = row
+            else:
+                self._documents[row] = fields
+            self._matrix[row] = vector
+            self._lexical.upsert(document["id"], fields)
+
+    def _reserve(self, size):
+        """Grow the matrix capacity geometrically so appends stay amortized O(1)."""
+        if size <= self._matrix.shape[0]:
+            return
+        capacity = max(size, 2 * self._matrix.shape[0], 64)
+        matrix = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        matrix[:len(self._ids)] = self._matrix[:len(self._ids)]
+        self._matrix = matrix
+
+    def delete(self, document_ids):
+        """Remove documents by id, ignoring ids that are not present."""
+        for document_id in document_ids:
+            row = self._rows.pop(document_id, None)
+            if row is None:
+                continue
+            self._lexical.delete(document_id)
+            last = len(self._ids) - 1
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = self._ids[last]
+                self._documents[row] = self._documents[last]
+                self._rows[self._ids[row]] = row
+            self._ids.pop()
+            self._documents.pop()
+
+    def search(self, query_vector, top_k=5, filter_condition=None, select=None, query_text=None,
+               candidates=50):
+        """
+        Return the top_k documents for a query
+
+        With query_text the vector ranking and a BM25 ranking over LEXICAL_FIELDS are
+        fused with reciprocal-rank fusion, as Azure Search does for hybrid queries.
+
+        Args:
+            query_vector (array-like): Query embedding
+            top_k (int): Number of results to return
+            filter_condition (str): Optional OData filter, evaluated before ranking
+            select (list): Fields to return; all stored fields when omitted
+            query_text (str): Optional query text enabling hybrid ranking
+            candidates (int): Results taken from each ranking before fusion
+
+        Returns:
+            list: Result dicts with the selected fields and an "@search.score", the
+            cosine score on Azure Search's scale, or the fused score for hybrid queries
+
+        Raises:
+            UnsupportedFilterError: If the filter cannot be evaluated locally
+        """
+        count = len(self._ids)
+        if not count or top_k <= 0:
+            return []
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        similarities = self._matrix[:count] @ query
+
+        mask = None
+        if filter_condition:
+            predicate = compile_filter(filter_condition)
+            mask = np.fromiter((predicate(document) for document in self._documents), dtype=bool, count=count)
+            similarities = np.where(mask, similarities, -np.inf)
+            count = int(mask.sum())
+            if not count:
+                return []
+
+        if query_text:
+            ranked = self._hybrid_ranking(similarities, count, mask, query_text, top_k, candidates)
+        else:
+            ranked = [
+                # Azure Search reports cosine matches as 1 / (1 + cosine distance)
+                (row, float(1.0 / (2.0 - similarities[row])))
+                for row in self._top_rows(similarities, min(top_k, count))
+            ]
+
+        results = []
+        for row, score in ranked:
+            document = self._documents[row]
+            result = {field: document.get(field) for field in select} if select else dict(document)
+            result["@search.score"] = score
+            results.append(result)
+        return results
+
+    @staticmethod
+    def _top_rows(scores, k):
+        """Return the rows of the k highest scores, best first."""
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def _hybrid_ranking(self, similarities, count, mask, query_text, top_k, candidates):
+        """Fuse the vector and BM25 rankings of the rows passing the filter."""
+        vector_rows = list(self._top_rows(similarities, min(max(top_k, candidates), count)))
+
+        lexical_scores = self._lexical.scores(query_text)
+        lexical_rows = [
+            self._rows[document_id]
+            for document_id, _ in sorted(lexical_scores.items(), key=lambda pair: pair[1], reverse=True)
+            if mask is None or mask[self._rows[document_id]]
+        ][:max(top_k, candidates)]
+
+        return reciprocal_rank_fusion([vector_rows, lexical_rows])[:top_k]
+
+    def distinct_values(self, field):
+        """Return the distinct non-empty values of a field across all documents."""
+        return {document.get(field) for document in self._documents if document.get(field)}
+
+    def memory_usage(self):
+        """Return approximate bytes held by vectors and by document fields."""
+        field_bytes = sum(
+            sys.getsizeof(document) + sum(sys.getsizeof(value) for value in document.values())
+            for document in self._documents
+        )
+        return {
+            "documents": len(self._ids),
+            "dimensions": self.dimensions,
+            "vector_bytes": int(self._matrix.nbytes),
+            "field_bytes": int(field_bytes)
+        }
+
+# Local indexes keyed by search index name, so a shadow build gets its own copy
+_local_indexes = {}
+
+# Writes that arrive while an index is being loaded from Azure Search, replayed once it is ready
+_pending_writes = {}
+
+def get_local_index(index_name):
+    """Return the local index mirroring a search index, or None if it is not loaded."""
+    return _local_indexes.get(index_name)
+
+def create_local_index(index_name, dimensions):
+    """Create (or replace) an empty local index for a search index."""
+    _pending_writes.pop(index_name, None)
+    _local_indexes[index_name] = LocalVectorIndex(dimensions)
+    return _local_indexes[index_name]
+
+def drop_local_index(index_name):
+    """Forget the local copy of a search index."""
+    _local_indexes.pop(index_name, None)
+    _pending_writes.pop(index_name, None)
+
+def is_loading(index_name):
+    """Check whether a local index is currently being loaded."""
+    return index_name in _pending_writes
+
+def begin_load(index_name):
+    """Start buffering writes for an index whose documents are being loaded."""
+    _pending_writes[index_name] = []
+
+def finish_load(index_name, index):
+    """Apply writes buffered during the load and start serving the loaded index."""
+    for operation, payload in _pending_writes.pop(index_name, []):
+        if operation == "upsert":
+            index.upsert(payload)
+        else:
+            index.delete(payload)
+    _local_indexes[index_name] = index
+    logger.info(f"Loaded local index for {index_name} with {len(index)} documents")
+
+def upsert_documents(index_name, documents, max_documents=None):
+    """
+    Mirror uploaded documents into the local index, if one is loaded or loading
+
+    An index that grows past max_documents is dropped so searches go to Azure Search.
+    """
+    if index_name in _pending_writes:
+        _pending_writes[index_name].append(("upsert", documents))
+        return
+    index = _local_indexes.get(index_name)
+    if index is None:
+        return
+    index.upsert(documents)
+    if max_documents and len(index) > max_documents:
+        logger.info(f"Local index for {index_name} exceeds {max_documents} documents, dropping it")
+        drop_local_index(index_name)
+
+def delete_documents(index_name, document_ids):
+    """Mirror deleted documents into the local index, if one is loaded or loading."""
+    if index_name in _pending_writes:
+        _pending_writes[index_name].append(("delete", list(document_ids)))
+        return
+    index = _local_indexes.get(index_name)
+    if index is not None:
+        index.delete(document_ids)
+
+def local_index_stats():
+    """Return memory usage for every loaded local index."""
+    return {index_name: index.memory_usage() for index_name, index in _local_indexes.items()}
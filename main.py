@@ -10,15 +10,22 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from typing import Dict, List, Optional, Any
 import time
-from rag import RAGAssistant
+from rag import RAGAssistant, query_embedding_cache, intent_cache
 from agent_tools import InventoryAgent
 import uvicorn
-from azure.search.documents.indexes import SearchIndexClient
-from azure.core.credentials import AzureKeyCredential
-from config import SEARCH_SERVICE_ENDPOINT, SEARCH_SERVICE_KEY
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 from event_tracking import ItemEventTracker
+from search import VectorStore, resolve_index_name, local_index_key, sweep_index_deletions
+from search_clients import close_search_clients
+from config import SEARCH_INDEX_NAME
+from index_catalog import get_index_catalog
+from local_index import get_local_index, local_index_stats
+from search_cache import search_result_cache, index_exists_cache
+from rate_limiter import get_openai_scheduler
+from build_checkpoints import get_checkpoint_store
+from index_registry import get_index_registry
+from item_store import get_item_store
 
 # Configure logging
 logging.basicConfig(
@@ -120,6 +127,25 @@ class PriceHistoryResponse(BaseModel):
     processing_time: float
 
 
+# Keep the cached index catalog fresh in the background
+@app.on_event("startup")
+async def start_index_catalog():
+    get_index_catalog().start()
+
+# Finish deleting indexes replaced by rebuilds, including those left over from earlier processes
+@app.on_event("startup")
+async def sweep_replaced_indexes():
+    try:
+        await sweep_index_deletions()
+    except Exception as e:
+        logger.error(f"Error sweeping replaced indexes: {str(e)}")
+
+# Close the shared Azure Search connection pool on shutdown
+@app.on_event("shutdown")
+async def shutdown_search_clients():
+    await get_index_catalog().stop()
+    await close_search_clients()
+
 # Middleware for request timing
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
@@ -131,14 +157,17 @@ async def add_process_time_header(request: Request, call_next):
 
 # Helper function to check if index exists
 async def index_exists(user_id: str):
+    cached = index_exists_cache.get(user_id)
+    if cached is not None:
+        return cached
     try:
-        index_name = f"inventory-{user_id}"
-        index_client = SearchIndexClient(
-            endpoint=SEARCH_SERVICE_ENDPOINT,
-            credential=AzureKeyCredential(SEARCH_SERVICE_KEY)
-        )
-        indexes = list(index_client.list_index_names())
-        return index_name in indexes
+        index_name = await asyncio.to_thread(resolve_index_name, user_id)
+        exists = await get_index_catalog().exists(index_name)
+        if exists and index_name == SEARCH_INDEX_NAME:
+            # The shared index exists for every tenant; a user only has one once their documents are in it
+            exists = await VectorStore(user_id, index_name=index_name).get_document_count() > 0
+        index_exists_cache.set(user_id, exists)
+        return exists
     except Exception as e:
         logger.error(f"Error checking index existence: {str(e)}")
         return False
@@ -148,6 +177,25 @@ async def index_exists(user_id: str):
 async def health_check():
     return {"status": "healthy", "timestamp": time.time()}
 
+# Cache statistics
+@app.get("/cache/stats")
+async def cache_stats():
+    """Return hit/miss counters for the in-process caches"""
+    return {
+        "query_embeddings": query_embedding_cache.stats(),
+        "intents": intent_cache.stats(),
+        "search_results": search_result_cache.stats(),
+        "index_exists": index_exists_cache.stats(),
+        "index_catalog": get_index_catalog().stats(),
+        "local_indexes": local_index_stats(),
+        "item_store": await asyncio.to_thread(get_item_store().stats)
+    }
+
+@app.get("/metrics/openai")
+async def openai_metrics():
+    """Return per-model rate limiter state for OpenAI calls"""
+    return get_openai_scheduler().metrics()
+
 # Initialize user RAG system
 @app.post("/initialize/{user_id}", response_model=InitializeResponse)
 async def initialize_user_rag(user_id: str, request: InitializeRequest = None):
@@ -160,7 +208,7 @@ async def initialize_user_rag(user_id: str, request: InitializeRequest = None):
             return InitializeResponse(
                 message=f"RAG system already initialized for user {user_id}",
                 status="existing",
-                index_name=f"inventory-{user_id}"
+                index_name=rag_assistants[user_id].vector_store.index_name
             )
         
         # Create new RAG assistant
@@ -177,7 +225,7 @@ async def initialize_user_rag(user_id: str, request: InitializeRequest = None):
         return InitializeResponse(
             message=f"RAG system initialized for user {user_id}",
             status="created",
-            index_name=f"inventory-{user_id}"
+            index_name=rag_assistant.vector_store.index_name
         )
     except Exception as e:
         logger.error(f"Error initializing RAG system: {str(e)}")
@@ -324,9 +372,10 @@ async def query_rag(question: Question, background_tasks: BackgroundTasks):
                     processing_time=time.time() - start_time
                 )
         
-        # First check if the RAG assistant detects action intent
+        # Classify intent once; the result is passed on to the RAG query below
         rag_assistant = rag_assistants[user_id]
-        has_action_intent, action_type, action_params = await rag_assistant.check_for_action_intent(question.text)
+        intent = await rag_assistant.check_for_action_intent(question.text)
+        has_action_intent, action_type, action_params = intent
         
         # If action intent detected by RAG
         if has_action_intent:
@@ -432,7 +481,7 @@ async def query_rag(question: Question, background_tasks: BackgroundTasks):
                 logger.info(f"Processed agent action in {processing_time:.2f} seconds")
             else:
                 # It's a regular query, not an action
-                response = await rag_assistant.query(question.text)
+                response = await rag_assistant.query(question.text, intent=intent)
                 
                 processing_time = time.time() - start_time
                 logger.info(f"Processed query in {processing_time:.2f} seconds")
@@ -533,11 +582,11 @@ async def agent_action(action_request: AgentAction):
 
 # Refresh user index
 @app.post("/refresh/{user_id}")
-async def refresh_user_index(user_id: str):
+async def refresh_user_index(user_id: str, full_rebuild: bool = False):
     try:
         if user_id in rag_assistants:
-            logger.info(f"Refreshing index for user {user_id}")
-            await rag_assistants[user_id].index_user_documents()
+            logger.info(f"Refreshing index for user {user_id} (full rebuild: {full_rebuild})")
+            await rag_assistants[user_id].index_user_documents(full_rebuild=full_rebuild)
             return {"message": f"Index refreshed for user {user_id}", "status": "success"}
         else:
             # Initialize if not exists
@@ -555,13 +604,21 @@ async def get_index_status(user_id: str):
         index_exists_flag = await index_exists(user_id)
         assistant_loaded = user_id in rag_assistants
         agent_loaded = user_id in inventory_agents
+        index_name = await asyncio.to_thread(resolve_index_name, user_id)
+        tenant_index = get_local_index(local_index_key(user_id, index_name))
+        index_settings = await asyncio.to_thread(get_index_registry().get_index_settings, index_name)
+        build_progress = await asyncio.to_thread(get_checkpoint_store().get_progress, user_id)
         
         return {
             "user_id": user_id,
             "index_exists": index_exists_flag,
             "assistant_loaded": assistant_loaded,
             "agent_loaded": agent_loaded,
-            "status": "ready" if index_exists_flag and assistant_loaded else "not_ready"
+            "status": "ready" if index_exists_flag and assistant_loaded else "not_ready",
+            "build": build_progress,
+            "local_index": tenant_index.memory_usage() if tenant_index else None,
+            "vector_dimensions": index_settings.get("dimensions") if index_settings else None,
+            "hnsw": index_settings.get("hnsw") if index_settings else None
         }
     except Exception as e:
         logger.error(f"Error checking status: {str(e)}")
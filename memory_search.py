@@ -0,0 +1,230 @@
+# memory_search.py
+"""
+In-process stand-in for the Azure Search async clients.
+
+Implements the subset of SearchIndexClient and SearchClient that VectorStore uses,
+backed by exact NumPy search, so retrieval can be benchmarked and load-tested
+without a search service. Selected with SEARCH_BACKEND=memory; every call can be
+delayed by SEARCH_BACKEND_LATENCY_MS (plus up to SEARCH_BACKEND_LATENCY_JITTER_MS)
+to model network cost.
+"""
+import asyncio
+import logging
+import random
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceNotFoundError
+from azure.search.documents.models import IndexingResult
+from config import SEARCH_BACKEND_LATENCY_MS, SEARCH_BACKEND_LATENCY_JITTER_MS
+import local_index
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("MemorySearch")
+
+# Azure Search returns 50 results when a query sets no top
+_DEFAULT_TOP = 50
+
+# Indexes by name, shared by every client in the process like a real service
+_indexes = {}
+
+async def _simulate_latency():
+    """Wait out the configured per-call latency, if any."""
+    delay_ms = SEARCH_BACKEND_LATENCY_MS
+    if SEARCH_BACKEND_LATENCY_JITTER_MS:
+        delay_ms += random.uniform(0, SEARCH_BACKEND_LATENCY_JITTER_MS)
+    if delay_ms > 0:
+        await asyncio.sleep(delay_ms / 1000)
+
+def _bad_request(message):
+    error = HttpResponseError(message=message)
+    error.status_code = 400
+    return error
+
+def _get_index(index_name):
+    index = _indexes.get(index_name)
+    if index is None:
+        raise ResourceNotFoundError(f"No index with the name '{index_name}' was found")
+    return index
+
+class _MemoryIndex:
+    """Documents of one index: the stored fields plus an exact vector index over them."""
+    def __init__(self, schema):
+        self.schema = schema
+        self.key_field = next((field.name for field in schema.fields if getattr(field, "key", False)), "id")
+        vector_field = next(
+            (field for field in schema.fields if getattr(field, "vector_search_dimensions", None)), None
+        )
+        self.vector_field = vector_field.name if vector_field else None
+        self.dimensions = vector_field.vector_search_dimensions if vector_field else 0
+        self.documents = {}
+        self.vectors = local_index.LocalVectorIndex(self.dimensions)
+
+    def upload(self, document):
+        """Insert or replace one document, returning its IndexingResult."""
+        key = document.get(self.key_field)
+        if not key:
+            return IndexingResult(key=key, succeeded=False, status_code=400,
+                                  error_message=f"Document is missing its key field '{self.key_field}'")
+
+        vector = document.get(self.vector_field) if self.vector_field else None
+        if vector is not None and len(vector) != self.dimensions:
+            return IndexingResult(key=key, succeeded=False, status_code=400,
+                                  error_message=f"Expected {self.dimensions} dimensions, got {len(vector)}")
+
+        existed = key in self.documents
+        self.documents[key] = dict(document)
+        if vector is None:
+            # Documents without a vector are stored but never match a vector query
+            self.vectors.delete([key])
+        else:
+            # The vector index keeps the other fields too, for filters and the lexical side of hybrid queries
+            fields = {name: value for name, value in document.items() if name != self.vector_field}
+            self.vectors.upsert([dict(fields, id=key, content_vector=vector)])
+        return IndexingResult(key=key, succeeded=True, status_code=200 if existed else 201)
+
+    def delete(self, key):
+        """Delete one document; like the service, missing keys still succeed."""
+        self.documents.pop(key, None)
+        self.vectors.delete([key])
+        return IndexingResult(key=key, succeeded=True, status_code=200)
+
+class _MemorySearchResults:
+    """Async iterable of search results with a total count, like AsyncSearchItemPaged."""
+    def __init__(self, results, count):
+        self._results = results
+        self._count = count
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for result in self._results:
+            yield result
+
+    async def get_count(self):
+        return self._count
+
+def _vector_query(query):
+    """Read the vector and k of a vector query given as a dict or a VectorizedQuery."""
+    if isinstance(query, dict):
+        return query.get("vector"), query.get("k") or query.get("k_nearest_neighbors")
+    return query.vector, query.k_nearest_neighbors
+
+class InMemorySearchClient:
+    """Stand-in for azure.search.documents.aio.SearchClient over one in-memory index."""
+    def __init__(self, index_name):
+        self.index_name = index_name
+
+    async def upload_documents(self, documents, **kwargs):
+        """Insert or replace documents, returning one IndexingResult per document."""
+        await _simulate_latency()
+        index = _get_index(self.index_name)
+        return [index.upload(document) for document in documents]
+
+    async def delete_documents(self, documents, **kwargs):
+        """Delete documents by key, returning one IndexingResult per document."""
+        await _simulate_latency()
+        index = _get_index(self.index_name)
+        return [index.delete(document.get(index.key_field)) for document in documents]
+
+    async def get_document_count(self, **kwargs):
+        await _simulate_latency()
+        return len(_get_index(self.index_name).documents)
+
+    async def search(self, search_text=None, vector_queries=None, filter=None, select=None, top=None,
+                     include_total_count=False, **kwargs):
+        """
+        Run a query against the in-memory index
+
+        A vector query returns its exact nearest neighbours; adding search_text makes it
+        a hybrid query fused by reciprocal-rank fusion. Without a vector query only
+        search_text "*" (every document passing the filter) is supported.
+
+        Args:
+            search_text (str): "*", None, or query text for a hybrid query
+            vector_queries (list): At most one vector query, as a dict or VectorizedQuery
+            filter (str): OData filter in the subset local_index supports
+            select (str): Comma-separated fields to return; all fields when omitted
+            top (int): Number of results to return
+
+        Returns:
+            _MemorySearchResults: Result dicts with an "@search.score"
+        """
+        await _simulate_latency()
+        index = _get_index(self.index_name)
+        top = _DEFAULT_TOP if top is None else top
+        fields = [field.strip() for field in select.split(",")] if isinstance(select, str) else select
+        query_text = search_text if search_text and search_text != "*" else None
+
+        try:
+            if vector_queries:
+                vector, k = _vector_query(vector_queries[0])
+                k = k or top
+                hits = index.vectors.search(
+                    vector, top_k=top if query_text else min(top, k), filter_condition=filter,
+                    select=["id"], query_text=query_text, candidates=k
+                )
+                matches = [(hit["id"], hit["@search.score"]) for hit in hits]
+                count = len(matches)
+            elif query_text:
+                raise _bad_request("Full-text queries without a vector query are not supported in memory")
+            else:
+                predicate = local_index.compile_filter(filter) if filter else None
+                keys = [key for key, document in index.documents.items() if predicate is None or predicate(document)]
+                matches = [(key, 1.0) for key in keys[:top]]
+                count = len(keys)
+        except local_index.UnsupportedFilterError as e:
+            raise _bad_request(f"Invalid expression: {str(e)}")
+
+        results = []
+        for key, score in matches:
+            document = index.documents[key]
+            result = {field: document.get(field) for field in fields} if fields else dict(document)
+            result["@search.score"] = score
+            results.append(result)
+        return _MemorySearchResults(results, count if include_total_count else None)
+
+    async def close(self):
+        pass
+
+class InMemorySearchIndexClient:
+    """Stand-in for azure.search.documents.indexes.aio.SearchIndexClient."""
+    async def list_index_names(self, **kwargs):
+        await _simulate_latency()
+        for index_name in list(_indexes):
+            yield index_name
+
+    async def get_index(self, name, **kwargs):
+        await _simulate_latency()
+        return _get_index(name).schema
+
+    async def create_index(self, index, **kwargs):
+        await _simulate_latency()
+        if index.name in _indexes:
+            raise ResourceExistsError(f"Index '{index.name}' already exists")
+        _indexes[index.name] = _MemoryIndex(index)
+        logger.info(f"Created in-memory index {index.name}")
+        return index
+
+    async def create_or_update_index(self, index, **kwargs):
+        """Create an index, or replace the schema of an existing one keeping its documents."""
+        await _simulate_latency()
+        existing = _indexes.get(index.name)
+        if existing is None:
+            _indexes[index.name] = _MemoryIndex(index)
+            logger.info(f"Created in-memory index {index.name}")
+        else:
+            existing.schema = index
+        return index
+
+    async def delete_index(self, index, **kwargs):
+        await _simulate_latency()
+        index_name = getattr(index, "name", index)
+        if _indexes.pop(index_name, None) is None:
+            raise ResourceNotFoundError(f"No index with the name '{index_name}' was found")
+        logger.info(f"Deleted in-memory index {index_name}")
+
+    async def close(self):
+        pass
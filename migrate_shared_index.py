@@ -0,0 +1,153 @@
+# migrate_shared_index.py
+"""
+Copy per-user inventory indexes into the shared multi-tenant index.
+
+For each user the index currently serving them (per the index registry, or the
+legacy inventory-{user_id} name) is read with its vectors and upserted into
+SEARCH_INDEX_NAME, so nothing is re-embedded. Set SEARCH_INDEX_MODE=shared once
+the copy is verified.
+
+Usage:
+    python migrate_shared_index.py [--users USER [USER ...]] [--delete-source] [--dry-run]
+"""
+import argparse
+import asyncio
+import logging
+import re
+import time
+from config import SEARCH_INDEX_NAME, INDEX_VALIDATION_TIMEOUT
+from search import VectorStore, resolve_user_index_name
+from search_clients import get_index_client, close_search_clients
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("SharedIndexMigration")
+
+# Per-user index names: inventory-{user_id}, optionally with a blue/green version suffix
+_USER_INDEX_PATTERN = re.compile(r"^inventory-(?P<user_id>.+?)(?:-v\d+)?$")
+
+async def find_user_indexes(users=None):
+    """
+    Map each user to the per-user index that currently serves them
+
+    Args:
+        users (list): Optional user ids to restrict the migration to
+
+    Returns:
+        dict: Maps user id to index name, for indexes that exist
+    """
+    names = {name async for name in get_index_client().list_index_names()}
+    if users is None:
+        users = {
+            match.group("user_id")
+            for match in map(_USER_INDEX_PATTERN.match, names)
+            if match and match.group(0) != SEARCH_INDEX_NAME
+        }
+
+    user_indexes = {}
+    for user_id in sorted(users):
+        index_name = await asyncio.to_thread(resolve_user_index_name, user_id)
+        if index_name in names:
+            user_indexes[user_id] = index_name
+        else:
+            logger.warning(f"No index found for user {user_id} ({index_name}), skipping")
+    return user_indexes
+
+async def verify_copied(target_store, document_ids, timeout=INDEX_VALIDATION_TIMEOUT):
+    """
+    Check by id that copied documents are searchable in the target index
+
+    Uploaded documents take a moment to become visible, so the lookup is repeated
+    until every id is found or the timeout passes.
+
+    Returns:
+        set: The ids found for the user in the target index
+    """
+    deadline = time.time() + timeout
+    found = await target_store.get_owned_ids(document_ids)
+    while len(found) < len(set(document_ids)) and time.time() < deadline:
+        await asyncio.sleep(2)
+        found = await target_store.get_owned_ids(document_ids)
+    return found
+
+async def migrate_user(user_id, source_index, target, dry_run=False):
+    """
+    Copy one user's documents, vectors included, into the shared index
+
+    Returns:
+        dict: Documents read, uploaded, and found by id in the shared index,
+        plus the ids missing from it
+    """
+    source = VectorStore(user_id, index_name=source_index)
+    await source.connect_to_index()
+
+    results = await source.search_client.search(search_text="*", top=100000)
+    documents = []
+    async for result in results:
+        document = {key: value for key, value in result.items() if not key.startswith("@search.")}
+        # Documents indexed before tenants shared an index may predate the userId field
+        document["userId"] = user_id
+        documents.append(document)
+
+    if dry_run:
+        logger.info(f"[dry run] Would copy {len(documents)} documents from {source_index} for user {user_id}")
+        return {"read": len(documents), "uploaded": 0, "copied": 0, "missing_ids": []}
+
+    target_store = VectorStore(user_id, index_name=target)
+    await target_store.connect_to_index()
+    summary = await target_store.add_documents(documents)
+    if summary["failed"]:
+        logger.warning(f"{summary['failed']} documents from {source_index} failed to copy")
+
+    # Document counts lag behind uploads, so check each copied id instead
+    document_ids = [document["id"] for document in documents]
+    found = await verify_copied(target_store, document_ids)
+    missing_ids = [doc_id for doc_id in document_ids if doc_id not in found]
+    if missing_ids:
+        logger.warning(f"{len(missing_ids)} documents from {source_index} are missing from {target}")
+    logger.info(
+        f"Copied {len(found)}/{len(documents)} documents from {source_index} for user {user_id} "
+        f"({summary['uploaded']} uploaded)"
+    )
+    return {"read": len(documents), "uploaded": summary["uploaded"], "copied": len(found), "missing_ids": missing_ids}
+
+async def main(users=None, delete_source=False, dry_run=False):
+    try:
+        user_indexes = await find_user_indexes(users)
+        logger.info(f"Migrating {len(user_indexes)} users into {SEARCH_INDEX_NAME}")
+
+        if not dry_run:
+            await VectorStore("migration", index_name=SEARCH_INDEX_NAME).create_index()
+
+        summary = {}
+        for user_id, source_index in user_indexes.items():
+            try:
+                summary[user_id] = await migrate_user(user_id, source_index, SEARCH_INDEX_NAME, dry_run)
+            except Exception as e:
+                logger.error(f"Error migrating user {user_id}: {str(e)}")
+                summary[user_id] = {"error": str(e)}
+                continue
+
+            result = summary[user_id]
+            # Only drop a source whose documents were all uploaded and found by id in the shared index
+            if (delete_source and not dry_run and result["uploaded"] == result["read"]
+                    and not result["missing_ids"]):
+                await VectorStore(user_id, index_name=source_index).delete_index()
+
+        failed = [user_id for user_id, result in summary.items() if "error" in result]
+        logger.info(f"Migration finished: {len(summary) - len(failed)} users migrated, {len(failed)} failed")
+        return summary
+    finally:
+        await close_search_clients()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy per-user indexes into the shared index")
+    parser.add_argument("--users", nargs="+", help="Only migrate these user ids")
+    parser.add_argument("--delete-source", action="store_true", help="Delete each per-user index once copied")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be copied without writing")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.users, args.delete_source, args.dry_run))
@@ -0,0 +1,158 @@
+# query_filters.py
+import logging
+import re
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("QueryFilters")
+
+_NUMBER = r"\$?\s*(\d+(?:,\d{3})*(?:\.\d+)?)"
+
+# Comparison phrases mapped to OData operators; longer phrases are tried first
+_UPPER_BOUNDS = {
+    "less than": "lt", "under": "lt", "below": "lt", "cheaper than": "lt", "fewer than": "lt",
+    "lower than": "lt", "at most": "le", "no more than": "le", "up to": "le", "maximum of": "le",
+}
+_LOWER_BOUNDS = {
+    "more than": "gt", "over": "gt", "above": "gt", "greater than": "gt", "higher than": "gt",
+    "more expensive than": "gt", "at least": "ge", "no less than": "ge", "minimum of": "ge",
+}
+_SYMBOLS = {"<": "lt", "<=": "le", ">": "gt", ">=": "ge"}
+
+# Phrases only match as whole words, so "leftover", "cover" or "thunder" are not comparisons
+_COMPARISON_PATTERN = re.compile(
+    r"(?P<phrase>\b(?:" + "|".join(sorted(map(re.escape, list(_UPPER_BOUNDS) + list(_LOWER_BOUNDS)), key=len, reverse=True))
+    + r")\b|<=|>=|<|>)\s*" + _NUMBER
+    + r"(?P<unit>\s*(?:(?:dollars?|bucks|usd|units?|in stock|on hand|left|cases?|each|per unit|/\s*unit)\b)?)",
+    re.IGNORECASE
+)
+_BETWEEN_PATTERN = re.compile(
+    r"\bbetween\s+" + _NUMBER + r"\s*(?:and|-|to)\s*" + _NUMBER + r"(?P<unit>\s*(?:(?:dollars?|units?|in stock|on hand)\b)?)",
+    re.IGNORECASE
+)
+
+_PRICE_WORDS = re.compile(r"\$|\b(?:price[sd]?|cost[s]?|costing|cheap\w*|expensive|dollars?|pay|spend)\b", re.IGNORECASE)
+_QUANTITY_WORDS = re.compile(r"\b(?:units?|stock|on hand|left|quantity|quantities|count)\b", re.IGNORECASE)
+
+def _number(text):
+    return float(text.replace(",", ""))
+
+def _constraint_field(match_text, unit, question):
+    """Decide whether a numeric constraint refers to unit cost or to units on hand."""
+    unit = unit.strip().lower()
+    if "$" in match_text or unit.startswith(("dollar", "buck", "usd", "each", "per unit", "/")):
+        return "cost_of_unit"
+    if unit.startswith(("unit", "in stock", "on hand", "left", "case")):
+        return "total_units"
+    # Without a unit, fall back to what the question is about, if it is unambiguous
+    mentions_price = bool(_PRICE_WORDS.search(question))
+    mentions_quantity = bool(_QUANTITY_WORDS.search(question))
+    if mentions_price and not mentions_quantity:
+        return "cost_of_unit"
+    if mentions_quantity and not mentions_price:
+        return "total_units"
+    return None
+
+def _value_pattern(value):
+    """Match a field value as whole words, tolerating a trailing plural "s"."""
+    words = [re.escape(word) for word in re.findall(r"[\w']+", value.lower())]
+    if not words:
+        return None
+    return re.compile(r"\b" + r"[\s\-&/,]+".join(words) + r"s?\b", re.IGNORECASE)
+
+def _match_values(question, values_by_field):
+    """
+    Find the known field values mentioned in the question
+
+    Overlapping matches keep the longest one, so "Dairy" inside "Non-Dairy" or a
+    category word inside a supplier's name does not produce a second filter.
+    """
+    matches = []
+    for field, values in values_by_field.items():
+        for value in values:
+            if not value or not str(value).strip():
+                continue
+            pattern = _value_pattern(str(value))
+            match = pattern.search(question) if pattern else None
+            if match:
+                matches.append((match.start(), match.end(), field, value))
+
+    selected = []
+    for start, end, field, value in sorted(matches, key=lambda m: m[1] - m[0], reverse=True):
+        if not any(start < e and end > s for s, e, _, _ in selected):
+            selected.append((start, end, field, value))
+
+    matched = {}
+    for _, _, field, value in sorted(selected):
+        matched.setdefault(field, []).append(value)
+    return matched
+
+def extract_query_constraints(question, categories=(), suppliers=()):
+    """
+    Extract structured constraints from a natural-language inventory question
+
+    Categories and suppliers are matched against the tenant's known values, so
+    only values that actually exist in the index produce filters.
+
+    Args:
+        question (str): The user's question
+        categories (iterable): Known category values
+        suppliers (iterable): Known supplier names
+
+    Returns:
+        dict: Any of "category" and "supplier_name" (lists of values), and
+        "cost_of_unit" and "total_units" (dicts of OData operator to bound)
+    """
+    constraints = _match_values(question, {"category": categories, "supplier_name": suppliers})
+
+    for match in _BETWEEN_PATTERN.finditer(question):
+        field = _constraint_field(match.group(0), match.group("unit"), question)
+        if field:
+            low, high = sorted((_number(match.group(1)), _number(match.group(2))))
+            constraints.setdefault(field, {}).update({"ge": low, "le": high})
+
+    for match in _COMPARISON_PATTERN.finditer(question):
+        field = _constraint_field(match.group(0), match.group("unit"), question)
+        if not field:
+            continue
+        phrase = match.group("phrase").lower()
+        operator = _SYMBOLS.get(phrase) or _UPPER_BOUNDS.get(phrase) or _LOWER_BOUNDS.get(phrase)
+        constraints.setdefault(field, {})[operator] = _number(match.group(2))
+
+    if constraints:
+        logger.info(f"Extracted query constraints: {constraints}")
+    return constraints
+
+def _quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+def build_odata_filter(constraints):
+    """
+    Turn extracted constraints into an OData filter over the index's filterable fields
+
+    Args:
+        constraints (dict): Output of extract_query_constraints
+
+    Returns:
+        str: The filter expression, or None if there are no constraints
+    """
+    clauses = []
+    for field in ("category", "supplier_name"):
+        values = constraints.get(field)
+        if not values:
+            continue
+        if len(values) == 1:
+            clauses.append(f"{field} eq {_quote(values[0])}")
+        elif not any("|" in value for value in values):
+            clauses.append(f"search.in({field}, {_quote('|'.join(values))}, '|')")
+        else:
+            clauses.append("(" + " or ".join(f"{field} eq {_quote(value)}" for value in values) + ")")
+
+    for field in ("cost_of_unit", "total_units"):
+        for operator, bound in sorted(constraints.get(field, {}).items()):
+            clauses.append(f"{field} {operator} {bound:.15g}")
+
+    return " and ".join(clauses) if clauses else None
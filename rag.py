@@ -1,10 +1,29 @@
 # rag.py
 from database import CosmosDB
 from embeddings import EmbeddingGenerator
+from embedding_backends import create_embedding_backend
 from search import VectorStore
-from openai import OpenAI
-from config import OPENAI_API_KEY, OPENAI_MODEL, SEARCH_MODEL
-import uuid
+from indexing_pipeline import IndexingPipeline
+from embedding_cache import get_embedding_cache
+from build_checkpoints import get_checkpoint_store, RESUMABLE_STATUSES
+from search_cache import bump_inventory_version
+from query_filters import extract_query_constraints, build_odata_filter
+from openai import AsyncOpenAI
+from rate_limiter import get_openai_scheduler
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_MODEL,
+    SEARCH_MODEL,
+    OPENAI_COMPLETION_TOKEN_ESTIMATE,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_TTL,
+    INTENT_CACHE_SIZE,
+    INTENT_CACHE_TTL
+)
+from ttl_cache import TTLCache
+import asyncio
+import base64
+import hashlib
 import logging
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import json
@@ -16,31 +35,73 @@ logging.basicConfig(
 )
 logger = logging.getLogger("RAGAssistant")
 
+# Question embeddings shared across users, keyed by embedding model and normalized question
+query_embedding_cache = TTLCache(QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL)
+
+# Action intent classifications shared across users, keyed by normalized question
+intent_cache = TTLCache(INTENT_CACHE_SIZE, INTENT_CACHE_TTL)
+
+# Version of the _document_id scheme; per-user indexes built with an older one are rebuilt on the next sync
+DOCUMENT_ID_VERSION = 2
+
+# Users with an index build running in this process; their checkpoints must not be resumed concurrently
+_active_builds = set()
+
 class RAGAssistant:
     def __init__(self, user_id):
         logger.info(f"Initializing RAGAssistant for user {user_id}")
         self.user_id = user_id
         self.cosmos_db = CosmosDB()
         self.embedding_generator = EmbeddingGenerator()
+        # Generators for indexes whose vector width differs from the configured one, keyed by width
+        self._embedding_generators = {self.embedding_generator.expected_dim: self.embedding_generator}
         self.vector_store = VectorStore(user_id)
-        self.openai_client = OpenAI(api_key=OPENAI_API_KEY)
+        # Retries on 429 are handled by the shared scheduler
+        self.openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0)
         
     @retry(
         stop=stop_after_attempt(3), 
         wait=wait_exponential(multiplier=1, min=4, max=10),
         retry=retry_if_exception_type((ValueError, ConnectionError))
     )
-    async def _generate_embedding_with_retry(self, text):
+    async def _generate_embedding_with_retry(self, text, generator=None):
         """Generate embedding with improved retry logic."""
         try:
             logger.info(f"Generating embedding for text (length: {len(text)})")
-            embedding = await self.embedding_generator.generate_embedding(text)
+            embedding = await (generator or self.embedding_generator).generate_embedding(text)
             logger.info(f"Generated embedding dimensions: {len(embedding)}")
             return embedding
         except Exception as e:
             logger.error(f"Error generating embedding: {str(e)}")
             raise
 
+    def _embedding_generator_for(self, dimensions):
+        """Return an embedding generator producing vectors of the given width."""
+        if dimensions not in self._embedding_generators:
+            logger.info(f"Creating embedding generator for {dimensions}-dimension vectors")
+            self._embedding_generators[dimensions] = EmbeddingGenerator(create_embedding_backend(dimensions=dimensions))
+        return self._embedding_generators[dimensions]
+
+    async def _get_query_embedding(self, question):
+        """Embed a user question, reusing the embedding of recently asked identical questions.
+        
+        The question is embedded at the width of the live index, so an index built
+        before EMBEDDING_DIMENSIONS changed keeps serving until it is rebuilt.
+        Case and whitespace are normalized for the cache key only; the question
+        itself is embedded as asked.
+        """
+        generator = self._embedding_generator_for(await self.vector_store.get_vector_dimensions())
+        cache_key = (generator.cache_model, " ".join(question.lower().split()))
+        
+        embedding = query_embedding_cache.get(cache_key)
+        if embedding is not None:
+            logger.info("Using cached embedding for question")
+            return embedding
+        
+        embedding = await self._generate_embedding_with_retry(question, generator)
+        query_embedding_cache.set(cache_key, embedding)
+        return embedding
+
     def _create_item_content(self, item):
         """Create rich, searchable content for an inventory item with improved structure."""
         try:
@@ -90,87 +151,376 @@ class RAGAssistant:
             # Return a minimal content to avoid complete failure
             return f"Item: {item.get('Inventory Item Name', 'Unknown Item')}"
 
-    async def index_inventory_items(self, inventory_list):
-        """Process and index inventory items with improved error handling."""
-        vector_documents = []
-        logger.info(f"Processing {len(inventory_list)} inventory documents")
+    def _document_id(self, item):
+        """Derive a stable search document id from the user, the item's supplier and its number.
         
-        if not inventory_list:
-            logger.error("No inventory documents found")
-            raise ValueError("No inventory documents found")
+        Item numbers are only unique within a supplier's catalog, so the same number
+        from two suppliers yields two documents.
+        """
+        item_key = item.get('Item Number') or item.get('Inventory Item Name', '')
+        supplier = str(item.get('Supplier Name') or '').strip()
+        # URL-safe base64 keeps the id within the characters Azure Search allows in keys
+        return base64.urlsafe_b64encode(f"{self.user_id}:{supplier}:{item_key}".encode('utf-8')).decode('ascii')
+
+    def _create_document_fields(self, item, content):
+        """Map an inventory item onto the search index fields, without its vector."""
+        fields = {
+            'id': self._document_id(item),
+            'userId': self.user_id,
+            'supplier_name': item.get('Supplier Name', ''),
+            'inventory_item_name': item.get('Inventory Item Name', ''),
+            'item_name': item.get('Item Name', ''),
+            'item_number': item.get('Item Number', ''),
+            'quantity_in_case': float(item.get('Quantity In a Case', 0)),
+            'total_units': float(item.get('Total Units', 0)),
+            'case_price': float(item.get('Case Price', 0)),
+            'cost_of_unit': float(item.get('Cost of a Unit', 0)),
+            'category': item.get('Category', ''),
+            'measured_in': item.get('Measured In', ''),
+            'catch_weight': item.get('Catch Weight', ''),
+            'priced_by': item.get('Priced By', ''),
+            'splitable': item.get('Splitable', ''),
+            'content': content
+        }
+        # Hash every indexed field so incremental syncs can detect any change
+        fields['content_hash'] = hashlib.sha256(
+            json.dumps(fields, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        return fields
+
+    def _create_vector_document(self, item, content, embedding):
+        """Build the full search document for an inventory item and its embedding."""
+        vector_doc = self._create_document_fields(item, content)
+        vector_doc['content_vector'] = embedding
+        return vector_doc
+
+    async def _run_indexing_pipeline(self, items, vector_store=None, on_uploaded=None):
+        """Embed and upload items through the concurrent indexing pipeline."""
+        pipeline = IndexingPipeline(
+            self.embedding_generator,
+            vector_store or self.vector_store,
+            self._create_item_content,
+            self._create_vector_document,
+            embedding_cache=get_embedding_cache(),
+            on_uploaded=on_uploaded
+        )
+        stats = await pipeline.run(items)
+        
+        logger.info(f"Embedding cache hit rate: {stats['cache_hit_rate']:.1%} ({stats['cache_hits']} hits, {stats['cache_misses']} misses)")
+        return stats
+
+    async def _iter_inventory_items(self, inventory_list=None):
+        """Yield the items of every inventory document, streaming them from Cosmos unless a list is given."""
+        if inventory_list is None:
+            async for item in self.cosmos_db.iter_user_items(self.user_id):
+                yield item
+        else:
+            for inventory_doc in inventory_list:
+                for item in inventory_doc.get('items', []):
+                    yield item
+
+    async def index_inventory_items(self, inventory_list=None, vector_store=None):
+        """Process and index inventory items through the concurrent indexing pipeline.
+        
+        Items come from inventory_list when given, otherwise they are streamed page by
+        page from all of the user's inventory documents. They go to vector_store when
+        given, otherwise to the active index.
+        """
+        stats = await self._run_indexing_pipeline(self._iter_inventory_items(inventory_list), vector_store)
+        
+        if not stats["items"]:
+            logger.error(f"No inventory found for user {self.user_id}")
+            raise ValueError(f"No inventory found for user {self.user_id}")
+        
+        logger.info(f"Processed {stats['items']} individual inventory items")
+        
+        if not stats["uploaded"]:
+            logger.warning("No documents were successfully processed for indexing")
+        elif vector_store is None or vector_store is self.vector_store:
+            bump_inventory_version(self.user_id)
+        return stats
+
+    async def sync_inventory_items(self, inventory_list=None):
+        """
+        Incrementally sync the index with the current inventory
+        
+        Only items whose indexed fields changed are re-embedded and upserted, and
+        documents for items no longer in the inventory are deleted. Falls back to a
+        full rebuild when the index is missing, predates content hashes, or holds
+        vectors of a different width than EMBEDDING_DIMENSIONS; the rebuild
+        re-embeds everything into a new index of the configured width.
+        
+        Args:
+            inventory_list (list): Optional inventory documents; streamed from Cosmos when omitted
             
-        inventory_doc = inventory_list[0]
-        items = inventory_doc.get('items', [])
+        Returns:
+            dict: Counts of changed, removed and unchanged items
+        """
+        if not await self.vector_store.has_field('content_hash'):
+            logger.info("Index is missing or has no content hashes, running a full rebuild")
+            stats = await self.rebuild_index(inventory_list)
+            return {"changed": stats.get("uploaded", 0), "removed": 0, "unchanged": 0, "full_rebuild": True}
         
-        if not items:
-            logger.warning("Inventory document contains no items")
-            return
+        index_dimensions = await self.vector_store.get_vector_dimensions()
+        if index_dimensions != self.embedding_generator.expected_dim:
+            logger.info(
+                f"Index has {index_dimensions}-dimension vectors, configured width is "
+                f"{self.embedding_generator.expected_dim}; running a full rebuild"
+            )
+            stats = await self.rebuild_index(inventory_list)
+            return {"changed": stats.get("uploaded", 0), "removed": 0, "unchanged": 0, "full_rebuild": True}
         
-        logger.info(f"Processing {len(items)} individual inventory items")
+        # On the shared index the diff below replaces old ids in place, as a shared rebuild would
+        if (not self.vector_store.shared
+                and (await self.vector_store.get_index_settings()).get("document_id_version") != DOCUMENT_ID_VERSION):
+            logger.info("Index uses an older document id scheme, running a full rebuild")
+            stats = await self.rebuild_index(inventory_list)
+            return {"changed": stats.get("uploaded", 0), "removed": 0, "unchanged": 0, "full_rebuild": True}
         
-        for i, item in enumerate(items):
-            try:
-                # Create rich content
-                content = self._create_item_content(item)
-                
-                # Generate embedding
-                embedding = await self._generate_embedding_with_retry(content)
-                
-                # Create document with correct field mapping
-                vector_doc = {
-                    'id': str(uuid.uuid4()),
-                    'userId': self.user_id,
-                    'supplier_name': item.get('Supplier Name', ''),
-                    'inventory_item_name': item.get('Inventory Item Name', ''),
-                    'item_name': item.get('Item Name', ''),
-                    'item_number': item.get('Item Number', ''),
-                    'quantity_in_case': float(item.get('Quantity In a Case', 0)),
-                    'total_units': float(item.get('Total Units', 0)),
-                    'case_price': float(item.get('Case Price', 0)),
-                    'cost_of_unit': float(item.get('Cost of a Unit', 0)),
-                    'category': item.get('Category', ''),
-                    'measured_in': item.get('Measured In', ''),
-                    'catch_weight': item.get('Catch Weight', ''),
-                    'priced_by': item.get('Priced By', ''),
-                    'splitable': item.get('Splitable', ''),
-                    'content': content,
-                    'content_vector': embedding
-                }
-                
-                vector_documents.append(vector_doc)
-                logger.info(f"Successfully processed item {i+1}/{len(items)}: {item.get('Inventory Item Name')}")
-                
-            except Exception as e:
-                logger.error(f"Error processing item {i}: {str(e)}")
-                # Continue with next item instead of failing completely
+        indexed_hashes = await self.vector_store.get_document_hashes()
+        
+        # Diff the current inventory against what is indexed, keeping only changed items
+        current_ids = set()
+        changed_items = []
+        async for item in self._iter_inventory_items(inventory_list):
+            fields = self._create_document_fields(item, self._create_item_content(item))
+            if fields['id'] in current_ids:
                 continue
+            current_ids.add(fields['id'])
+            if indexed_hashes.get(fields['id']) != fields['content_hash']:
+                changed_items.append(item)
         
-        if vector_documents:
-            logger.info(f"Adding {len(vector_documents)} documents to vector store")
-            await self.vector_store.add_documents(vector_documents)
-        else:
-            logger.warning("No documents were successfully processed for indexing")
+        if not current_ids:
+            # Never wipe the index because an inventory read came back empty
+            logger.error(f"No inventory found for user {self.user_id}")
+            raise ValueError(f"No inventory found for user {self.user_id}")
+        
+        removed_ids = [doc_id for doc_id in indexed_hashes if doc_id not in current_ids]
+        unchanged = len(current_ids) - len(changed_items)
+        
+        logger.info(
+            f"Incremental sync: {len(changed_items)} changed, {len(removed_ids)} removed, "
+            f"{unchanged} unchanged"
+        )
+        
+        if changed_items:
+            await self._run_indexing_pipeline(changed_items)
+        
+        if removed_ids:
+            await self.vector_store.delete_documents(removed_ids)
+        
+        if changed_items or removed_ids:
+            bump_inventory_version(self.user_id)
+        
+        return {
+            "changed": len(changed_items),
+            "removed": len(removed_ids),
+            "unchanged": unchanged,
+            "full_rebuild": False
+        }
 
-    async def initialize(self):
-        """Initialize the RAG system with better error handling and logging."""
+    async def rebuild_index(self, inventory_list=None):
+        """
+        Rebuild the user's index without taking it offline
+        
+        Items are indexed into a new versioned shadow index, which is validated by
+        document count and a smoke query before the user is switched over to it.
+        The live index keeps serving queries throughout and is removed afterwards.
+        
+        Progress is checkpointed after every uploaded batch. If an earlier build was
+        interrupted, its shadow index is reused and items whose documents already
+        landed there unchanged are skipped instead of being embedded and uploaded again.
+        
+        Args:
+            inventory_list (list): Optional inventory documents; streamed from Cosmos when omitted
+            
+        Returns:
+            dict: Indexing pipeline stats for the rebuild, including how many items were resumed
+        """
+        if self.user_id in _active_builds:
+            raise RuntimeError(f"An index build is already running for user {self.user_id}")
+        _active_builds.add(self.user_id)
+        
         try:
-            # Get user inventory
-            logger.info(f"Fetching inventory data for user {self.user_id}")
-            inventory = await self.cosmos_db.get_user_documents(self.user_id)
+            if self.vector_store.shared:
+                return await self._rebuild_shared_index(inventory_list)
+            return await self._build_shadow_index(inventory_list)
+        finally:
+            _active_builds.discard(self.user_id)
+
+    async def _rebuild_shared_index(self, inventory_list=None):
+        """
+        Re-upload all of the user's items into the shared index, then delete their stale documents
+        
+        Other tenants share the index, so there is no shadow copy to switch to;
+        documents are upserted in place and the user keeps being served throughout.
+        """
+        await self.vector_store.create_index(dimensions=self.embedding_generator.expected_dim)
+        index_dimensions = await self.vector_store.get_vector_dimensions()
+        if index_dimensions != self.embedding_generator.expected_dim:
+            # Every tenant shares the index's vector width, so it cannot change in place
+            error_msg = (
+                f"Shared index {self.vector_store.index_name} holds {index_dimensions}-dimension vectors, "
+                f"not {self.embedding_generator.expected_dim}; point SEARCH_INDEX_NAME at a new index to change width"
+            )
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        indexed_hashes = await self.vector_store.get_document_hashes()
+        
+        seen_ids = set()
+        
+        async def all_items():
+            async for item in self._iter_inventory_items(inventory_list):
+                seen_ids.add(self._document_id(item))
+                yield item
+        
+        stats = await self._run_indexing_pipeline(all_items())
+        
+        if not seen_ids:
+            logger.error(f"No inventory found for user {self.user_id}")
+            raise ValueError(f"No inventory found for user {self.user_id}")
+        
+        stale_ids = [doc_id for doc_id in indexed_hashes if doc_id not in seen_ids]
+        if stale_ids:
+            await self.vector_store.delete_documents(stale_ids)
+        bump_inventory_version(self.user_id)
+        
+        stats["documents"] = len(seen_ids)
+        stats["removed"] = len(stale_ids)
+        logger.info(f"Rebuilt {len(seen_ids)} documents for user {self.user_id} in shared index {self.vector_store.index_name}")
+        return stats
+
+    async def _build_shadow_index(self, inventory_list=None):
+        """Build, validate and activate a shadow index, resuming an interrupted build when possible."""
+        # Checkpoints are SQLite writes, so every call from here runs in a worker thread
+        checkpoints = get_checkpoint_store()
+        build = await asyncio.to_thread(checkpoints.get_build, self.user_id)
+        completed = {}
+        
+        # Counted up front so a new shadow index gets HNSW parameters for its size
+        if inventory_list is None:
+            total_items = await self.cosmos_db.count_user_items(self.user_id)
+        else:
+            total_items = sum(len(inventory_doc.get('items', [])) for inventory_doc in inventory_list)
+        
+        resumable_store = None
+        if (build and build["status"] in RESUMABLE_STATUSES
+                and build["index_name"] != self.vector_store.index_name):
+            resumable_store = VectorStore(self.user_id, index_name=build["index_name"])
+            # A build started at another vector width or id scheme cannot be continued
+            if (not await resumable_store.has_field('content_hash')
+                    or await resumable_store.get_vector_dimensions() != self.embedding_generator.expected_dim
+                    or (await resumable_store.get_index_settings()).get("document_id_version") != DOCUMENT_ID_VERSION):
+                # Nothing else points at the abandoned shadow index, so remove it before starting over
+                logger.info(f"Discarding shadow index {build['index_name']}, which cannot be resumed")
+                await resumable_store.delete_index()
+                resumable_store = None
+        
+        if resumable_store:
+            shadow_store = resumable_store
+            await shadow_store.connect_to_index()
+            completed = await asyncio.to_thread(checkpoints.resume_build, self.user_id)
+            logger.info(f"Resuming shadow index {shadow_store.index_name} from {len(completed)} checkpointed documents")
+        else:
+            shadow_store = VectorStore(self.user_id, index_name=self.vector_store.versioned_index_name())
+            logger.info(f"Building shadow index {shadow_store.index_name}")
+            await shadow_store.create_index(
+                document_count=total_items,
+                dimensions=self.embedding_generator.expected_dim,
+                metadata={"document_id_version": DOCUMENT_ID_VERSION}
+            )
+            await asyncio.to_thread(checkpoints.start_build, self.user_id, shadow_store.index_name)
+        
+        try:
+            await asyncio.to_thread(checkpoints.set_total, self.user_id, total_items)
+            
+            seen_ids = set()
+            skipped = 0
+            duplicates = 0
+            inventory_read = False
+            
+            def expected_documents():
+                # Progress counts distinct documents: the Cosmos count less the duplicates
+                # found so far, exact once the whole inventory has been read
+                return len(seen_ids) if inventory_read else total_items - duplicates
+            
+            async def remaining_items():
+                # Skip items whose current document is already in the shadow index, and
+                # items mapping to a document id already seen, as the incremental sync does
+                nonlocal skipped, duplicates, inventory_read
+                async for item in self._iter_inventory_items(inventory_list):
+                    fields = self._create_document_fields(item, self._create_item_content(item))
+                    if fields['id'] in seen_ids:
+                        duplicates += 1
+                        continue
+                    seen_ids.add(fields['id'])
+                    if completed.get(fields['id']) == fields['content_hash']:
+                        skipped += 1
+                        continue
+                    yield item
+                inventory_read = True
+                await asyncio.to_thread(checkpoints.set_total, self.user_id, expected_documents())
+            
+            def record_batch(documents):
+                checkpoints.record_batch(self.user_id, documents)
+                if duplicates:
+                    checkpoints.set_total(self.user_id, expected_documents())
             
-            if not inventory:
+            stats = await self._run_indexing_pipeline(
+                remaining_items(),
+                shadow_store,
+                on_uploaded=record_batch
+            )
+            if stats["upload_failed"]:
+                # Only the failed documents are missing from the checkpoint, so a rerun uploads just those
+                raise RuntimeError(f"{stats['upload_failed']} documents failed to upload into {shadow_store.index_name}")
+        except Exception as e:
+            # Keep the shadow index and its checkpoint so the next rebuild resumes from here
+            logger.error(f"Build into {shadow_store.index_name} interrupted, checkpoint kept: {str(e)}")
+            await asyncio.to_thread(checkpoints.finish_build, self.user_id, "interrupted", str(e))
+            raise
+        
+        try:
+            if not seen_ids:
                 logger.error(f"No inventory found for user {self.user_id}")
                 raise ValueError(f"No inventory found for user {self.user_id}")
             
-            logger.info(f"Retrieved {len(inventory)} inventory documents")
-            
-            # Create or update search index
-            logger.info("Creating/updating search index")
-            await self.vector_store.create_index()
+            # Items removed from the inventory since the interrupted run must not survive the resume
+            stale_ids = [doc_id for doc_id in completed if doc_id not in seen_ids]
+            if stale_ids:
+                await shadow_store.delete_documents(stale_ids)
+                await asyncio.to_thread(checkpoints.forget_documents, self.user_id, stale_ids)
             
-            # Index inventory items
-            logger.info("Indexing inventory items")
-            await self.index_inventory_items(inventory)
+            document_count = (await asyncio.to_thread(checkpoints.get_build, self.user_id))["completed_items"]
+            if not document_count:
+                raise ValueError(f"No documents were indexed into {shadow_store.index_name}")
+            if not await shadow_store.validate_index(document_count):
+                raise ValueError(f"Shadow index {shadow_store.index_name} failed validation")
+        except Exception as e:
+            # Leave the live index untouched and clean up the partial build
+            logger.error(f"Rebuild failed, keeping {self.vector_store.index_name}: {str(e)}")
+            await asyncio.to_thread(checkpoints.finish_build, self.user_id, "failed", str(e))
+            await shadow_store.delete_index()
+            raise
+        
+        await self.vector_store.activate(shadow_store, document_count)
+        await asyncio.to_thread(checkpoints.finish_build, self.user_id, "completed")
+        
+        stats["resumed"] = skipped
+        stats["duplicates"] = duplicates
+        stats["documents"] = document_count
+        logger.info(
+            f"Processed {stats['items']} inventory items, {skipped} resumed from checkpoint, "
+            f"{duplicates} duplicate document ids skipped"
+        )
+        return stats
+
+    async def initialize(self):
+        """Initialize the RAG system with better error handling and logging."""
+        try:
+            # Stream the user's inventory into a new search index and switch to it once it is ready
+            logger.info(f"Building search index from inventory data for user {self.user_id}")
+            await self.rebuild_index()
             
             logger.info("Initialization completed successfully")
             
@@ -178,10 +528,20 @@ class RAGAssistant:
             logger.error(f"Error during initialization: {str(e)}")
             raise
 
-    async def query(self, user_question, top_k=5):
-    
+    async def query(self, user_question, top_k=5, intent=None):
+     """
+     Answer a question about the user's inventory
+     
+     Args:
+         user_question (str): The question
+         top_k (int): Number of inventory items to retrieve
+         intent (tuple): Result of check_for_action_intent for this question, when
+             the caller already classified it; classified here otherwise
+     """
      try:
-        has_action_intent, action_type, action_params = await self.check_for_action_intent(user_question)
+        if intent is None:
+            intent = await self.check_for_action_intent(user_question)
+        has_action_intent, action_type, action_params = intent
         
         if has_action_intent:
             logger.info(f"Detected action intent: {action_type} with params: {action_params}")
@@ -201,11 +561,21 @@ class RAGAssistant:
         logger.info(f"Selected model: {selected_model}")
         
         # Generate embedding for the question
-        question_embedding = await self._generate_embedding_with_retry(user_question)
+        question_embedding = await self._get_query_embedding(user_question)
+        
+        # Push category, supplier and price/quantity constraints down to the index as a filter
+        filter_condition = await self._build_query_filter(user_question)
         
         # Search for relevant inventory items
         logger.info(f"Searching for top {top_k} relevant items")
-        search_results = await self.vector_store.search(question_embedding, top_k)
+        search_results = await self.vector_store.search(
+            question_embedding, top_k, filter_condition=filter_condition, query_text=user_question
+        )
+        
+        if not search_results and filter_condition:
+            # A wrongly extracted constraint should not hide every item
+            logger.info(f"No results with filter {filter_condition}, retrying without it")
+            search_results = await self.vector_store.search(question_embedding, top_k, query_text=user_question)
         
         if not search_results:
             logger.warning("No relevant inventory items found")
@@ -233,7 +603,7 @@ class RAGAssistant:
             # First attempt with model-specific parameters
             if needs_web_search:
                 # For search-enabled models, don't include temperature
-                response = self.openai_client.chat.completions.create(
+                response = await self._chat_completion(
                     model=selected_model,
                     web_search_options={"search_context_size": "medium"},
                     messages=messages,
@@ -241,7 +611,7 @@ class RAGAssistant:
                 )
             else:
                 # For fine-tuned models, include temperature
-                response = self.openai_client.chat.completions.create(
+                response = await self._chat_completion(
                     model=selected_model,
                     messages=messages,
                     temperature=0.3,
@@ -260,7 +630,7 @@ class RAGAssistant:
                 try:
                     # Use base GPT-4o model as fallback
                     fallback_model = "gpt-4o"
-                    response = self.openai_client.chat.completions.create(
+                    response = await self._chat_completion(
                         model=fallback_model,
                         messages=messages,
                         temperature=0.3,
@@ -281,6 +651,49 @@ class RAGAssistant:
         logger.error(f"Error processing query: {str(e)}")
         # Provide a graceful error message to the user
         return f"I encountered an issue while processing your question. Please try again or contact support if the problem persists. Error details: {str(e)}"
+    async def _build_query_filter(self, question):
+        """Extract structured constraints from the question and turn them into an OData filter."""
+        try:
+            known_values = await self.vector_store.get_field_values(["category", "supplier_name"])
+            constraints = extract_query_constraints(
+                question,
+                categories=known_values.get("category", []),
+                suppliers=known_values.get("supplier_name", [])
+            )
+            filter_condition = build_odata_filter(constraints)
+            if filter_condition:
+                logger.info(f"Using search filter: {filter_condition}")
+            return filter_condition
+        except Exception as e:
+            logger.error(f"Error extracting query filter: {str(e)}")
+            return None
+
+    async def _chat_completion(self, model, messages, max_tokens, **kwargs):
+        """
+        Create a chat completion through the shared OpenAI scheduler
+
+        Args:
+            model (str): Chat model to call
+            messages (list): Chat messages
+            max_tokens (int): Completion token limit
+            **kwargs: Extra parameters passed to the completions API
+
+        Returns:
+            ChatCompletion: The API response
+        """
+        # Reserve a typical completion rather than the limit; the scheduler
+        # corrects the budget from the response's usage
+        prompt_tokens = sum(len(message["content"]) // 4 + 4 for message in messages)
+        return await get_openai_scheduler().call(
+            model,
+            prompt_tokens + min(max_tokens, OPENAI_COMPLETION_TOKEN_ESTIMATE),
+            self.openai_client.chat.completions.create,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            **kwargs
+        )
+
     def _should_use_web_search(self, question):
         """Determine if the question would benefit from web search."""
         # Define keywords that suggest external information might be needed
@@ -408,25 +821,23 @@ Do not use Markdown formatting like ** or -. Use only HTML as specified above.
         
         return "\n\n".join(formatted_items)
 
-    async def index_user_documents(self):
-        """Re-index user documents (for refreshing the index)."""
+    async def index_user_documents(self, full_rebuild=False):
+        """Re-index user documents (for refreshing the index).
+        
+        By default only changed items are synced; full_rebuild builds a new index
+        and switches to it once validated.
+        """
         try:
             logger.info(f"Re-indexing documents for user {self.user_id}")
             
-            # Get updated inventory
-            inventory = await self.cosmos_db.get_user_documents(self.user_id)
-            
-            if not inventory:
-                logger.error(f"No inventory found for user {self.user_id}")
-                raise ValueError(f"No inventory found for user {self.user_id}")
-            
-            # Delete and recreate index
-            logger.info("Recreating search index")
-            await self.vector_store.create_index()
-            
-            # Index inventory items
-            logger.info("Indexing updated inventory items")
-            await self.index_inventory_items(inventory)
+            # Inventory is streamed from Cosmos in both modes
+            if full_rebuild:
+                # Build a fresh index alongside the live one and switch over
+                logger.info("Rebuilding search index")
+                await self.rebuild_index()
+            else:
+                logger.info("Syncing changed inventory items")
+                await self.sync_inventory_items()
             
             logger.info("Re-indexing completed successfully")
             return True
@@ -438,8 +849,34 @@ Do not use Markdown formatting like ** or -. Use only HTML as specified above.
     # Add this method to the RAGAssistant class in rag.py
 
     async def check_for_action_intent(self, user_question):
+        """
+        Classify whether a question asks for an inventory action
+        
+        Classifications are cached for INTENT_CACHE_TTL seconds by normalized
+        text, so a resubmitted question does not pay for another LLM call.
+        Failed classifications are not cached.
+        
+        Returns:
+            tuple: (has_action_intent, action_type, action_params)
+        """
+        normalized = " ".join(user_question.lower().split())
+        cached = intent_cache.get(normalized)
+        if cached is not None:
+            logger.info("Using cached action intent for question")
+            has_action_intent, action_type, action_params = cached
+            return (has_action_intent, action_type, dict(action_params))
+        
+        intent = await self._classify_action_intent(user_question)
+        if intent is None:
+            return (False, None, {})
+        
+        intent_cache.set(normalized, intent)
+        has_action_intent, action_type, action_params = intent
+        return (has_action_intent, action_type, dict(action_params))
+
+    async def _classify_action_intent(self, user_question):
 
-    # Use the LLM to detect if this is an action request
+    # Use the LLM to detect if this is an action request, returning None if it could not be classified
      prompt = f"""
 You are analyzing a user request to determine if it's asking to perform an action on inventory data.
 Please categorize this request and extract relevant parameters if it's an action request.
@@ -488,7 +925,7 @@ Respond ONLY with the JSON structure described above, no other text.
         # If SEARCH_MODEL is available, use it for better action detection capability
         model_to_use = self.openai_model if hasattr(self, 'openai_model') else "gpt-4o"
         
-        response = self.openai_client.chat.completions.create(
+        response = await self._chat_completion(
             model=model_to_use,
             messages=messages,
             temperature=0,
@@ -552,10 +989,10 @@ Respond ONLY with the JSON structure described above, no other text.
             logger.error(f"Raw response: {result_text}")
             import traceback
             logger.error(traceback.format_exc())
-            return (False, None, {})
+            return None
             
      except Exception as e:
         logger.error(f"Error in action detection: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
-        return (False, None, {})
\ No newline at end of file
+        return None
\ No newline at end of file
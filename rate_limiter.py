@@ -0,0 +1,259 @@
+# rate_limiter.py
+import asyncio
+import logging
+import random
+import time
+import openai
+from config import (
+    OPENAI_DEFAULT_RPM,
+    OPENAI_DEFAULT_TPM,
+    OPENAI_RATE_LIMITS,
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_RATE_LIMIT_RETRIES,
+    OPENAI_TRANSIENT_RETRIES
+)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("RateLimiter")
+
+# Successful calls needed before a reduced concurrency limit is raised by one
+_CONCURRENCY_RECOVERY_CALLS = 20
+
+class TokenBucket:
+    """Continuously refilling token bucket holding at most one minute of budget."""
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.available = float(per_minute)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount):
+        """Seconds until amount can be taken (0 if available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def take(self, amount):
+        """Take amount from the bucket; call only once wait_time() returned 0."""
+        self.available -= min(amount, self.capacity)
+
+    def adjust(self, amount):
+        """Return (positive) or charge (negative) budget after the fact."""
+        self._refill()
+        self.available = min(self.capacity, self.available + amount)
+
+class ModelRateLimiter:
+    """
+    Request and token budgets plus an adaptive concurrency limit for one model.
+
+    Concurrency is halved whenever the server answers 429 and creeps back up
+    after a run of successful calls.
+    """
+    def __init__(self, model, rpm, tpm, max_concurrency):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = max_concurrency
+        self.in_flight = 0
+        self.waiting = 0
+        self.cooldown_until = 0.0
+        self.successes_since_limit = 0
+        self.rate_limited_count = 0
+        self.transient_error_count = 0
+        self.completed_count = 0
+        self._lock = asyncio.Lock()
+        self._slot_released = asyncio.Condition()
+
+    async def acquire(self, token_count):
+        """Wait for a concurrency slot and enough request and token budget."""
+        self.waiting += 1
+        try:
+            # Callers are admitted one at a time, in arrival order
+            async with self._lock:
+                async with self._slot_released:
+                    await self._slot_released.wait_for(lambda: self.in_flight < self.concurrency_limit)
+                    self.in_flight += 1
+
+                try:
+                    while True:
+                        delay = max(
+                            self.cooldown_until - time.monotonic(),
+                            self.requests.wait_time(1),
+                            self.tokens.wait_time(token_count)
+                        )
+                        if delay <= 0:
+                            break
+                        await asyncio.sleep(delay)
+                except BaseException:
+                    # Give the slot back if the caller is cancelled while waiting for budget
+                    await self.release()
+                    raise
+
+                self.requests.take(1)
+                self.tokens.take(token_count)
+        finally:
+            self.waiting -= 1
+
+    async def release(self):
+        """Free the concurrency slot taken by acquire()."""
+        async with self._slot_released:
+            self.in_flight -= 1
+            self._slot_released.notify_all()
+
+    def on_success(self):
+        self.completed_count += 1
+        if self.concurrency_limit < self.max_concurrency:
+            self.successes_since_limit += 1
+            if self.successes_since_limit >= _CONCURRENCY_RECOVERY_CALLS:
+                self.concurrency_limit += 1
+                self.successes_since_limit = 0
+
+    def reconcile(self, reserved, used):
+        """Correct the token budget once the response reports the tokens actually used."""
+        self.tokens.adjust(min(reserved, self.tokens.capacity) - used)
+
+    def on_rate_limited(self, retry_after):
+        """Back off after a 429: pause new calls and halve the concurrency limit."""
+        self.rate_limited_count += 1
+        self.successes_since_limit = 0
+        self.concurrency_limit = max(1, self.concurrency_limit // 2)
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + retry_after)
+        logger.warning(
+            f"Rate limited on {self.model}: pausing {retry_after:.1f}s, "
+            f"concurrency limit now {self.concurrency_limit}"
+        )
+
+    def metrics(self):
+        return {
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "concurrency_limit": self.concurrency_limit,
+            "max_concurrency": self.max_concurrency,
+            "requests_available": int(self.requests.available),
+            "tokens_available": int(self.tokens.available),
+            "cooldown_seconds": round(max(0.0, self.cooldown_until - time.monotonic()), 2),
+            "completed": self.completed_count,
+            "rate_limited": self.rate_limited_count,
+            "transient_errors": self.transient_error_count
+        }
+
+class OpenAIScheduler:
+    """
+    Process-wide scheduler that every OpenAI call goes through.
+
+    Each model gets its own requests-per-minute and tokens-per-minute buckets
+    and adaptive concurrency limit, so concurrent tenants share one budget
+    instead of each discovering the limit through 429s.
+    """
+    def __init__(self, rate_limits=OPENAI_RATE_LIMITS, max_retries=OPENAI_RATE_LIMIT_RETRIES,
+                 transient_retries=OPENAI_TRANSIENT_RETRIES):
+        self.rate_limits = rate_limits
+        self.max_retries = max_retries
+        self.transient_retries = transient_retries
+        self._limiters = {}
+
+    def _limiter(self, model):
+        if model not in self._limiters:
+            limits = self.rate_limits.get(model, {})
+            self._limiters[model] = ModelRateLimiter(
+                model,
+                rpm=limits.get("rpm", OPENAI_DEFAULT_RPM),
+                tpm=limits.get("tpm", OPENAI_DEFAULT_TPM),
+                max_concurrency=limits.get("max_concurrency", OPENAI_MAX_CONCURRENCY)
+            )
+        return self._limiters[model]
+
+    @staticmethod
+    def _retry_after(error, attempt):
+        """Read the server's retry-after hint, falling back to exponential backoff."""
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            if headers.get("retry-after"):
+                return float(headers["retry-after"])
+        except ValueError:
+            pass
+        return min(2 ** attempt, 30)
+
+    @staticmethod
+    def _used_tokens(result):
+        """Tokens the response reports it used, or None if it has no usage."""
+        usage = getattr(result, "usage", None)
+        return getattr(usage, "total_tokens", None)
+
+    async def call(self, model, token_count, func, *args, **kwargs):
+        """
+        Run an OpenAI API call once the model's budget allows it
+
+        Args:
+            model (str): Model the request is billed against
+            token_count (int): Tokens the request counts against the per-minute limit
+            func (callable): Async client method to call
+            *args, **kwargs: Passed to func
+
+        Returns:
+            The result of func
+        """
+        limiter = self._limiter(model)
+        rate_limited = 0
+        transient = 0
+
+        # The client is created with max_retries=0, so every retry happens here
+        while True:
+            delay = 0
+            await limiter.acquire(token_count)
+            try:
+                result = await func(*args, **kwargs)
+                limiter.on_success()
+                used = self._used_tokens(result)
+                if used is not None:
+                    limiter.reconcile(token_count, used)
+                return result
+            except openai.RateLimitError as e:
+                limiter.on_rate_limited(self._retry_after(e, rate_limited))
+                if rate_limited == self.max_retries:
+                    raise
+                rate_limited += 1
+            except (openai.APIConnectionError, openai.InternalServerError) as e:
+                # Timeouts, dropped connections and 5xx responses; APITimeoutError is an APIConnectionError
+                limiter.transient_error_count += 1
+                if transient == self.transient_retries:
+                    raise
+                delay = self._retry_after(e, transient) * random.uniform(0.5, 1.0)
+                transient += 1
+                logger.warning(
+                    f"Transient error from {model} ({type(e).__name__}), "
+                    f"retry {transient}/{self.transient_retries} in {delay:.1f}s"
+                )
+            finally:
+                await limiter.release()
+
+            # Back off without holding a concurrency slot
+            if delay:
+                await asyncio.sleep(delay)
+
+    def metrics(self):
+        """Return queue depth, concurrency and budget metrics for each model."""
+        return {model: limiter.metrics() for model, limiter in self._limiters.items()}
+
+_openai_scheduler = None
+
+def get_openai_scheduler():
+    """Return the process-wide OpenAI scheduler."""
+    global _openai_scheduler
+    if _openai_scheduler is None:
+        _openai_scheduler = OpenAIScheduler()
+    return _openai_scheduler
@@ -1,8 +1,9 @@
 # search.py
+import asyncio
 import logging
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.indexes import SearchIndexClient
+import time
+import numpy as np
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceNotFoundError
 from azure.search.documents.indexes.models import (
     SearchIndex,
     SimpleField,
@@ -13,9 +14,34 @@ from azure.search.documents.indexes.models import (
     SearchField,
 )
 from config import (
-    SEARCH_SERVICE_ENDPOINT,
-    SEARCH_SERVICE_KEY,
-    OPENAI_EMBEDDING_MODEL
+    INDEX_VALIDATION_TIMEOUT,
+    INDEX_GC_DELAY_SECONDS,
+    LOCAL_INDEX_ENABLED,
+    LOCAL_INDEX_MAX_DOCUMENTS,
+    SEARCH_MODE,
+    HYBRID_CANDIDATES,
+    SEARCH_INDEX_NAME,
+    SEARCH_INDEX_MODE,
+    SEARCH_UPLOAD_CONCURRENCY,
+    SEARCH_UPLOAD_MAX_BYTES,
+    SEARCH_UPLOAD_MAX_DOCUMENTS,
+    SEARCH_UPLOAD_RETRIES,
+    SEARCH_RESULT_MODE
+)
+from index_registry import get_index_registry
+from search_clients import get_index_client, get_search_client, release_search_client
+from index_catalog import get_index_catalog
+from hnsw_tuning import get_hnsw_settings
+from embedding_backends import get_embedding_dimensions
+from item_store import get_item_store
+import local_index
+from search_cache import (
+    search_result_cache,
+    field_values_cache,
+    search_cache_key,
+    get_inventory_version,
+    bump_inventory_version,
+    invalidate_index_exists
 )
 from tenacity import retry, stop_after_attempt, wait_exponential
 
@@ -26,65 +52,183 @@ logging.basicConfig(
 )
 logger = logging.getLogger("VectorStore")
 
+# Per-document upload statuses worth retrying: version conflict, index temporarily unavailable
+# (422 while an update with allowIndexDowntime is applied), throttling and service unavailable
+_RETRYABLE_UPLOAD_STATUS = {409, 422, 429, 503}
+
+# Longest JSON encoding of a float32 vector component, with its separator ("-1.2345678901234567e-05,")
+_JSON_BYTES_PER_FLOAT = 24
+
+# Keeps scheduled sweeps of replaced indexes alive until they finish
+_pending_index_deletions = set()
+
+# Keeps background loads of local indexes alive until they finish
+_pending_local_loads = set()
+
+# Keeps background field value scans alive until they finish, and the keys they refresh
+_pending_field_value_refreshes = set()
+_refreshing_field_values = set()
+
+# Fields returned for each search result
+SEARCH_SELECT_FIELDS = [
+    "inventory_item_name",
+    "item_name",
+    "category",
+    "case_price",
+    "cost_of_unit",
+    "total_units",
+    "measured_in",
+    "priced_by",
+    "content",
+    "supplier_name"
+]
+
+def resolve_index_name(user_id):
+    """Return the name of the index currently serving a user's queries."""
+    if SEARCH_INDEX_MODE == "shared":
+        return SEARCH_INDEX_NAME
+    return resolve_user_index_name(user_id)
+
+def resolve_user_index_name(user_id):
+    """Return the user's own index in per-user mode, whichever index mode is configured."""
+    active = get_index_registry().get_active(user_id)
+    if active:
+        return active["index_name"]
+    # Users indexed before blue/green rebuilds still use the unversioned name
+    return f"inventory-{user_id}"
+
+async def sweep_index_deletions():
+    """
+    Delete replaced indexes whose grace period has passed
+
+    Pending deletions are recorded in the index registry by VectorStore.activate,
+    so run this on startup to finish deletions an earlier process did not get to.
+    A sweep is scheduled for the next deletion that is not yet due.
+
+    Returns:
+        int: Number of indexes deleted
+    """
+    registry = get_index_registry()
+    deleted = 0
+    # Registry reads and writes are SQLite calls, so they run in a worker thread
+    for pending in await asyncio.to_thread(registry.get_pending_deletions):
+        wait = pending["delete_after"] - time.time()
+        if wait > 0:
+            _schedule_index_sweep(wait)
+            break
+        if await asyncio.to_thread(registry.is_active_anywhere, pending["index_name"]):
+            logger.warning(f"Not deleting {pending['index_name']}: it is active again")
+            await asyncio.to_thread(registry.forget_deletion, pending["index_name"])
+            continue
+        if await VectorStore(pending["user_id"], index_name=pending["index_name"]).delete_index():
+            deleted += 1
+    return deleted
+
+def _schedule_index_sweep(delay):
+    """Run sweep_index_deletions after delay seconds, in the background."""
+    async def sweep_later():
+        await asyncio.sleep(delay)
+        await sweep_index_deletions()
+
+    task = asyncio.create_task(sweep_later())
+    _pending_index_deletions.add(task)
+    task.add_done_callback(_pending_index_deletions.discard)
+
+def local_index_key(user_id, index_name):
+    """Key of a user's in-process index; the shared index gets one per user."""
+    return f"{index_name}|{user_id}" if index_name == SEARCH_INDEX_NAME else index_name
+
 class VectorStore:
-    def __init__(self, user_id):
+    """
+    Per-user view of an Azure Search index
+
+    Clients are async and share one connection pool across all tenants, so creating
+    a store makes no network calls and no request blocks the event loop.
+
+    On the shared index (SEARCH_INDEX_NAME) every tenant's documents live side by
+    side, and the store confines searches, counts, uploads and deletes to its user.
+    """
+    def __init__(self, user_id, index_name=None):
         logger.info(f"Initializing VectorStore for user {user_id}")
         self.user_id = user_id
-        self.credential = AzureKeyCredential(SEARCH_SERVICE_KEY)
-        self.index_name = f"inventory-{user_id}"
-        self.index_client = SearchIndexClient(
-            endpoint=SEARCH_SERVICE_ENDPOINT,
-            credential=self.credential
-        )
+        self.index_name = index_name or resolve_index_name(user_id)
+        self.shared = self.index_name == SEARCH_INDEX_NAME
+        self.follows_active_index = index_name is None
         self.search_client = None
-        
-        # Check if index already exists
-        try:
-            if self.index_name in list(self.index_client.list_index_names()):
-                logger.info(f"Found existing index: {self.index_name}")
-                self._connect_to_index()
-            else:
-                logger.info(f"No existing index found for: {self.index_name}")
-        except Exception as e:
-            logger.error(f"Error checking index existence: {str(e)}")
-    
-    def _connect_to_index(self):
-        """Helper method to connect to an existing index."""
-        try:
-            self.search_client = SearchClient(
-                endpoint=SEARCH_SERVICE_ENDPOINT,
-                credential=self.credential,
-                index_name=self.index_name
-            )
-            logger.info(f"Connected to existing index: {self.index_name}")
-            return True
-        except Exception as e:
-            logger.error(f"Error connecting to index: {str(e)}")
-            return False
+        self._searchable_fields = {}
+        self._stored_fields = {}
+        self._vector_dimensions = {}
+
+    @property
+    def local_key(self):
+        """Key of this store's in-process index."""
+        return local_index_key(self.user_id, self.index_name)
+
+    def _user_filter(self):
+        """OData filter matching this user's documents."""
+        return "userId eq '{}'".format(str(self.user_id).replace("'", "''"))
+
+    @staticmethod
+    def _id_filter(document_ids):
+        """OData filter matching documents by id."""
+        return "search.in(id, '{}', ',')".format(",".join(str(doc_id).replace("'", "''") for doc_id in document_ids))
+
+    def _scoped_filter(self, filter_condition):
+        """Restrict a filter to this user's documents on the shared index."""
+        if not self.shared:
+            return filter_condition
+        if not filter_condition:
+            return self._user_filter()
+        return f"{self._user_filter()} and ({filter_condition})"
+
+    @property
+    def index_client(self):
+        """The shared async index management client."""
+        return get_index_client()
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    async def create_index(self):
-        """Create search index with retry logic."""
+    async def create_index(self, document_count=None, dimensions=None, metadata=None):
+        """Create search index with retry logic.
+        
+        Vectors are dimensions wide, by default the width of the configured
+        embedding backend. HNSW parameters are chosen for the size tier of
+        document_count (see hnsw_tuning). Both are recorded in the index registry,
+        along with any caller metadata.
+        An existing shared index is kept as is, since it holds other tenants' documents.
+        """
         try:
-            # Try to delete existing index
-            try:
-                self.index_client.delete_index(self.index_name)
-                logger.info(f"Deleted existing index: {self.index_name}")
-            except Exception as e:
-                logger.info(f"No existing index to delete: {self.index_name}")
+            if self.shared:
+                # Ask the service itself: a stale catalog must never lead to replacing the shared index
+                try:
+                    await self.index_client.get_index(self.index_name)
+                    get_index_catalog().add(self.index_name)
+                    logger.info(f"Using existing shared index: {self.index_name}")
+                    await self.connect_to_index()
+                    return True
+                except ResourceNotFoundError:
+                    logger.info(f"Shared index {self.index_name} does not exist yet, creating it")
+            else:
+                # Try to delete existing index
+                try:
+                    await self.index_client.delete_index(self.index_name)
+                    get_index_catalog().discard(self.index_name)
+                    logger.info(f"Deleted existing index: {self.index_name}")
+                except Exception as e:
+                    logger.info(f"No existing index to delete: {self.index_name}")
+                # The recreated index starts empty, so stored copies of its documents are stale
+                await asyncio.to_thread(get_item_store().purge_index, self.index_name)
+            
+            dimensions = dimensions or get_embedding_dimensions()
             
-            # Configure vector search
+            # Configure vector search with the HNSW parameters for this index's size tier
+            hnsw_settings = get_hnsw_settings(document_count)
+            logger.info(f"Using {hnsw_settings['tier']} tier HNSW parameters: {hnsw_settings['parameters']}")
             vector_search = VectorSearch(
                 algorithms=[
                     HnswAlgorithmConfiguration(
                         name="hnsw-config",
                         kind="hnsw",
-                        parameters={
-                            "m": 4,
-                            "efConstruction": 400,
-                            "efSearch": 500,
-                            "metric": "cosine"
-                        }
+                        parameters=dict(hnsw_settings["parameters"], metric="cosine")
                     )
                 ],
                 profiles=[
@@ -97,12 +241,12 @@ class VectorStore:
 
             # Define fields with better naming and appropriate properties
             fields = [
-                SimpleField(name="id", type="Edm.String", key=True),
+                SimpleField(name="id", type="Edm.String", key=True, filterable=True),
                 SimpleField(name="userId", type="Edm.String", filterable=True),
                 SearchableField(name="supplier_name", type="Edm.String", filterable=True, searchable=True, sortable=True),
                 SearchableField(name="inventory_item_name", type="Edm.String", filterable=True, searchable=True, sortable=True),
                 SearchableField(name="item_name", type="Edm.String", filterable=True, searchable=True),
-                SimpleField(name="item_number", type="Edm.String", filterable=True),
+                SearchableField(name="item_number", type="Edm.String", filterable=True, searchable=True),
                 SimpleField(name="quantity_in_case", type="Edm.Double", filterable=True, sortable=True),
                 SimpleField(name="total_units", type="Edm.Double", filterable=True, sortable=True),
                 SimpleField(name="case_price", type="Edm.Double", filterable=True, sortable=True),
@@ -113,10 +257,11 @@ class VectorStore:
                 SearchableField(name="priced_by", type="Edm.String", filterable=True),
                 SimpleField(name="splitable", type="Edm.String", filterable=True),
                 SearchableField(name="content", type="Edm.String", searchable=True),
+                SimpleField(name="content_hash", type="Edm.String", filterable=True),
                 SearchField(
                     name="content_vector",
                     type="Collection(Edm.Single)",
-                    vector_search_dimensions=1536,  # Matches OpenAI's embedding dimensions
+                    vector_search_dimensions=dimensions,  # Matches the embedding backend's vector width
                     vector_search_profile_name="vector-profile"
                 )
             ]
@@ -130,152 +275,838 @@ class VectorStore:
                 vector_search=vector_search
             )
             
-            self.index_client.create_or_update_index(index)
+            if self.shared:
+                try:
+                    # create_index fails rather than overwriting an index another worker just created
+                    await self.index_client.create_index(index)
+                except ResourceExistsError:
+                    logger.info(f"Shared index {self.index_name} was created concurrently, using it")
+                    get_index_catalog().add(self.index_name)
+                    await self.connect_to_index()
+                    return True
+            else:
+                await self.index_client.create_or_update_index(index)
+            get_index_catalog().add(self.index_name)
+            invalidate_index_exists(self.user_id)
+            await asyncio.to_thread(
+                get_index_registry().record_index_settings,
+                self.index_name, dict(metadata or {}, dimensions=dimensions, hnsw=hnsw_settings)
+            )
+            self._vector_dimensions[self.index_name] = dimensions
             logger.info(f"Successfully created index: {self.index_name}")
             
+            # A new index starts empty, so its local copy is complete from the first upload
+            if LOCAL_INDEX_ENABLED:
+                local_index.create_local_index(self.local_key, dimensions)
+            
             # Connect to the newly created index
-            self._connect_to_index()
+            await self.connect_to_index()
             return True
             
         except Exception as e:
             logger.error(f"Error creating index: {str(e)}")
             raise
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
     async def add_documents(self, documents):
-        """Add documents to the index with improved error handling and retries."""
+        """
+        Upload documents to the index
+        
+        Documents are packed into batches by serialized size and uploaded by
+        SEARCH_UPLOAD_CONCURRENCY workers. Documents the service rejects with a
+        transient status, and batches that fail outright, are retried with backoff;
+        only the failed documents are sent again. Batches the service finds too
+        large are split in half and the halves queued for any worker.
+        
+        Args:
+            documents (list): Index documents, each with an id and a content_vector
+            
+        Returns:
+            dict: Counts of uploaded and failed documents, the ids that failed
+            (including invalid documents), upload requests sent, batches the
+            service accepted, retries made and batches split
+        """
+        summary = {
+            "uploaded": 0, "failed": 0, "failed_ids": [],
+            "requests": 0, "batches": 0, "retries": 0, "splits": 0
+        }
+        
         if not self.search_client:
-            logger.error("Search client not initialized")
             await self.connect_to_index()
             if not self.search_client:
                 raise ValueError("Failed to initialize search client")
         
         if not documents:
             logger.warning("No documents provided to add_documents")
-            return []
-            
-        try:
-            logger.info(f"Processing {len(documents)} documents for upload")
+            return summary
             
-            # Validate documents first
-            validated_docs = []
-            for i, doc in enumerate(documents):
-                try:
-                    # Essential validation
-                    if 'id' not in doc or not doc['id']:
-                        logger.warning(f"Document {i} missing id field, generating a new one")
-                        continue
-                        
-                    if 'content_vector' not in doc or not doc['content_vector']:
-                        logger.warning(f"Document {i} missing content_vector, skipping")
-                        continue
+        logger.info(f"Processing {len(documents)} documents for upload")
+        expected_dimensions = await self.get_vector_dimensions()
+        
+        # Validate documents first
+        validated_docs = []
+        for i, doc in enumerate(documents):
+            try:
+                # Essential validation
+                if 'id' not in doc or not doc['id']:
+                    logger.warning(f"Document {i} missing id field, skipping")
+                    summary["failed"] += 1
+                    continue
                     
-                    # Check vector dimensions
-                    vector_dim = len(doc['content_vector'])
-                    if vector_dim != 1536:  # OpenAI embedding dimension
-                        logger.warning(f"Document {i} has incorrect vector dimensions: {vector_dim}, skipping")
-                        continue
-                        
-                    # Add to validated docs
-                    validated_docs.append(doc)
+                if self.shared and doc.get('userId') != self.user_id:
+                    logger.warning(f"Document {i} belongs to another user, skipping")
+                    self._record_failure(summary, doc['id'])
+                    continue
                     
-                except Exception as e:
-                    logger.error(f"Error validating document {i}: {str(e)}")
+                if doc.get('content_vector') is None or len(doc['content_vector']) == 0:
+                    logger.warning(f"Document {i} missing content_vector, skipping")
+                    self._record_failure(summary, doc['id'])
                     continue
-            
-            if not validated_docs:
-                logger.error("No valid documents to upload after validation")
-                return []
                 
-            # Upload in batches to avoid request size limits
-            batch_size = 100
-            results = []
-            
-            for i in range(0, len(validated_docs), batch_size):
-                batch = validated_docs[i:i+batch_size]
-                logger.info(f"Uploading batch {(i//batch_size)+1} with {len(batch)} documents")
+                # Check vector dimensions
+                vector_dim = len(doc['content_vector'])
+                if vector_dim != expected_dimensions:
+                    logger.warning(f"Document {i} has incorrect vector dimensions: {vector_dim}, skipping")
+                    self._record_failure(summary, doc['id'])
+                    continue
+                    
+                # Add to validated docs, converting the vector to JSON-serializable floats
+                validated_docs.append(self._to_upload_document(doc))
                 
+            except Exception as e:
+                logger.error(f"Error validating document {i}: {str(e)}")
+                self._record_failure(summary, doc.get('id'))
+        
+        if not validated_docs:
+            logger.error("No valid documents to upload after validation")
+            return summary
+        
+        queue = asyncio.Queue()
+        for batch in self._pack_upload_batches(validated_docs):
+            queue.put_nowait(batch)
+        
+        async def upload_worker():
+            while True:
+                batch = await queue.get()
                 try:
-                    result = self.search_client.upload_documents(documents=batch)
-                    results.append(result)
-                    logger.info(f"Successfully uploaded batch {(i//batch_size)+1}")
+                    # Halves of a split batch go back on the queue rather than holding this worker
+                    for half in await self._upload_batch(batch, summary):
+                        queue.put_nowait(half)
                 except Exception as e:
-                    logger.error(f"Error uploading batch {(i//batch_size)+1}: {str(e)}")
-                    # Continue with next batch rather than failing completely
-                    
-            logger.info(f"Document upload complete. Total batches: {len(results)}")
-            return results
+                    logger.error(f"Error uploading batch of {len(batch)} documents: {str(e)}")
+                    for doc in batch:
+                        self._record_failure(summary, doc['id'])
+                finally:
+                    queue.task_done()
+        
+        workers = [
+            asyncio.create_task(upload_worker())
+            for _ in range(max(1, min(SEARCH_UPLOAD_CONCURRENCY, queue.qsize())))
+        ]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        
+        logger.info(
+            f"Document upload complete: {summary['uploaded']} uploaded, {summary['failed']} failed "
+            f"in {summary['batches']} batches ({summary['requests']} requests, {summary['retries']} retries, "
+            f"{summary['splits']} splits)"
+        )
+        return summary
+
+    @staticmethod
+    def _record_failure(summary, document_id):
+        summary["failed"] += 1
+        if document_id:
+            summary["failed_ids"].append(document_id)
+
+    @staticmethod
+    def _pack_upload_batches(documents, max_bytes=SEARCH_UPLOAD_MAX_BYTES, max_documents=SEARCH_UPLOAD_MAX_DOCUMENTS):
+        """Group documents into batches that stay under the request size and count limits."""
+        batches = []
+        batch = []
+        batch_bytes = 0
+        for document in documents:
+            document_bytes = VectorStore._estimate_upload_bytes(document)
+            if batch and (batch_bytes + document_bytes > max_bytes or len(batch) >= max_documents):
+                batches.append(batch)
+                batch = []
+                batch_bytes = 0
+            batch.append(document)
+            batch_bytes += document_bytes
+        if batch:
+            batches.append(batch)
+        return batches
+
+    @staticmethod
+    def _estimate_upload_bytes(document):
+        """
+        Estimate the JSON size of an upload document without serializing it
+
+        Vectors dominate the payload and are sized by their width at the longest
+        float encoding and other fields by their text length, which errs high for
+        typical documents.
+        """
+        size = 2
+        for name, value in document.items():
+            size += len(name) + 4
+            if isinstance(value, list):
+                size += len(value) * _JSON_BYTES_PER_FLOAT
+            else:
+                size += len(str(value)) + 2
+        return size
+
+    async def _upload_batch(self, batch, summary):
+        """
+        Upload one batch, retrying only the documents that did not succeed
+        
+        Returns:
+            list: The two halves of the pending documents when the service rejected
+            them as too large, to be uploaded separately; otherwise empty
+        """
+        pending = batch
+        for attempt in range(SEARCH_UPLOAD_RETRIES + 1):
+            if attempt:
+                summary["retries"] += 1
+                await asyncio.sleep(min(2 ** (attempt - 1), 10))
             
-        except Exception as e:
-            logger.error(f"Error in add_documents: {str(e)}")
-            raise
+            summary["requests"] += 1
+            try:
+                results = await self.search_client.upload_documents(documents=pending)
+            except HttpResponseError as e:
+                if e.status_code == 413 and len(pending) > 1:
+                    # Still too large for the service; split it and let the caller queue the halves
+                    summary["splits"] += 1
+                    middle = len(pending) // 2
+                    return [pending[:middle], pending[middle:]]
+                logger.error(f"Error uploading batch of {len(pending)} documents: {str(e)}")
+                continue
+            except Exception as e:
+                logger.error(f"Error uploading batch of {len(pending)} documents: {str(e)}")
+                continue
+            
+            summary["batches"] += 1
+            status_by_id = {result.key: result for result in results}
+            succeeded = [doc for doc in pending if status_by_id.get(doc['id']) is not None and status_by_id[doc['id']].succeeded]
+            summary["uploaded"] += len(succeeded)
+            local_index.upsert_documents(self.local_key, succeeded, LOCAL_INDEX_MAX_DOCUMENTS)
+            # The item store is SQLite; write it from a worker thread
+            await asyncio.to_thread(get_item_store().upsert_items, self.index_name, self.user_id, succeeded)
+            
+            retry = []
+            for doc in pending:
+                result = status_by_id.get(doc['id'])
+                if result is not None and result.succeeded:
+                    continue
+                status_code = getattr(result, "status_code", None)
+                if status_code is None or status_code in _RETRYABLE_UPLOAD_STATUS or status_code >= 500:
+                    retry.append(doc)
+                else:
+                    logger.error(f"Document {doc['id']} rejected ({status_code}): {getattr(result, 'error_message', '')}")
+                    self._record_failure(summary, doc['id'])
+            
+            if not retry:
+                return []
+            logger.warning(f"{len(retry)} documents failed to upload, retrying them")
+            pending = retry
+        
+        logger.error(f"Giving up on {len(pending)} documents after {SEARCH_UPLOAD_RETRIES} retries")
+        for doc in pending:
+            self._record_failure(summary, doc['id'])
+        return []
+
+    @staticmethod
+    def _to_upload_document(doc):
+        """Copy a document with its vector as a plain list, as required by the upload payload."""
+        upload_doc = dict(doc)
+        upload_doc['content_vector'] = np.asarray(doc['content_vector'], dtype=np.float32).tolist()
+        return upload_doc
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-    async def search(self, query_vector, top_k=5, filter_condition=None):
-        """Perform vector search with additional features and better error handling."""
+    async def search(self, query_vector, top_k=5, filter_condition=None, query_text=None):
+        """Perform vector search with additional features and better error handling.
+        
+        Searches are answered from the in-process copy of the index when it is loaded,
+        and from Azure Search otherwise. In hybrid SEARCH_MODE, query_text also runs a
+        BM25 query over content, item_name and item_number, fused with the vector
+        results by reciprocal-rank fusion. With SEARCH_RESULT_MODE "ids", Azure Search
+        returns only ids and scores and the fields are read from the item store;
+        indexes without content_hash always return full results. If the index was
+        replaced and deleted by another process, the search moves to the user's
+        active index.
+        """
+        if SEARCH_MODE != "hybrid":
+            query_text = None
+        requested_filter = filter_condition
+        
+        # Tenants on the shared index only ever see their own documents
+        filter_condition = self._scoped_filter(filter_condition)
+        
+        # Results stay valid until the user's inventory version is bumped by a write or reindex
+        cache_key = search_cache_key(self.user_id, self.index_name, query_vector, top_k, filter_condition, query_text)
+        cached_results = search_result_cache.get(cache_key)
+        if cached_results is not None:
+            logger.info(f"Serving {len(cached_results)} cached search results")
+            return [dict(result) for result in cached_results]
+        
+        local_results = self._search_local(query_vector, top_k, filter_condition, query_text)
+        if local_results is not None:
+            search_result_cache.set(cache_key, local_results)
+            return [dict(result) for result in local_results]
+        
         if not self.search_client:
             logger.error("Search client not initialized")
             await self.connect_to_index()
             if not self.search_client:
                 raise ValueError("Failed to initialize search client")
                 
+        two_phase = SEARCH_RESULT_MODE == "ids" and await self._supports_two_phase()
         try:
-            # Select fields to return in search results
-            select_fields = [
-                "inventory_item_name",
-                "item_name",
-                "category",
-                "case_price",
-                "cost_of_unit",
-                "total_units",
-                "measured_in",
-                "priced_by",
-                "content",
-                "supplier_name"
-            ]
-            
             # Prepare search options
             search_params = {
                 "search_text": None,
                 "vector_queries": [{
-                    'vector': query_vector,
+                    'vector': np.asarray(query_vector, dtype=np.float32).tolist(),
                     'fields': 'content_vector',
                     'k': top_k,
                     'kind': 'vector'
                 }],
-                "select": ",".join(select_fields),
+                # content_hash lets stale copies in the item store be detected
+                "select": "id,content_hash" if two_phase else ",".join(SEARCH_SELECT_FIELDS),
                 "top": top_k
             }
             
+            # Hybrid queries add a lexical query that Azure fuses with the vector results
+            search_fields = await self._lexical_search_fields() if query_text else []
+            if search_fields:
+                search_params["search_text"] = query_text
+                search_params["search_fields"] = ",".join(search_fields)
+                search_params["vector_queries"][0]["k"] = max(top_k, HYBRID_CANDIDATES)
+            
             # Add filter if provided
             if filter_condition:
                 search_params["filter"] = filter_condition
                 
             # Execute search
-            logger.info(f"Executing vector search with top_k={top_k}")
-            results = self.search_client.search(**search_params)
+            logger.info(f"Executing {'hybrid' if search_fields else 'vector'} search with top_k={top_k}")
+            results = await self.search_client.search(**search_params)
             
             # Process results
             search_results = []
-            for result in results:
+            async for result in results:
                 search_results.append(dict(result))
             
+            if two_phase:
+                search_results = await self._hydrate_results(search_results)
+            
             logger.info(f"Search returned {len(search_results)} results")
-            return search_results
+            search_result_cache.set(cache_key, search_results)
+            return [dict(result) for result in search_results]
             
+        except ResourceNotFoundError as e:
+            if await self._follow_active_index():
+                return await self.search(query_vector, top_k, requested_filter, query_text)
+            logger.error(f"Error performing search: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Error performing search: {str(e)}")
             raise
 
+    async def _follow_active_index(self):
+        """
+        Switch to the user's active index when the registry points somewhere else
+
+        Only stores opened on the user's active index follow it; stores opened on
+        a named index, such as a shadow index being built, stay where they are.
+
+        Returns:
+            bool: True if the store switched indexes
+        """
+        if not self.follows_active_index:
+            return False
+        active_index_name = await asyncio.to_thread(resolve_index_name, self.user_id)
+        if active_index_name == self.index_name:
+            return False
+        logger.info(f"Index {self.index_name} is gone, following user {self.user_id} to {active_index_name}")
+        self.index_name = active_index_name
+        self.shared = self.index_name == SEARCH_INDEX_NAME
+        self.search_client = None
+        return True
+
+    async def _hydrate_results(self, results):
+        """
+        Fill in the fields of id-only search results from the item store
+
+        Documents missing from the store, or stored with a different content_hash
+        than the index holds, are fetched from Azure Search and written back to it.
+
+        Args:
+            results (list): Search results carrying id, content_hash and "@search.*" values
+
+        Returns:
+            list: Results with SEARCH_SELECT_FIELDS and the "@search.*" values, in the same order
+        """
+        item_store = get_item_store()
+        document_ids = [result["id"] for result in results]
+        stored = await asyncio.to_thread(item_store.get_items, self.index_name, self.user_id, document_ids)
+        stale = [
+            result["id"] for result in results
+            if result["id"] not in stored or stored[result["id"]].get("content_hash") != result.get("content_hash")
+        ]
+        
+        if stale:
+            logger.info(f"Fetching {len(stale)} documents missing from the item store")
+            fetched = await self.search_client.search(
+                search_text="*",
+                filter=self._scoped_filter(self._id_filter(stale)),
+                select=",".join(await self._retrievable_fields()),
+                top=len(stale)
+            )
+            documents = [
+                {key: value for key, value in document.items() if not key.startswith("@search.")}
+                async for document in fetched
+            ]
+            await asyncio.to_thread(item_store.upsert_items, self.index_name, self.user_id, documents)
+            stored.update((document["id"], document) for document in documents)
+        
+        hydrated = []
+        for result in results:
+            document = stored.get(result["id"])
+            if document is None:
+                # Deleted between the search and the fetch
+                continue
+            fields = {field: document.get(field) for field in SEARCH_SELECT_FIELDS}
+            fields.update((key, value) for key, value in result.items() if key.startswith("@search."))
+            hydrated.append(fields)
+        return hydrated
+
+    async def _supports_two_phase(self):
+        """Check that id-only results can be hydrated; stale copies are detected by content_hash."""
+        try:
+            if "content_hash" in await self._retrievable_fields():
+                return True
+            logger.info(f"Index {self.index_name} has no content_hash field, returning full results")
+        except Exception as e:
+            logger.error(f"Error reading index schema, returning full results: {str(e)}")
+        return False
+
+    async def _retrievable_fields(self):
+        """Return every field of this index's schema except the vector."""
+        if self.index_name not in self._stored_fields:
+            index = await self.index_client.get_index(self.index_name)
+            self._stored_fields[self.index_name] = [
+                field.name for field in index.fields if field.name != "content_vector"
+            ]
+        return self._stored_fields[self.index_name]
+
+    async def _lexical_search_fields(self):
+        """Return the lexical fields that are searchable in this index's schema."""
+        if self.index_name not in self._searchable_fields:
+            try:
+                index = await self.index_client.get_index(self.index_name)
+                searchable = {field.name for field in index.fields if field.searchable}
+            except Exception as e:
+                logger.error(f"Error reading index schema: {str(e)}")
+                return []
+            # Indexes created before hybrid search do not have item_number searchable
+            self._searchable_fields[self.index_name] = [
+                field for field in local_index.LEXICAL_FIELDS if field in searchable
+            ]
+        return self._searchable_fields[self.index_name]
+
+    def _search_local(self, query_vector, top_k, filter_condition, query_text=None):
+        """Search the in-process index, returning None when the query has to go to Azure Search."""
+        if not LOCAL_INDEX_ENABLED:
+            return None
+        
+        index = local_index.get_local_index(self.local_key)
+        if index is None:
+            self._schedule_local_load()
+            return None
+        
+        try:
+            results = index.search(
+                query_vector, top_k, filter_condition, select=SEARCH_SELECT_FIELDS,
+                query_text=query_text, candidates=HYBRID_CANDIDATES
+            )
+        except local_index.UnsupportedFilterError as e:
+            logger.info(f"Filter not supported locally, using Azure Search: {str(e)}")
+            return None
+        
+        logger.info(f"Local search returned {len(results)} results")
+        return results
+
+    def _schedule_local_load(self):
+        """Start loading this index into memory in the background, once."""
+        if local_index.is_loading(self.local_key):
+            return
+        local_index.begin_load(self.local_key)
+        task = asyncio.create_task(self.load_local_index())
+        _pending_local_loads.add(task)
+        task.add_done_callback(_pending_local_loads.discard)
+
+    async def load_local_index(self):
+        """
+        Load every document of this index, vectors included, into an in-process index
+
+        Writes made while the load runs are buffered and applied before the local
+        index starts serving. Indexes above LOCAL_INDEX_MAX_DOCUMENTS are not loaded.
+
+        Returns:
+            bool: True if the local index is now serving this index
+        """
+        index_name = self.local_key
+        if not local_index.is_loading(index_name):
+            local_index.begin_load(index_name)
+        
+        try:
+            if not self.search_client:
+                await self.connect_to_index()
+            
+            document_count = await self.get_document_count()
+            if document_count > LOCAL_INDEX_MAX_DOCUMENTS:
+                logger.info(f"Index {index_name} has {document_count} documents, keeping it remote only")
+                local_index.drop_local_index(index_name)
+                return False
+            
+            # The SDK pages through results in chunks of 1000
+            results = await self.search_client.search(
+                search_text="*",
+                filter=self._scoped_filter(None),
+                top=LOCAL_INDEX_MAX_DOCUMENTS
+            )
+            documents = [dict(result) async for result in results]
+            loaded = local_index.LocalVectorIndex(await self.get_vector_dimensions())
+            loaded.upsert([
+                {key: value for key, value in document.items() if not key.startswith("@search.")}
+                for document in documents
+            ])
+            local_index.finish_load(index_name, loaded)
+            return True
+        except Exception as e:
+            logger.error(f"Error loading local index for {index_name}: {str(e)}")
+            local_index.drop_local_index(index_name)
+            return False
+
+    async def get_field_values(self, fields):
+        """
+        Get the distinct values of filterable fields in this user's index
+
+        Values come from the in-process index when it is loaded. Otherwise they are
+        read by a background scan of the index and cached; until it finishes, the
+        last values read (or empty lists) are returned, so no query waits on the scan.
+
+        Args:
+            fields (list): Field names, e.g. ["category", "supplier_name"]
+
+        Returns:
+            dict: Maps each field to a sorted list of its distinct values
+        """
+        version = get_inventory_version(self.user_id)
+        cache_key = (self.user_id, self.index_name, tuple(fields))
+        cached = field_values_cache.get(cache_key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        index = local_index.get_local_index(self.local_key) if LOCAL_INDEX_ENABLED else None
+        if index is not None:
+            values = {field: sorted(index.distinct_values(field)) for field in fields}
+            field_values_cache.set(cache_key, (version, values))
+            return values
+
+        self._schedule_field_values_refresh(fields, cache_key, version)
+        if cached is not None:
+            return cached[1]
+        return {field: [] for field in fields}
+
+    def _schedule_field_values_refresh(self, fields, cache_key, version):
+        """Start reading the distinct values of fields in the background, once per key."""
+        if cache_key in _refreshing_field_values:
+            return
+        _refreshing_field_values.add(cache_key)
+        task = asyncio.create_task(self._refresh_field_values(fields, cache_key, version))
+        _pending_field_value_refreshes.add(task)
+        task.add_done_callback(_pending_field_value_refreshes.discard)
+
+    async def _refresh_field_values(self, fields, cache_key, version):
+        """Scan this user's documents for the distinct values of fields and cache them."""
+        try:
+            if not self.search_client:
+                await self.connect_to_index()
+
+            found = {field: set() for field in fields}
+            # The SDK pages through results in chunks of 1000
+            results = await self.search_client.search(
+                search_text="*",
+                filter=self._scoped_filter(None),
+                select=",".join(fields),
+                top=100000
+            )
+            async for result in results:
+                for field in fields:
+                    if result.get(field):
+                        found[field].add(result[field])
+            values = {field: sorted(found[field]) for field in fields}
+            field_values_cache.set(cache_key, (version, values))
+            logger.info(f"Refreshed values of {list(fields)} for user {self.user_id}")
+        except Exception as e:
+            logger.error(f"Error listing field values: {str(e)}")
+        finally:
+            _refreshing_field_values.discard(cache_key)
+
+    def versioned_index_name(self):
+        """Build a fresh versioned index name for a blue/green rebuild."""
+        return f"inventory-{self.user_id}-v{int(time.time() * 1000)}"
+
+    async def get_document_count(self):
+        """Return the number of documents the service reports for this index, or for this user on the shared index."""
+        if not self.search_client:
+            await self.connect_to_index()
+        if self.shared:
+            results = await self.search_client.search(
+                search_text="*", filter=self._user_filter(), include_total_count=True, top=0
+            )
+            return await results.get_count()
+        return await self.search_client.get_document_count()
+
+    async def validate_index(self, expected_count, timeout=INDEX_VALIDATION_TIMEOUT):
+        """
+        Check that this index is ready to serve queries
+
+        Waits for the service to report the expected document count, then runs a
+        smoke vector query with one of the indexed vectors and expects it back.
+
+        Args:
+            expected_count (int): Number of documents that were uploaded
+            timeout (float): Seconds to wait for newly uploaded documents to become visible
+
+        Returns:
+            bool: True if the index passed validation
+        """
+        # Uploaded documents take a moment to become searchable
+        deadline = time.time() + timeout
+        document_count = await self.get_document_count()
+        while document_count < expected_count and time.time() < deadline:
+            await asyncio.sleep(2)
+            document_count = await self.get_document_count()
+
+        if document_count != expected_count:
+            logger.error(f"Index {self.index_name} has {document_count} documents, expected {expected_count}")
+            return False
+
+        if not expected_count:
+            return True
+
+        async def _smoke_query():
+            samples = await self.search_client.search(search_text="*", select="id,content_vector", top=1)
+            sample = None
+            async for result in samples:
+                sample = result
+                break
+            if not sample:
+                return False
+            results = await self.search_client.search(
+                search_text=None,
+                vector_queries=[{
+                    'vector': sample["content_vector"],
+                    'fields': 'content_vector',
+                    'k': 1,
+                    'kind': 'vector'
+                }],
+                select="id",
+                top=1
+            )
+            return any([result["id"] == sample["id"] async for result in results])
+
+        try:
+            if not await _smoke_query():
+                logger.error(f"Smoke query against {self.index_name} did not return the expected document")
+                return False
+        except Exception as e:
+            logger.error(f"Smoke query against {self.index_name} failed: {str(e)}")
+            return False
+
+        logger.info(f"Index {self.index_name} validated with {document_count} documents")
+        return True
+
+    async def activate(self, shadow_store, document_count):
+        """
+        Switch this store, and the user's registry pointer, over to a validated shadow index
+
+        The previously active index is recorded in the registry as a pending
+        deletion and deleted after a grace period, so in-flight queries against it
+        can finish; sweep_index_deletions picks it up after a restart.
+        """
+        old_index_name = self.index_name
+        registry = get_index_registry()
+        await asyncio.to_thread(registry.set_active, self.user_id, shadow_store.index_name, document_count)
+
+        self.index_name = shadow_store.index_name
+        self.search_client = shadow_store.search_client
+        bump_inventory_version(self.user_id)
+        logger.info(f"Switched user {self.user_id} from {old_index_name} to {self.index_name}")
+
+        if old_index_name != self.index_name and old_index_name != SEARCH_INDEX_NAME:
+            await asyncio.to_thread(
+                registry.schedule_deletion, old_index_name, self.user_id, time.time() + INDEX_GC_DELAY_SECONDS
+            )
+            _schedule_index_sweep(INDEX_GC_DELAY_SECONDS)
+
+    async def delete_index(self, index_name=None):
+        """
+        Delete an index, defaulting to this store's index
+
+        Returns:
+            bool: True if the index is gone, including when it had already been deleted
+        """
+        index_name = index_name or self.index_name
+        if index_name == SEARCH_INDEX_NAME:
+            # Other tenants' documents live there; users are removed with delete_documents
+            logger.warning(f"Refusing to delete the shared index {index_name}")
+            return False
+        try:
+            await self.index_client.delete_index(index_name)
+            logger.info(f"Deleted index: {index_name}")
+        except ResourceNotFoundError:
+            logger.info(f"Index {index_name} was already deleted")
+        except Exception as e:
+            logger.warning(f"Could not delete index {index_name}: {str(e)}")
+            return False
+
+        get_index_catalog().discard(index_name)
+        invalidate_index_exists(self.user_id)
+        registry = get_index_registry()
+        await asyncio.to_thread(registry.forget_index_settings, index_name)
+        await asyncio.to_thread(registry.forget_deletion, index_name)
+        await asyncio.to_thread(get_item_store().purge_index, index_name)
+        await release_search_client(index_name)
+        local_index.drop_local_index(index_name)
+        return True
+
+    async def get_index_settings(self):
+        """Return the settings recorded when this store's index was created, or an empty dict."""
+        return await asyncio.to_thread(get_index_registry().get_index_settings, self.index_name) or {}
+
+    async def get_vector_dimensions(self):
+        """
+        Return the vector width of this store's index
+
+        Read from the settings recorded when the index was created, or from the
+        schema for older indexes. Falls back to the configured embedding width
+        when the index cannot be read.
+        """
+        if self.index_name in self._vector_dimensions:
+            return self._vector_dimensions[self.index_name]
+
+        settings = await asyncio.to_thread(get_index_registry().get_index_settings, self.index_name)
+        if settings and settings.get("dimensions"):
+            dimensions = settings["dimensions"]
+        else:
+            try:
+                index = await self.index_client.get_index(self.index_name)
+                dimensions = next(
+                    field.vector_search_dimensions for field in index.fields if field.name == "content_vector"
+                )
+            except Exception as e:
+                logger.warning(f"Could not read vector dimensions of {self.index_name}: {str(e)}")
+                return get_embedding_dimensions()
+
+        self._vector_dimensions[self.index_name] = dimensions
+        return dimensions
+
+    async def has_field(self, field_name):
+        """Check whether the live index schema contains a field."""
+        try:
+            index = await self.index_client.get_index(self.index_name)
+            return any(field.name == field_name for field in index.fields)
+        except Exception as e:
+            logger.error(f"Error reading index schema: {str(e)}")
+            return False
+
+    async def get_document_hashes(self):
+        """
+        Get the content hash of every document indexed for this user
+
+        Returns:
+            dict: Maps document id to its content_hash
+        """
+        if not self.search_client:
+            await self.connect_to_index()
+
+        try:
+            # The SDK pages through results in chunks of 1000
+            results = await self.search_client.search(
+                search_text="*",
+                filter=self._user_filter(),
+                select="id,content_hash",
+                top=100000
+            )
+            hashes = {result["id"]: result.get("content_hash") async for result in results}
+            logger.info(f"Found {len(hashes)} indexed documents for user {self.user_id}")
+            return hashes
+        except Exception as e:
+            logger.error(f"Error listing indexed documents: {str(e)}")
+            raise
+
+    async def get_owned_ids(self, document_ids):
+        """
+        Find which of the given documents are indexed for this user
+
+        Looks up only the given ids, filtered to this user's documents.
+
+        Args:
+            document_ids (list): Document ids to look up
+
+        Returns:
+            set: The ids that exist and belong to this user
+        """
+        if not self.search_client:
+            await self.connect_to_index()
+
+        owned = set()
+        document_ids = list(dict.fromkeys(document_ids))
+        # Keep each filter well under the service's filter size limit
+        for start in range(0, len(document_ids), 500):
+            chunk = document_ids[start:start + 500]
+            results = await self.search_client.search(
+                search_text="*",
+                filter=f"{self._user_filter()} and {self._id_filter(chunk)}",
+                select="id",
+                top=len(chunk)
+            )
+            owned.update([result["id"] async for result in results])
+        return owned
+
+    async def get_document_vectors(self, limit):
+        """
+        Get the vectors of up to limit documents indexed for this user
+
+        Args:
+            limit (int): Most vectors to read; the SDK pages through them 1000 at a time
+
+        Returns:
+            np.ndarray: One float32 row per document
+        """
+        if not self.search_client:
+            await self.connect_to_index()
+
+        results = await self.search_client.search(
+            search_text="*",
+            filter=self._scoped_filter(None),
+            select="id,content_vector",
+            top=limit
+        )
+        vectors = [result["content_vector"] async for result in results if result.get("content_vector")]
+        logger.info(f"Read {len(vectors)} document vectors for user {self.user_id}")
+        return np.asarray(vectors, dtype=np.float32)
+
     async def connect_to_index(self):
         """Public method to connect to existing index with better error handling."""
         try:
             if not self.search_client:
-                self.search_client = SearchClient(
-                    endpoint=SEARCH_SERVICE_ENDPOINT,
-                    credential=self.credential,
-                    index_name=self.index_name
-                )
+                self.search_client = get_search_client(self.index_name)
                 logger.info(f"Connected to existing index: {self.index_name}")
             return True
         except Exception as e:
@@ -289,12 +1120,24 @@ class VectorStore:
             await self.connect_to_index()
         
         try:
+            if self.shared:
+                # Keys are global on the shared index, so only delete ids this user owns
+                owned = await self.get_owned_ids(document_ids)
+                foreign = [doc_id for doc_id in document_ids if doc_id not in owned]
+                if foreign:
+                    logger.warning(f"Skipping {len(foreign)} documents not owned by user {self.user_id}")
+                document_ids = [doc_id for doc_id in document_ids if doc_id in owned]
+                if not document_ids:
+                    return None
+            
             # Prepare documents for deletion
             docs_to_delete = [{"id": doc_id} for doc_id in document_ids]
             
             # Delete documents
             logger.info(f"Deleting {len(docs_to_delete)} documents")
-            result = self.search_client.delete_documents(documents=docs_to_delete)
+            result = await self.search_client.delete_documents(documents=docs_to_delete)
+            local_index.delete_documents(self.local_key, document_ids)
+            await asyncio.to_thread(get_item_store().delete_items, self.index_name, self.user_id, document_ids)
             
             logger.info(f"Documents deleted successfully")
             return result
@@ -0,0 +1,71 @@
+# search_cache.py
+import hashlib
+import logging
+import numpy as np
+from config import (
+    SEARCH_RESULT_CACHE_SIZE,
+    SEARCH_RESULT_CACHE_TTL,
+    INDEX_EXISTS_CACHE_SIZE,
+    INDEX_EXISTS_CACHE_TTL
+)
+from ttl_cache import TTLCache
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("SearchCache")
+
+# Query vectors are rounded to this many steps per unit before hashing,
+# so float noise between near-identical embeddings maps to the same key
+_QUANTIZATION_STEPS = 1024
+
+# Per-user inventory versions; any write bumps the user's version, orphaning cached results
+_inventory_versions = {}
+
+search_result_cache = TTLCache(SEARCH_RESULT_CACHE_SIZE, SEARCH_RESULT_CACHE_TTL)
+
+# Distinct filterable values per user and index, used to recognise them in questions;
+# entries are (inventory version, values) so outdated values can be served while they refresh
+field_values_cache = TTLCache(SEARCH_RESULT_CACHE_SIZE, SEARCH_RESULT_CACHE_TTL)
+
+# Whether each user has a searchable index, so /query and lazy initialization skip the catalog and registry
+index_exists_cache = TTLCache(INDEX_EXISTS_CACHE_SIZE, INDEX_EXISTS_CACHE_TTL)
+
+def invalidate_index_exists(user_id):
+    """Forget whether a user has an index, after it was built, swapped or deleted."""
+    index_exists_cache.pop(user_id)
+
+def get_inventory_version(user_id):
+    """Return the current inventory version for a user."""
+    return _inventory_versions.get(user_id, 0)
+
+def bump_inventory_version(user_id):
+    """Mark a user's inventory as changed so their cached search results are no longer served."""
+    _inventory_versions[user_id] = _inventory_versions.get(user_id, 0) + 1
+    # On the shared index a user's first documents are what gives them an index
+    invalidate_index_exists(user_id)
+    logger.info(f"Inventory version for user {user_id} is now {_inventory_versions[user_id]}")
+    return _inventory_versions[user_id]
+
+def vector_fingerprint(query_vector):
+    """Hash a query vector after L2-normalizing and quantizing it."""
+    vector = np.asarray(query_vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector = vector / norm
+    quantized = np.round(vector * _QUANTIZATION_STEPS).astype(np.int16)
+    return hashlib.blake2b(quantized.tobytes(), digest_size=16).hexdigest()
+
+def search_cache_key(user_id, index_name, query_vector, top_k, filter_condition=None, query_text=None):
+    """Build the cache key for a search, stamped with the user's current inventory version."""
+    return (
+        user_id,
+        get_inventory_version(user_id),
+        index_name,
+        vector_fingerprint(query_vector),
+        top_k,
+        filter_condition or "",
+        " ".join(str(query_text or "").lower().split())
+    )
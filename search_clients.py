@@ -0,0 +1,92 @@
+# search_clients.py
+import logging
+import aiohttp
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.search.documents.aio import SearchClient
+from azure.search.documents.indexes.aio import SearchIndexClient
+from config import SEARCH_SERVICE_ENDPOINT, SEARCH_SERVICE_KEY, SEARCH_MAX_CONNECTIONS, SEARCH_BACKEND
+from memory_search import InMemorySearchClient, InMemorySearchIndexClient
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("SearchClients")
+
+# One aiohttp session, and so one connection pool, shared by every Azure Search client
+_session = None
+_credential = None
+_index_client = None
+_search_clients = {}
+
+def _shared_transport():
+    """Return a transport over the shared session; closing it leaves the session open."""
+    global _session
+    if _session is None or _session.closed:
+        # Must be created on the running event loop
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=SEARCH_MAX_CONNECTIONS),
+            cookie_jar=aiohttp.DummyCookieJar(),
+            auto_decompress=False,
+            trust_env=True
+        )
+        logger.info(f"Opened shared Azure Search connection pool (limit {SEARCH_MAX_CONNECTIONS})")
+    return AioHttpTransport(session=_session, session_owner=False)
+
+def _get_credential():
+    global _credential
+    if _credential is None:
+        _credential = AzureKeyCredential(SEARCH_SERVICE_KEY)
+    return _credential
+
+def get_index_client():
+    """Return the process-wide async SearchIndexClient."""
+    global _index_client
+    if _index_client is None and SEARCH_BACKEND == "memory":
+        logger.info("Using the in-memory search backend")
+        _index_client = InMemorySearchIndexClient()
+    elif _index_client is None:
+        _index_client = SearchIndexClient(
+            endpoint=SEARCH_SERVICE_ENDPOINT,
+            credential=_get_credential(),
+            transport=_shared_transport()
+        )
+    return _index_client
+
+def get_search_client(index_name):
+    """Return the async SearchClient for an index, creating it on the shared transport."""
+    client = _search_clients.get(index_name)
+    if client is None and SEARCH_BACKEND == "memory":
+        client = InMemorySearchClient(index_name)
+        _search_clients[index_name] = client
+    elif client is None:
+        client = SearchClient(
+            endpoint=SEARCH_SERVICE_ENDPOINT,
+            credential=_get_credential(),
+            index_name=index_name,
+            transport=_shared_transport()
+        )
+        _search_clients[index_name] = client
+    return client
+
+async def release_search_client(index_name):
+    """Close and forget the client of an index that no longer exists."""
+    client = _search_clients.pop(index_name, None)
+    if client is not None:
+        await client.close()
+
+async def close_search_clients():
+    """Close every client and the shared connection pool, e.g. on application shutdown."""
+    global _session, _index_client
+    for client in list(_search_clients.values()):
+        await client.close()
+    _search_clients.clear()
+    if _index_client is not None:
+        await _index_client.close()
+        _index_client = None
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    logger.info("Closed Azure Search clients")
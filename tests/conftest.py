@@ -0,0 +1,81 @@
+# conftest.py
+"""
+Shared fixtures: every test runs against the in-memory search backend with the
+hashing embedding backend, so no Azure, Cosmos or OpenAI account is needed.
+"""
+import os
+import sys
+import tempfile
+
+# config reads the environment on import, so these must be set before any app module is imported
+_STATE_DIR = tempfile.mkdtemp(prefix="inventory-tests-")
+os.environ.update({
+    "SEARCH_BACKEND": "memory",
+    "EMBEDDING_BACKEND": "hashing",
+    "LOCAL_EMBEDDING_DIMENSIONS": "64",
+    "EMBEDDING_DIMENSIONS": "0",
+    "EMBEDDING_CACHE_ENABLED": "false",
+    "LOCAL_INDEX_ENABLED": "false",
+    "SEARCH_RESULT_MODE": "full",
+    "SEARCH_INDEX_MODE": "per_user",
+    "OPENAI_API_KEY": "test",
+    "INDEX_VALIDATION_TIMEOUT": "1",
+    "INDEX_GC_DELAY_SECONDS": "0",
+    "INDEX_REGISTRY_PATH": os.path.join(_STATE_DIR, "index_registry.sqlite3"),
+    "INDEX_CHECKPOINT_PATH": os.path.join(_STATE_DIR, "index_checkpoints.sqlite3"),
+    "ITEM_STORE_PATH": os.path.join(_STATE_DIR, "item_store.sqlite3"),
+    "EMBEDDING_CACHE_PATH": os.path.join(_STATE_DIR, "embedding_cache.sqlite3"),
+    "HNSW_TUNING_PATH": os.path.join(_STATE_DIR, "hnsw_tuning.json"),
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+import build_checkpoints
+import index_catalog
+import index_registry
+import item_store
+import memory_search
+import rag
+import search_cache
+import search_clients
+from embeddings import EmbeddingGenerator
+from search import VectorStore
+
+DIMENSIONS = 64
+
+@pytest.fixture(autouse=True)
+def fresh_state(tmp_path):
+    """Give each test empty indexes, caches and SQLite stores."""
+    memory_search._indexes.clear()
+    search_clients._search_clients.clear()
+    search_clients._index_client = None
+    index_catalog._index_catalog = None
+    index_registry._index_registry = index_registry.IndexRegistry(str(tmp_path / "index_registry.sqlite3"))
+    item_store._item_store = item_store.ItemStore(str(tmp_path / "item_store.sqlite3"))
+    build_checkpoints._checkpoint_store = build_checkpoints.BuildCheckpointStore(str(tmp_path / "index_checkpoints.sqlite3"))
+    search_cache._inventory_versions.clear()
+    for cache in (search_cache.search_result_cache, search_cache.field_values_cache,
+                  search_cache.index_exists_cache, rag.query_embedding_cache, rag.intent_cache):
+        cache.clear()
+    rag._active_builds.clear()
+    yield
+
+def make_document(user_id, document_id, vector=None, **fields):
+    """Build an index document with a vector of the test width."""
+    document = {"id": document_id, "userId": user_id, "content_hash": "hash", "content": document_id}
+    document["content_vector"] = np.ones(DIMENSIONS, dtype=np.float32) if vector is None else vector
+    document.update(fields)
+    return document
+
+def make_assistant(user_id, index_name=None):
+    """Build a RAGAssistant without connecting to Cosmos DB or OpenAI."""
+    assistant = object.__new__(rag.RAGAssistant)
+    assistant.user_id = user_id
+    assistant.cosmos_db = None
+    assistant.openai_client = None
+    assistant.embedding_generator = EmbeddingGenerator()
+    assistant._embedding_generators = {assistant.embedding_generator.expected_dim: assistant.embedding_generator}
+    assistant.vector_store = VectorStore(user_id, index_name=index_name)
+    return assistant
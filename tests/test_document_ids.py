@@ -0,0 +1,84 @@
+# test_document_ids.py
+import asyncio
+
+import build_checkpoints
+import memory_search
+import rag
+from conftest import DIMENSIONS, make_assistant, make_document
+from index_registry import get_index_registry
+from search import VectorStore
+
+INVENTORY = [{"items": [
+    {"Supplier Name": "Sysco", "Item Number": "100", "Inventory Item Name": "Whole milk", "Category": "Dairy"},
+    {"Supplier Name": "US Foods", "Item Number": "100", "Inventory Item Name": "Romaine", "Category": "Produce"},
+    # The same supplier and number again maps to the first item's document
+    {"Supplier Name": "Sysco", "Item Number": "100", "Inventory Item Name": "Whole milk", "Category": "Dairy"}
+]}]
+
+def test_same_item_number_from_two_suppliers_gets_two_ids():
+    assistant = make_assistant("u1")
+    first, second, repeated = INVENTORY[0]["items"]
+
+    assert assistant._document_id(first) != assistant._document_id(second)
+    assert assistant._document_id(first) == assistant._document_id(repeated)
+    assert assistant._document_id(first) != make_assistant("u2")._document_id(first)
+
+def test_rebuild_indexes_each_supplier_item_once():
+    async def scenario():
+        assistant = make_assistant("u1")
+        stats = await assistant.rebuild_index(INVENTORY)
+
+        assert stats["documents"] == 2
+        assert stats["duplicates"] == 1
+        assert await assistant.vector_store.get_document_count() == 2
+        names = {
+            result["inventory_item_name"]
+            async for result in await assistant.vector_store.search_client.search(search_text="*")
+        }
+        assert names == {"Whole milk", "Romaine"}
+
+        progress = build_checkpoints.get_checkpoint_store().get_progress("u1")
+        assert (progress["total_items"], progress["completed_items"], progress["percent"]) == (2, 2, 100.0)
+
+    asyncio.run(scenario())
+
+def test_sync_rebuilds_indexes_built_with_the_old_id_scheme():
+    async def scenario():
+        # An index from before document ids included the supplier: no id version recorded
+        old_store = VectorStore("u1", index_name="inventory-u1-v1")
+        await old_store.create_index(dimensions=DIMENSIONS)
+        await old_store.add_documents([make_document("u1", "dTE6MTAw")])
+        get_index_registry().set_active("u1", "inventory-u1-v1", 1)
+
+        assistant = make_assistant("u1")
+        result = await assistant.sync_inventory_items(INVENTORY)
+
+        assert result["full_rebuild"] is True
+        assert assistant.vector_store.index_name != "inventory-u1-v1"
+        assert (await assistant.vector_store.get_index_settings())["document_id_version"] == rag.DOCUMENT_ID_VERSION
+        hashes = await assistant.vector_store.get_document_hashes()
+        assert set(hashes) == {assistant._document_id(item) for item in INVENTORY[0]["items"]}
+
+        # The next sync finds the new scheme and only diffs
+        result = await assistant.sync_inventory_items(INVENTORY)
+        assert result == {"changed": 0, "removed": 0, "unchanged": 2, "full_rebuild": False}
+
+    asyncio.run(scenario())
+
+def test_unresumable_checkpointed_build_index_is_deleted():
+    async def scenario():
+        # An interrupted build whose index predates document id versions cannot be resumed
+        stale_store = VectorStore("u1", index_name="inventory-u1-v5")
+        await stale_store.create_index(dimensions=DIMENSIONS)
+        checkpoints = build_checkpoints.get_checkpoint_store()
+        checkpoints.start_build("u1", "inventory-u1-v5")
+        checkpoints.finish_build("u1", "interrupted", "worker restarted")
+
+        assistant = make_assistant("u1")
+        await assistant.rebuild_index(INVENTORY)
+
+        assert "inventory-u1-v5" not in memory_search._indexes
+        assert list(memory_search._indexes) == [assistant.vector_store.index_name]
+        assert get_index_registry().get_index_settings("inventory-u1-v5") is None
+
+    asyncio.run(scenario())
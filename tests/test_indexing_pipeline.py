@@ -0,0 +1,37 @@
+# test_indexing_pipeline.py
+import asyncio
+
+from conftest import DIMENSIONS, make_assistant
+from indexing_pipeline import IndexingPipeline
+from search import VectorStore
+
+def test_each_item_is_tokenized_once(monkeypatch):
+    async def scenario():
+        assistant = make_assistant("u1")
+        store = VectorStore("u1", index_name="inventory-u1")
+        await store.create_index(dimensions=DIMENSIONS)
+        token_budget = assistant.embedding_generator.token_budget
+        truncated = []
+        truncate = token_budget.truncate
+
+        def counted_truncate(text):
+            truncated.append(text)
+            return truncate(text)
+
+        monkeypatch.setattr(token_budget, "truncate", counted_truncate)
+        pipeline = IndexingPipeline(
+            assistant.embedding_generator,
+            store,
+            assistant._create_item_content,
+            assistant._create_vector_document
+        )
+        items = [
+            {"Supplier Name": "Sysco", "Item Number": str(i), "Inventory Item Name": f"item {i}", "Category": "Dairy"}
+            for i in range(5)
+        ]
+        stats = await pipeline.run(items)
+
+        assert stats["uploaded"] == 5
+        assert len(truncated) == 5
+
+    asyncio.run(scenario())
@@ -0,0 +1,69 @@
+# test_intent.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import BackgroundTasks
+
+import main
+from conftest import make_assistant
+
+INVENTORY = [{"items": [
+    {"Supplier Name": "Sysco", "Item Number": "100", "Inventory Item Name": "Whole milk", "Category": "Dairy"},
+    {"Supplier Name": "Sysco", "Item Number": "200", "Inventory Item Name": "Romaine", "Category": "Produce"}
+]}]
+
+@pytest.fixture
+def assistant(monkeypatch):
+    """A user with an index, whose intent and chat model calls are counted instead of sent."""
+    assistant = make_assistant("u1")
+    asyncio.run(assistant.rebuild_index(INVENTORY))
+    calls = {"check": 0, "intent": 0, "chat": 0}
+    check_for_action_intent = assistant.check_for_action_intent
+
+    async def counted_check(user_question):
+        # Counted separately, since the intent cache would hide a second classification
+        calls["check"] += 1
+        return await check_for_action_intent(user_question)
+
+    async def classify(user_question):
+        calls["intent"] += 1
+        return (False, None, {})
+
+    async def chat_completion(model, messages, max_tokens, **kwargs):
+        calls["chat"] += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="You have whole milk."))])
+
+    monkeypatch.setattr(assistant, "check_for_action_intent", counted_check)
+    monkeypatch.setattr(assistant, "_classify_action_intent", classify)
+    monkeypatch.setattr(assistant, "_chat_completion", chat_completion)
+    monkeypatch.setitem(main.rag_assistants, "u1", assistant)
+    assistant.calls = calls
+    return assistant
+
+def _ask(text):
+    question = main.Question(text=text, user_id="u1")
+    return asyncio.run(main.query_rag(question, BackgroundTasks()))
+
+def test_query_classifies_intent_once(assistant):
+    response = _ask("How much whole milk do I have?")
+
+    assert response.response == "You have whole milk."
+    assert assistant.calls == {"check": 1, "intent": 1, "chat": 1}
+
+def test_resubmitted_question_reuses_the_classification(assistant):
+    _ask("How much whole milk do I have?")
+    _ask("  how much WHOLE milk do I have? ")
+
+    assert assistant.calls == {"check": 2, "intent": 1, "chat": 2}
+
+def test_failed_classifications_are_not_cached(assistant, monkeypatch):
+    async def unavailable(user_question):
+        assistant.calls["intent"] += 1
+        return None
+
+    monkeypatch.setattr(assistant, "_classify_action_intent", unavailable)
+    _ask("How much romaine do I have?")
+    _ask("How much romaine do I have?")
+
+    assert assistant.calls == {"check": 2, "intent": 2, "chat": 2}
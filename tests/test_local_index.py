@@ -0,0 +1,123 @@
+# test_local_index.py
+import numpy as np
+import pytest
+
+from local_index import (
+    LexicalIndex,
+    LocalVectorIndex,
+    UnsupportedFilterError,
+    compile_filter,
+    reciprocal_rank_fusion
+)
+
+DOCUMENTS = [
+    {"id": "1", "category": "Dairy", "supplier_name": "O'Brien's", "cost_of_unit": 2.5, "total_units": 10, "active": True},
+    {"id": "2", "category": "Produce", "supplier_name": "Sysco", "cost_of_unit": 4.0, "total_units": 0, "active": False},
+    {"id": "3", "category": "Dairy", "supplier_name": "Sysco", "cost_of_unit": 7.25, "total_units": None, "active": True},
+]
+
+def _matching(expression):
+    predicate = compile_filter(expression)
+    return [document["id"] for document in DOCUMENTS if predicate(document)]
+
+@pytest.mark.parametrize("expression, expected", [
+    ("category eq 'Dairy'", ["1", "3"]),
+    ("category ne 'Dairy'", ["2"]),
+    ("cost_of_unit lt 4", ["1"]),
+    ("cost_of_unit le 4", ["1", "2"]),
+    ("cost_of_unit gt 2.5 and cost_of_unit lt 1e1", ["2", "3"]),
+    ("category eq 'Produce' or cost_of_unit ge 7.25", ["2", "3"]),
+    ("not category eq 'Dairy'", ["2"]),
+    ("not (category eq 'Dairy' or active eq false)", []),
+    ("category eq 'Dairy' and (supplier_name eq 'Sysco' or total_units gt 5)", ["1", "3"]),
+    ("supplier_name eq 'O''Brien''s'", ["1"]),
+    ("total_units eq null", ["3"]),
+    ("total_units lt 5", ["2"]),
+    ("active eq true", ["1", "3"]),
+    ("search.in(supplier_name, 'Sysco|Acme', '|')", ["2", "3"]),
+    ("search.in(category, 'Produce, Bakery')", ["2"]),
+])
+def test_filter_grammar(expression, expected):
+    assert _matching(expression) == expected
+
+def test_and_binds_tighter_than_or():
+    assert _matching("category eq 'Produce' or category eq 'Dairy' and active eq false") == ["2"]
+
+@pytest.mark.parametrize("expression", [
+    "category eq",
+    "category eq 'Dairy",
+    "category like 'Dairy'",
+    "(category eq 'Dairy'",
+    "category eq 'Dairy' and",
+    "category eq 'Dairy' 'Produce'",
+    "'Dairy' eq category",
+    "cost_of_unit lt 4 xor active eq true",
+    "search.in(category)",
+    "search.in(category, 3)",
+    "category eq 'Dairy' ; drop",
+    "geo.distance(location, geography'POINT(0 0)') lt 5",
+])
+def test_malformed_filters_raise(expression):
+    with pytest.raises(UnsupportedFilterError):
+        compile_filter(expression)
+
+def test_bm25_ranks_rarer_and_more_frequent_terms_higher():
+    index = LexicalIndex(fields=("content",))
+    index.upsert("milk", {"content": "whole milk gallon"})
+    index.upsert("milk-milk", {"content": "milk milk powder"})
+    index.upsert("oat", {"content": "oat milk carton"})
+    index.upsert("butter", {"content": "salted butter"})
+
+    scores = index.scores("oat milk")
+    ranking = sorted(scores, key=scores.get, reverse=True)
+
+    # "oat" is rarer than "milk", and a repeated term outweighs a single one
+    assert ranking == ["oat", "milk-milk", "milk"]
+    assert "butter" not in scores
+
+def test_bm25_prefers_shorter_documents_and_forgets_deletes():
+    index = LexicalIndex(fields=("content",))
+    index.upsert("short", {"content": "romaine"})
+    index.upsert("long", {"content": "romaine hearts chopped washed bagged"})
+    index.upsert("other", {"content": "iceberg"})
+
+    scores = index.scores("Romaine")
+    assert scores["short"] > scores["long"]
+
+    index.delete("short")
+    index.upsert("long", {"content": "iceberg"})
+    assert index.scores("romaine") == {}
+
+def test_rrf_sums_reciprocal_ranks():
+    fused = dict(reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60))
+
+    assert fused["a"] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused["c"] == pytest.approx(1 / 63 + 1 / 61)
+    assert fused["b"] == pytest.approx(1 / 62)
+
+def test_rrf_ties_keep_first_seen_order():
+    # a and b swap places between the rankings, so their fused scores tie
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "a"]])
+
+    assert [key for key, _ in fused] == ["a", "b"]
+    assert fused[0][1] == fused[1][1]
+
+    fused = reciprocal_rank_fusion([["x", "y"], ["y", "x"], ["z"]])
+    assert [key for key, _ in fused] == ["x", "y", "z"]
+
+def test_hybrid_search_fuses_vector_and_text_rankings():
+    index = LocalVectorIndex(dimensions=3)
+    index.upsert([
+        {"id": "milk", "content": "whole milk", "category": "Dairy", "content_vector": [1, 0, 0]},
+        {"id": "cream", "content": "heavy cream", "category": "Dairy", "content_vector": [0.9, 0.1, 0]},
+        {"id": "lettuce", "content": "romaine lettuce", "category": "Produce", "content_vector": [0, 1, 0]},
+    ])
+
+    vector_only = index.search(np.array([1, 0, 0]), top_k=3)
+    assert [result["id"] for result in vector_only] == ["milk", "cream", "lettuce"]
+
+    hybrid = index.search(np.array([0.9, 0.1, 0]), top_k=2, query_text="romaine lettuce")
+    assert [result["id"] for result in hybrid] == ["lettuce", "cream"]
+
+    filtered = index.search(np.array([1, 0, 0]), top_k=3, filter_condition="category eq 'Produce'")
+    assert [result["id"] for result in filtered] == ["lettuce"]
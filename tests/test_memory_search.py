@@ -0,0 +1,77 @@
+# test_memory_search.py
+import asyncio
+
+import numpy as np
+import pytest
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceNotFoundError
+
+from conftest import DIMENSIONS, make_document
+from search import VectorStore
+from search_clients import get_index_client, get_search_client
+
+def test_upload_reports_status_per_document():
+    async def scenario():
+        await VectorStore("u1", index_name="inventory-u1").create_index(dimensions=DIMENSIONS)
+        client = get_search_client("inventory-u1")
+
+        results = await client.upload_documents(documents=[
+            make_document("u1", "a"),
+            make_document("u1", "b", vector=np.ones(DIMENSIONS // 2)),
+            {"content": "no key"}
+        ])
+        assert [(result.succeeded, result.status_code) for result in results] == [(True, 201), (False, 400), (False, 400)]
+
+        results = await client.upload_documents(documents=[make_document("u1", "a")])
+        assert results[0].status_code == 200
+        assert await client.get_document_count() == 1
+
+    asyncio.run(scenario())
+
+def test_vector_search_applies_filter_and_select():
+    async def scenario():
+        await VectorStore("u1", index_name="inventory-u1").create_index(dimensions=DIMENSIONS)
+        client = get_search_client("inventory-u1")
+        vectors = np.eye(DIMENSIONS, dtype=np.float32)
+        await client.upload_documents(documents=[
+            make_document("u1", "dairy", vector=vectors[0], category="dairy"),
+            make_document("u1", "produce", vector=vectors[0] + vectors[1], category="produce")
+        ])
+
+        results = await client.search(
+            search_text=None,
+            vector_queries=[{"vector": vectors[0].tolist(), "fields": "content_vector", "k": 2, "kind": "vector"}],
+            filter="category eq 'produce'",
+            select="id,category",
+            top=2
+        )
+        hits = [result async for result in results]
+        assert [hit["id"] for hit in hits] == ["produce"]
+        assert set(hits[0]) == {"id", "category", "@search.score"}
+
+    asyncio.run(scenario())
+
+def test_text_only_queries_are_rejected():
+    async def scenario():
+        await VectorStore("u1", index_name="inventory-u1").create_index(dimensions=DIMENSIONS)
+        with pytest.raises(HttpResponseError) as error:
+            await get_search_client("inventory-u1").search(search_text="milk")
+        assert error.value.status_code == 400
+
+    asyncio.run(scenario())
+
+def test_index_lifecycle_errors_match_the_service():
+    async def scenario():
+        store = VectorStore("u1", index_name="inventory-u1")
+        await store.create_index(dimensions=DIMENSIONS)
+        schema = await get_index_client().get_index("inventory-u1")
+
+        with pytest.raises(ResourceExistsError):
+            await get_index_client().create_index(schema)
+
+        await get_index_client().delete_index("inventory-u1")
+        with pytest.raises(ResourceNotFoundError):
+            await get_index_client().delete_index("inventory-u1")
+        with pytest.raises(ResourceNotFoundError):
+            await get_search_client("inventory-u1").get_document_count()
+
+    asyncio.run(scenario())
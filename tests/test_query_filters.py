@@ -0,0 +1,64 @@
+# test_query_filters.py
+import pytest
+
+from query_filters import build_odata_filter, extract_query_constraints
+
+CATEGORIES = ["Dairy", "Non-Dairy", "Produce"]
+SUPPLIERS = ["Sysco", "US Foods"]
+
+@pytest.mark.parametrize("question, expected", [
+    ("What costs less than $5?", {"cost_of_unit": {"lt": 5.0}}),
+    ("Items under 3 dollars", {"cost_of_unit": {"lt": 3.0}}),
+    ("Anything cheaper than $2.50 each", {"cost_of_unit": {"lt": 2.5}}),
+    ("Products at most $1,200", {"cost_of_unit": {"le": 1200.0}}),
+    ("Which items are more expensive than $20?", {"cost_of_unit": {"gt": 20.0}}),
+    ("What do I have more than 10 units of?", {"total_units": {"gt": 10.0}}),
+    ("Items with at least 4 cases", {"total_units": {"ge": 4.0}}),
+    ("Which items have fewer than 3 left?", {"total_units": {"lt": 3.0}}),
+    ("Stock >= 12", {"total_units": {"ge": 12.0}}),
+    ("Prices between 2 and 5 dollars", {"cost_of_unit": {"ge": 2.0, "le": 5.0}}),
+    ("Between 10 and 5 units on hand", {"total_units": {"ge": 5.0, "le": 10.0}}),
+])
+def test_supported_comparison_phrases(question, expected):
+    assert extract_query_constraints(question) == expected
+
+@pytest.mark.parametrize("question", [
+    "Do I have leftover 3 units of milk?",
+    "Which lids cover 5 units each?",
+    "Is the thunder 2 units delivery here?",
+    "Do I have a discover 4 case?",
+    "Show me the 3 items with the highest price",
+])
+def test_words_containing_comparison_phrases_are_not_constraints(question):
+    assert extract_query_constraints(question) == {}
+
+def test_numbers_without_a_clear_field_are_ignored():
+    # Both price and quantity words: the bound cannot be attributed to either field
+    assert extract_query_constraints("Items priced over 10 with low stock") == {}
+
+def test_known_values_are_matched_as_whole_words():
+    constraints = extract_query_constraints(
+        "Non-Dairy items from US Foods under $4", categories=CATEGORIES, suppliers=SUPPLIERS
+    )
+
+    assert constraints == {"category": ["Non-Dairy"], "supplier_name": ["US Foods"], "cost_of_unit": {"lt": 4.0}}
+    assert extract_query_constraints("Any produces or syscos?", categories=CATEGORIES, suppliers=SUPPLIERS) == {
+        "category": ["Produce"], "supplier_name": ["Sysco"]
+    }
+    assert extract_query_constraints("Dairyland butter", categories=CATEGORIES) == {}
+
+def test_build_odata_filter():
+    assert build_odata_filter({}) is None
+    assert build_odata_filter({"category": ["Dairy"]}) == "category eq 'Dairy'"
+    assert build_odata_filter({
+        "category": ["Dairy", "Produce"],
+        "supplier_name": ["O'Brien's"],
+        "cost_of_unit": {"le": 5.0, "ge": 2.5},
+        "total_units": {"gt": 10.0}
+    }) == (
+        "search.in(category, 'Dairy|Produce', '|') and supplier_name eq 'O''Brien''s'"
+        " and cost_of_unit ge 2.5 and cost_of_unit le 5 and total_units gt 10"
+    )
+
+def test_build_odata_filter_values_with_the_delimiter():
+    assert build_odata_filter({"supplier_name": ["A|B", "C"]}) == "(supplier_name eq 'A|B' or supplier_name eq 'C')"
@@ -0,0 +1,116 @@
+# test_shared_index.py
+import asyncio
+
+import numpy as np
+
+import main
+import memory_search
+import search
+import search_cache
+from config import SEARCH_INDEX_NAME
+from conftest import DIMENSIONS, make_document
+from index_catalog import get_index_catalog
+from search import VectorStore
+
+async def _shared_stores():
+    """Two tenants on the shared index, each with three documents."""
+    stores = {}
+    for user_id in ("u1", "u2"):
+        store = VectorStore(user_id, index_name=SEARCH_INDEX_NAME)
+        await store.create_index(dimensions=DIMENSIONS)
+        await store.add_documents([make_document(user_id, f"{user_id}-{i}") for i in range(3)])
+        stores[user_id] = store
+    return stores
+
+def test_tenants_only_see_their_own_documents():
+    async def scenario():
+        stores = await _shared_stores()
+
+        results = await stores["u1"].search(np.ones(DIMENSIONS), top_k=10)
+        assert sorted(result["content"] for result in results) == ["u1-0", "u1-1", "u1-2"]
+        assert await stores["u2"].get_document_count() == 3
+        assert set(await stores["u2"].get_document_hashes()) == {"u2-0", "u2-1", "u2-2"}
+
+    asyncio.run(scenario())
+
+def test_uploads_for_another_tenant_are_rejected():
+    async def scenario():
+        stores = await _shared_stores()
+        summary = await stores["u1"].add_documents([make_document("u2", "u2-0", content="overwritten")])
+
+        assert summary["failed_ids"] == ["u2-0"]
+        assert memory_search._indexes[SEARCH_INDEX_NAME].documents["u2-0"]["content"] == "u2-0"
+
+    asyncio.run(scenario())
+
+def test_deletes_only_remove_owned_documents():
+    async def scenario():
+        stores = await _shared_stores()
+        await stores["u1"].delete_documents(["u1-0", "u2-0", "missing"])
+
+        assert await stores["u1"].get_owned_ids(["u1-0", "u1-1", "u2-0"]) == {"u1-1"}
+        assert await stores["u2"].get_document_count() == 3
+
+    asyncio.run(scenario())
+
+def test_create_index_never_replaces_the_shared_index():
+    async def scenario():
+        stores = await _shared_stores()
+        # Even with a catalog that has not seen the index yet
+        get_index_catalog().discard(SEARCH_INDEX_NAME)
+        await VectorStore("u3", index_name=SEARCH_INDEX_NAME).create_index(dimensions=DIMENSIONS)
+
+        assert await stores["u1"].get_document_count() == 3
+        assert await stores["u2"].get_document_count() == 3
+
+        assert await stores["u1"].delete_index() is False
+        assert SEARCH_INDEX_NAME in memory_search._indexes
+
+    asyncio.run(scenario())
+
+def test_index_exists_only_for_tenants_with_documents(monkeypatch):
+    async def scenario():
+        await _shared_stores()
+
+        assert await main.index_exists("u1") is True
+        assert await main.index_exists("u3") is False
+
+    monkeypatch.setattr(search, "SEARCH_INDEX_MODE", "shared")
+    asyncio.run(scenario())
+
+def test_index_exists_is_cached_until_the_index_changes(monkeypatch):
+    async def scenario():
+        assert await main.index_exists("u1") is False
+
+        calls = []
+        exists = get_index_catalog().exists
+
+        async def counted_exists(index_name):
+            calls.append(index_name)
+            return await exists(index_name)
+
+        monkeypatch.setattr(get_index_catalog(), "exists", counted_exists)
+        assert await main.index_exists("u1") is False
+        assert calls == []
+
+        # Building the user's first documents into the shared index invalidates the answer
+        await _shared_stores()
+        search_cache.bump_inventory_version("u1")
+        assert await main.index_exists("u1") is True
+        assert calls == [SEARCH_INDEX_NAME]
+
+    monkeypatch.setattr(search, "SEARCH_INDEX_MODE", "shared")
+    asyncio.run(scenario())
+
+def test_index_exists_follows_per_user_creates_and_deletes():
+    async def scenario():
+        assert await main.index_exists("u4") is False
+
+        store = VectorStore("u4")
+        await store.create_index(dimensions=DIMENSIONS)
+        assert await main.index_exists("u4") is True
+
+        await store.delete_index()
+        assert await main.index_exists("u4") is False
+
+    asyncio.run(scenario())
@@ -0,0 +1,95 @@
+# test_two_phase.py
+import asyncio
+
+import numpy as np
+import pytest
+
+import search
+from conftest import DIMENSIONS, make_document
+from item_store import get_item_store
+from search import VectorStore
+from search_clients import get_index_client
+
+@pytest.fixture(autouse=True)
+def ids_mode(monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_RESULT_MODE", "ids")
+
+async def _store():
+    store = VectorStore("u1", index_name="inventory-u1")
+    await store.create_index(dimensions=DIMENSIONS)
+    vectors = np.eye(DIMENSIONS, dtype=np.float32)
+    await store.add_documents([
+        make_document("u1", f"d{i}", vector=vectors[i], inventory_item_name=f"item {i}", category="dairy")
+        for i in range(5)
+    ])
+    return store, vectors
+
+def test_results_are_hydrated_from_the_item_store():
+    async def scenario():
+        store, vectors = await _store()
+        selects = []
+        search_documents = store.search_client.search
+
+        async def recording_search(**kwargs):
+            selects.append(kwargs.get("select"))
+            return await search_documents(**kwargs)
+
+        store.search_client.search = recording_search
+        results = await store.search(vectors[2], top_k=1)
+
+        assert selects == ["id,content_hash"]
+        assert results[0]["inventory_item_name"] == "item 2"
+        assert results[0]["category"] == "dairy"
+        assert "@search.score" in results[0]
+        assert get_item_store().stats()["hits"] == 1
+
+    asyncio.run(scenario())
+
+def test_stale_and_missing_copies_are_refetched():
+    async def scenario():
+        store, vectors = await _store()
+        item_store = get_item_store()
+        item_store.upsert_items("inventory-u1", "u1", [{"id": "d1", "content_hash": "old", "inventory_item_name": "stale"}])
+        item_store.delete_items("inventory-u1", "u1", ["d3"])
+
+        names = {}
+        for i in (1, 3):
+            results = await store.search(vectors[i], top_k=1)
+            names[i] = results[0]["inventory_item_name"]
+
+        assert names == {1: "item 1", 3: "item 3"}
+        stored = item_store.get_items("inventory-u1", "u1", ["d1", "d3"])
+        assert stored["d1"]["content_hash"] == "hash"
+        assert "content_vector" not in stored["d3"]
+
+    asyncio.run(scenario())
+
+def test_indexes_without_content_hash_return_full_results():
+    async def scenario():
+        store, vectors = await _store()
+        schema = await get_index_client().get_index("inventory-u1")
+        schema.fields = [field for field in schema.fields if field.name != "content_hash"]
+        await get_index_client().create_or_update_index(schema)
+        get_item_store().purge_index("inventory-u1")
+
+        results = await VectorStore("u1", index_name="inventory-u1").search(vectors[4], top_k=1)
+
+        assert results[0]["inventory_item_name"] == "item 4"
+        assert get_item_store().stats()["entries"] == 0
+
+    asyncio.run(scenario())
+
+def test_item_store_entries_go_with_their_index():
+    async def scenario():
+        store, _ = await _store()
+        other = VectorStore("u1", index_name="inventory-u1-v2")
+        await other.create_index(dimensions=DIMENSIONS)
+        await other.add_documents([make_document("u1", "d0")])
+        assert get_item_store().stats()["entries"] == 6
+
+        await store.delete_index()
+
+        assert get_item_store().stats()["entries"] == 1
+        assert get_item_store().get_items("inventory-u1-v2", "u1", ["d0"])
+
+    asyncio.run(scenario())
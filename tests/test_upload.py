@@ -0,0 +1,153 @@
+# test_upload.py
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from azure.core.exceptions import HttpResponseError
+from azure.search.documents.models import IndexingResult
+
+import search
+from conftest import DIMENSIONS, make_assistant, make_document
+from indexing_pipeline import IndexingPipeline
+from search import VectorStore
+
+# The real sleep, for simulating slow uploads while backoff is skipped
+_sleep = asyncio.sleep
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    """Skip the retry backoff in _upload_batch."""
+    sleep = asyncio.sleep
+    monkeypatch.setattr(search.asyncio, "sleep", lambda delay: sleep(0))
+
+async def _store():
+    store = VectorStore("u1", index_name="inventory-u1")
+    await store.create_index(dimensions=DIMENSIONS)
+    return store
+
+def test_partial_failure_retries_only_transient_documents():
+    async def scenario():
+        store = await _store()
+        upload = store.search_client.upload_documents
+        sent = []
+
+        async def flaky_upload(documents):
+            sent.append([document["id"] for document in documents])
+            results = await upload(documents=[document for document in documents if document["id"] != "rejected"])
+            if len(sent) == 1:
+                # First attempt: "busy" is throttled and will be retried, "rejected" is invalid
+                results = [result for result in results if result.key != "busy"]
+                results.append(IndexingResult(key="busy", succeeded=False, status_code=503))
+            results.append(IndexingResult(key="rejected", succeeded=False, status_code=400))
+            return results
+
+        store.search_client.upload_documents = flaky_upload
+        documents = [make_document("u1", doc_id) for doc_id in ("a", "busy", "rejected", "b")]
+        documents.append(make_document("u1", "narrow", vector=np.ones(DIMENSIONS // 2)))
+
+        summary = await store.add_documents(documents)
+
+        assert summary["uploaded"] == 3
+        assert summary["failed"] == 2
+        assert sorted(summary["failed_ids"]) == ["narrow", "rejected"]
+        assert summary["requests"] == 2
+        assert summary["batches"] == 2
+        assert summary["retries"] == 1
+        # Only the throttled document is sent again
+        assert sent[1] == ["busy"]
+        assert await store.search_client.get_document_count() == 3
+
+    asyncio.run(scenario())
+
+def test_oversized_batches_are_split_and_counted(monkeypatch):
+    async def scenario():
+        store = await _store()
+        upload = store.search_client.upload_documents
+
+        async def limited_upload(documents):
+            if len(documents) > 3:
+                error = HttpResponseError(message="Request Entity Too Large")
+                error.status_code = 413
+                raise error
+            return await upload(documents=documents)
+
+        store.search_client.upload_documents = limited_upload
+        summary = await store.add_documents([make_document("u1", f"d{i}") for i in range(20)])
+
+        # 20 -> 2 x 10 -> 4 x 5 -> 4 x (2 + 3): 7 splits and 8 accepted batches
+        assert summary["uploaded"] == 20
+        assert summary["failed"] == 0
+        assert summary["splits"] == 7
+        assert summary["batches"] == 8
+        assert summary["requests"] == 15
+        assert await store.search_client.get_document_count() == 20
+
+    monkeypatch.setattr(search, "SEARCH_UPLOAD_CONCURRENCY", 2)
+    asyncio.run(scenario())
+
+def test_batch_failures_are_reported_after_retries(monkeypatch):
+    async def scenario():
+        store = await _store()
+
+        async def failing_upload(documents):
+            raise HttpResponseError(message="Service Unavailable")
+
+        store.search_client.upload_documents = failing_upload
+        summary = await store.add_documents([make_document("u1", "a"), make_document("u1", "b")])
+
+        assert summary["uploaded"] == 0
+        assert sorted(summary["failed_ids"]) == ["a", "b"]
+        assert summary["requests"] == 3
+        assert summary["batches"] == 0
+        assert summary["retries"] == 2
+
+    monkeypatch.setattr(search, "SEARCH_UPLOAD_RETRIES", 2)
+    asyncio.run(scenario())
+
+def test_pipeline_keeps_several_uploads_in_flight():
+    async def scenario():
+        assistant = make_assistant("u1")
+        store = await _store()
+        upload = store.search_client.upload_documents
+        in_flight = 0
+        peak = 0
+
+        async def slow_upload(documents):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await _sleep(0.01)
+            in_flight -= 1
+            return await upload(documents=documents)
+
+        store.search_client.upload_documents = slow_upload
+        pipeline = IndexingPipeline(
+            assistant.embedding_generator,
+            store,
+            assistant._create_item_content,
+            assistant._create_vector_document,
+            upload_batch_size=2,
+            upload_concurrency=3
+        )
+        items = [
+            {"Supplier Name": "Sysco", "Item Number": str(i), "Inventory Item Name": f"item {i}", "Category": "Dairy"}
+            for i in range(12)
+        ]
+        stats = await pipeline.run(items)
+
+        assert stats["uploaded"] == 12
+        assert stats["upload_batches"] == 6
+        assert peak > 1
+        assert await store.search_client.get_document_count() == 12
+
+    asyncio.run(scenario())
+
+def test_upload_size_estimate_covers_the_serialized_document():
+    document = VectorStore._to_upload_document(make_document(
+        "u1", "d1", vector=np.random.default_rng(0).normal(size=DIMENSIONS) * 1e-5,
+        inventory_item_name="Whole milk", price=3.25, content="Whole milk, Sysco, 1 gal"
+    ))
+
+    serialized = len(json.dumps(document, separators=(",", ":")))
+    assert serialized <= VectorStore._estimate_upload_bytes(document) <= serialized * 2
@@ -0,0 +1,116 @@
+# token_budget.py
+import functools
+import logging
+from config import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_MAX_TOKENS,
+    EMBEDDING_MAX_INPUT_TOKENS
+)
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; fall back to a conservative estimate
+    tiktoken = None
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("TokenBudget")
+
+# Characters per token assumed when no tokenizer is available. Deliberately low so
+# estimates err on the side of too many tokens and requests stay under the limit.
+_FALLBACK_CHARS_PER_TOKEN = 3
+
+class TokenBudget:
+    """
+    Token counting, truncation and batch packing for embedding requests.
+
+    Uses the model's tiktoken encoding when available, otherwise a conservative
+    character-based estimate.
+    """
+    def __init__(self, model, max_input_tokens=EMBEDDING_MAX_INPUT_TOKENS,
+                 max_batch_items=EMBEDDING_BATCH_SIZE, max_batch_tokens=EMBEDDING_BATCH_MAX_TOKENS):
+        self.model = model
+        self.max_input_tokens = max_input_tokens
+        self.max_batch_items = max_batch_items
+        self.max_batch_tokens = max_batch_tokens
+        self.encoding = self._load_encoding(model)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _load_encoding(model):
+        """Load the tokenizer for a model once per process, or None if it cannot be loaded."""
+        if tiktoken is None:
+            logger.warning("tiktoken is not installed, estimating token counts from text length")
+            return None
+        try:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                return tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # Encodings are downloaded on first use, which can fail offline
+            logger.warning(f"Could not load tokenizer for {model} ({str(e)}), estimating token counts from text length")
+            return None
+
+    def count(self, text):
+        """Count the tokens in a text."""
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return len(text) // _FALLBACK_CHARS_PER_TOKEN + 1
+
+    def truncate(self, text):
+        """
+        Truncate a text to the per-input token limit
+
+        Returns:
+            tuple: (text, token_count) - the possibly truncated text and its token count
+        """
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            if len(tokens) <= self.max_input_tokens:
+                return text, len(tokens)
+            logger.warning(f"Text too long ({len(tokens)} tokens), truncating to {self.max_input_tokens} tokens")
+            return self.encoding.decode(tokens[:self.max_input_tokens]), self.max_input_tokens
+
+        token_count = self.count(text)
+        if token_count <= self.max_input_tokens:
+            return text, token_count
+        max_chars = (self.max_input_tokens - 1) * _FALLBACK_CHARS_PER_TOKEN
+        logger.warning(f"Text too long (~{token_count} tokens), truncating to {max_chars} chars")
+        return text[:max_chars], self.count(text[:max_chars])
+
+    def batch_is_full(self, batch_items, batch_tokens, next_tokens):
+        """Check whether adding an input of next_tokens would overflow the current batch."""
+        return batch_items > 0 and (
+            batch_items >= self.max_batch_items or batch_tokens + next_tokens > self.max_batch_tokens
+        )
+
+    def pack(self, indexed_texts):
+        """
+        Group texts into batches as close to the per-request limits as possible
+
+        Args:
+            indexed_texts (list): (index, text, token_count) tuples
+
+        Returns:
+            list: Batches, each a list of (index, text, token_count) tuples
+        """
+        batches = []
+        current = []
+        current_tokens = 0
+
+        for entry in indexed_texts:
+            tokens = entry[2]
+            if self.batch_is_full(len(current), current_tokens, tokens):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(entry)
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+        return batches